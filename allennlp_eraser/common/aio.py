@@ -0,0 +1,147 @@
+"""
+Async generator variants of the blocking loaders in `allennlp_eraser.common.util`
+and of the dataset readers' `_read`, so that one event loop can interleave several
+dataset loads.
+
+The blocking reading, parsing and tokenization run in `executor` (by default the
+loop's default thread pool), `chunk_size` items per call so that the hand-offs to
+and from the loop stay cheap. The underlying generator is only ever advanced by one
+executor call at a time, and closed in the executor when the consumer stops early.
+"""
+
+import asyncio
+import os
+from concurrent.futures import Executor
+from itertools import islice
+from typing import (
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from allennlp.data.dataset_readers import DatasetReader
+from allennlp.data.instance import Instance
+
+from allennlp_eraser.common.compression import find_compressed
+from allennlp_eraser.common.docs_archive import find_docs_archive
+from allennlp_eraser.common.document import DocumentView
+from allennlp_eraser.common.line_index import iter_jsonl_lines
+from allennlp_eraser.common.util import (
+    Annotation,
+    annotation_from_json,
+    iter_jsonl,
+    load_documents,
+)
+
+T = TypeVar("T")
+
+
+async def aiterate(
+    make_iterable: Callable[[], Iterable[T]],
+    executor: Optional[Executor] = None,
+    chunk_size: int = 64,
+) -> AsyncIterator[T]:
+    """Yields the items of the blocking iterable returned by `make_iterable`, which
+    is called, iterated and closed in `executor`.
+    """
+    loop = asyncio.get_running_loop()
+    iterator: Iterator[T] = await loop.run_in_executor(
+        executor, lambda: iter(make_iterable())
+    )
+    try:
+        while True:
+            chunk = await loop.run_in_executor(
+                executor, lambda: list(islice(iterator, chunk_size))
+            )
+            if not chunk:
+                return
+            for item in chunk:
+                yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await loop.run_in_executor(executor, close)
+
+
+def aload_jsonl(
+    file_path: str, executor: Optional[Executor] = None, chunk_size: int = 64
+) -> AsyncIterator[dict]:
+    return aiterate(lambda: iter_jsonl(file_path), executor, chunk_size)
+
+
+def aannotations_from_jsonl(
+    file_path: str,
+    shard: Optional[Tuple[int, int]] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 64,
+) -> AsyncIterator[Annotation]:
+    def annotations() -> Iterator[Annotation]:
+        for line in iter_jsonl_lines(file_path, shard=shard):
+            yield annotation_from_json(line)
+
+    return aiterate(annotations, executor, chunk_size)
+
+
+def _is_docs_dir(data_dir: str) -> bool:
+    """Whether `load_documents` reads the documents of `data_dir` from its `docs`
+    directory, rather than from a packed archive or a `docs.jsonl` file.
+    """
+    archive = find_docs_archive(data_dir)
+    if archive is not None:
+        archive.close()
+        return False
+    if find_compressed(os.path.join(data_dir, "docs.jsonl")):
+        return False
+    return os.path.isdir(os.path.join(data_dir, "docs"))
+
+
+async def aload_documents(
+    data_dir: str,
+    docids: Optional[Set[str]] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 64,
+) -> AsyncIterator[Tuple[str, DocumentView]]:
+    """Yields the `(docid, document)` pairs of `load_documents`, in docid order.
+    Files of a `docs` directory are read `chunk_size` at a time; a packed archive or
+    a `docs.jsonl` file is loaded by a single executor call.
+    """
+    loop = asyncio.get_running_loop()
+    docs_dir = os.path.join(data_dir, "docs")
+    # finding the format touches the file system, it is not done on the loop
+    if not await loop.run_in_executor(executor, _is_docs_dir, data_dir):
+        documents = await loop.run_in_executor(
+            executor, load_documents, data_dir, docids
+        )
+        for item in documents.items():
+            yield item
+        return
+
+    if docids is None:
+        all_docids = await loop.run_in_executor(executor, os.listdir, docs_dir)
+    else:
+        all_docids = [str(d) for d in docids]
+    all_docids = sorted(set(all_docids))
+    for start in range(0, len(all_docids), chunk_size):
+        chunk = set(all_docids[start : start + chunk_size])
+        documents = await loop.run_in_executor(
+            executor, load_documents, data_dir, chunk
+        )
+        for item in documents.items():
+            yield item
+
+
+def aread(
+    reader: DatasetReader,
+    file_path: str,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 64,
+) -> AsyncIterator[Instance]:
+    """Yields the instances of `reader._read(file_path)`, tokenization and field
+    building included, without blocking the event loop.
+    """
+    return aiterate(lambda: reader._read(file_path), executor, chunk_size)
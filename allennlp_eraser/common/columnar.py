@@ -0,0 +1,226 @@
+"""
+Columnar (Parquet or Arrow IPC) copies of the JSONL files of a dataset.
+
+Records are read lazily one record batch at a time. Only the requested columns are
+decoded, and contiguous blocks of whole row groups (record batches for Arrow IPC
+files) can be assigned to different workers. Convert a JSONL file once with
+
+    python -m allennlp_eraser.common.columnar path/to/train.jsonl train.parquet
+
+Requires `pyarrow`, which is only imported when a columnar file is used.
+"""
+
+import argparse
+import json
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from allennlp.common.checks import ConfigurationError
+
+from allennlp_eraser.common.compression import open_text
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ConfigurationError(
+            "pyarrow is required to read and write Parquet or Arrow files, "
+            "install it with `pip install pyarrow`"
+        )
+    return pyarrow
+
+
+def is_columnar(file_path: str) -> bool:
+    return str(file_path).endswith(PARQUET_SUFFIXES + ARROW_SUFFIXES)
+
+
+def _is_parquet(file_path: str) -> bool:
+    return str(file_path).endswith(PARQUET_SUFFIXES)
+
+
+def _iter_records(jsonl_path: str) -> Iterator[Dict[str, Any]]:
+    with open_text(jsonl_path) as rf:
+        for line in rf:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_column_chunks(
+    jsonl_path: str, columns: Sequence[str], row_group_size: int
+) -> Iterator[Dict[str, List[Any]]]:
+    records = _iter_records(jsonl_path)
+    while True:
+        chunk = list(islice(records, row_group_size))
+        if not chunk:
+            return
+        yield {column: [record.get(column) for record in chunk] for column in columns}
+
+
+def jsonl_to_columnar(
+    jsonl_path: str,
+    output_path: str,
+    columns: Optional[Sequence[str]] = None,
+    row_group_size: int = 10000,
+    schema: Optional[Any] = None,
+) -> str:
+    """Converts the JSONL file at `jsonl_path` into a Parquet or Arrow IPC file,
+    depending on the suffix of `output_path`. Every `row_group_size` records form a
+    row group (Parquet) or a record batch (Arrow), the unit of sharding.
+    `columns` defaults to the names of `schema` if given, else to the keys of the
+    first record. Without a `pyarrow.Schema`, the types of the columns are inferred
+    from all records in a first pass over the file, so that a column whose values
+    are all null in some row groups still gets the type of its values in others.
+    """
+    pa = _pyarrow()
+    if columns is None:
+        if schema is not None:
+            columns = schema.names
+        else:
+            first = next(_iter_records(jsonl_path), None)
+            if first is None:
+                raise ValueError(f"{jsonl_path} has no records")
+            columns = list(first.keys())
+
+    if schema is None:
+        schema = pa.unify_schemas(
+            [
+                pa.RecordBatch.from_pydict(chunk).schema
+                for chunk in _iter_column_chunks(jsonl_path, columns, row_group_size)
+            ]
+        )
+    else:
+        schema = pa.schema([schema.field(column) for column in columns])
+
+    if _is_parquet(output_path):
+        writer = pa.parquet.ParquetWriter(output_path, schema)
+    else:
+        writer = pa.ipc.new_file(output_path, schema)
+    try:
+        for chunk in _iter_column_chunks(jsonl_path, columns, row_group_size):
+            batch = pa.RecordBatch.from_pydict(chunk, schema=schema)
+            if _is_parquet(output_path):
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+    finally:
+        writer.close()
+    return output_path
+
+
+class ColumnarFile:
+    """Lazy, projected access to the record batches of a Parquet or Arrow IPC file."""
+
+    def __init__(self, file_path: str) -> None:
+        pa = _pyarrow()
+        self._file_path = str(file_path)
+        if _is_parquet(self._file_path):
+            self._parquet = pa.parquet.ParquetFile(self._file_path)
+            self._ipc = None
+            self.schema = self._parquet.schema_arrow
+        else:
+            self._parquet = None
+            self._ipc = pa.ipc.open_file(pa.memory_map(self._file_path, "r"))
+            self.schema = self._ipc.schema
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.schema.names)
+
+    @property
+    def num_row_groups(self) -> int:
+        if self._parquet is not None:
+            return self._parquet.num_row_groups
+        return self._ipc.num_record_batches
+
+    def shard_row_groups(self, index: int, count: int) -> range:
+        """The row groups of shard `index` of `count`: contiguous blocks of row
+        groups, like the contiguous blocks of lines of a sharded JSONL file.
+        """
+        num_row_groups = self.num_row_groups
+        return range(
+            num_row_groups * index // count, num_row_groups * (index + 1) // count
+        )
+
+    @property
+    def num_rows(self) -> int:
+        if self._parquet is not None:
+            return self._parquet.metadata.num_rows
+        return sum(self._ipc.get_batch(i).num_rows for i in range(self.num_row_groups))
+
+    def iter_batches(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        row_groups: Optional[Iterable[int]] = None,
+    ) -> Iterator[Any]:
+        """Yields `pyarrow.RecordBatch`es of the given row groups (all by default)
+        holding only `columns`. Arrow IPC files are memory mapped, so their batches
+        are not copied.
+        """
+        if row_groups is None:
+            row_groups = range(self.num_row_groups)
+        for i in row_groups:
+            if self._parquet is not None:
+                table = self._parquet.read_row_group(i, columns=columns)
+                yield from table.to_batches()
+            else:
+                batch = self._ipc.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(list(columns))
+                yield batch
+
+    def iter_records(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        row_groups: Optional[Iterable[int]] = None,
+        dictionary_columns: Sequence[str] = (),
+    ) -> Iterator[Dict[str, Any]]:
+        """Yields the rows of `iter_batches` as dicts. `dictionary_columns` are
+        dictionary encoded per batch first, so that their repeated values (e.g.
+        labels) are converted to Python objects once instead of once per row.
+        """
+        for batch in self.iter_batches(columns, row_groups):
+            names = batch.schema.names
+            values = []
+            for name, column in zip(names, batch.columns):
+                if name in dictionary_columns:
+                    encoded = column.dictionary_encode()
+                    dictionary = encoded.dictionary.to_pylist()
+                    values.append([dictionary[i] for i in encoded.indices.to_pylist()])
+                else:
+                    values.append(column.to_pylist())
+            for row in zip(*values):
+                yield dict(zip(names, row))
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert a JSONL dataset file into a Parquet or Arrow IPC file "
+        "(chosen by the suffix of the output path)."
+    )
+    parser.add_argument("jsonl_path", help="JSONL file to convert")
+    parser.add_argument("output_path", help="*.parquet or *.arrow output file")
+    parser.add_argument(
+        "--columns", nargs="+", default=None, help="defaults to all columns"
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=10000,
+        help="records per row group, the unit of sharding",
+    )
+    parsed = parser.parse_args(args)
+
+    output_path = jsonl_to_columnar(
+        parsed.jsonl_path, parsed.output_path, parsed.columns, parsed.row_group_size
+    )
+    print(output_path)
+
+
+if __name__ == "__main__":
+    main()
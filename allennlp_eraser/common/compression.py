@@ -0,0 +1,219 @@
+"""
+Transparent reading of gzip (`.gz`), bzip2 (`.bz2`) and Zstandard (`.zst`)
+compressed dataset files.
+
+Zstandard files made of several independent frames (e.g. written by
+`compress_zstd_frames`) are decompressed by a thread pool, frame by frame and
+ahead of the reader, so that decompression overlaps with parsing. The frame
+boundaries are found by walking the frame and block headers, without
+decompressing anything. Zstandard support requires the optional `zstandard`
+package.
+"""
+
+import bz2
+import gzip
+import io
+import os
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Deque, Iterator, List, Optional, TextIO, Tuple
+
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".zst")
+
+_ZSTD_MAGIC = 0xFD2FB528
+_SKIPPABLE_MAGIC_MASK = 0xFFFFFFF0
+_SKIPPABLE_MAGIC = 0x184D2A50
+_DICTIONARY_ID_SIZES = (0, 1, 2, 4)
+_CONTENT_SIZE_SIZES = (0, 2, 4, 8)
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        # imported here so that reading plain and gzip files does not import allennlp
+        from allennlp.common.checks import ConfigurationError
+
+        raise ConfigurationError(
+            "zstandard is required to read and write .zst files, "
+            "install it with `pip install zstandard`"
+        )
+    return zstandard
+
+
+def is_compressed(file_path: str) -> bool:
+    return str(file_path).endswith(COMPRESSED_SUFFIXES)
+
+
+def find_compressed(file_path: str) -> Optional[str]:
+    """`file_path` if it exists, else the first existing compressed variant of it
+    (`file_path + ".gz"` etc.), else `None`.
+    """
+    for candidate in (file_path,) + tuple(
+        file_path + suffix for suffix in COMPRESSED_SUFFIXES
+    ):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _read_exactly(fp: BinaryIO, size: int) -> bytes:
+    data = fp.read(size)
+    if len(data) != size:
+        raise ValueError("truncated zstd frame")
+    return data
+
+
+def find_zstd_frames(fp: BinaryIO) -> List[Tuple[int, int]]:
+    """`(offset, length)` of every zstd frame of `fp`, skippable frames excluded.
+    Only frame and block headers are read, block contents are seeked over.
+    """
+    frames = []
+    fp.seek(0, io.SEEK_END)
+    size = fp.tell()
+    offset = 0
+    while offset < size:
+        fp.seek(offset)
+        (magic,) = struct.unpack("<I", _read_exactly(fp, 4))
+        if magic & _SKIPPABLE_MAGIC_MASK == _SKIPPABLE_MAGIC:
+            (frame_size,) = struct.unpack("<I", _read_exactly(fp, 4))
+            offset += 8 + frame_size
+            continue
+        if magic != _ZSTD_MAGIC:
+            raise ValueError(f"not a zstd frame at offset {offset}")
+
+        (descriptor,) = _read_exactly(fp, 1)
+        single_segment = (descriptor >> 5) & 1
+        has_checksum = (descriptor >> 2) & 1
+        header_size = 1 - single_segment  # window descriptor
+        header_size += _DICTIONARY_ID_SIZES[descriptor & 3]
+        content_size_flag = descriptor >> 6
+        if content_size_flag == 0:
+            header_size += single_segment
+        else:
+            header_size += _CONTENT_SIZE_SIZES[content_size_flag]
+        position = offset + 5 + header_size
+
+        last_block = False
+        while not last_block:
+            fp.seek(position)
+            block_header = int.from_bytes(_read_exactly(fp, 3), "little")
+            last_block = bool(block_header & 1)
+            block_type = (block_header >> 1) & 3
+            block_size = block_header >> 3
+            if block_type == 3:
+                raise ValueError(f"reserved zstd block type at offset {position}")
+            # RLE blocks store a single byte repeated block_size times
+            position += 3 + (1 if block_type == 1 else block_size)
+        if has_checksum:
+            position += 4
+
+        frames.append((offset, position - offset))
+        offset = position
+    return frames
+
+
+class ChunkReader(io.RawIOBase):
+    """A readable raw stream over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def iter_zstd_frames(
+    file_path: str,
+    num_workers: int = 4,
+    max_in_flight: Optional[int] = None,
+    frames: Optional[List[Tuple[int, int]]] = None,
+) -> Iterator[bytes]:
+    """Decompressed contents of the frames of the zstd file at `file_path`, in order.
+    Frames are decompressed by `num_workers` threads, at most `max_in_flight`
+    (by default `2 * num_workers`) ahead of the consumer. `frames` are those found
+    by `find_zstd_frames`, if the file was already scanned for them.
+    """
+    zstandard = _zstandard()
+    local = threading.local()
+    max_in_flight = max_in_flight or 2 * num_workers
+
+    def decompress(frame: bytes) -> bytes:
+        if not hasattr(local, "decompressor"):
+            local.decompressor = zstandard.ZstdDecompressor()
+        # frames without a content size in their header need the streaming API
+        return local.decompressor.decompressobj().decompress(frame)
+
+    with open(file_path, "rb") as rf:
+        if frames is None:
+            frames = find_zstd_frames(rf)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            pending: Deque = deque()
+            for offset, length in frames:
+                rf.seek(offset)
+                pending.append(executor.submit(decompress, rf.read(length)))
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def open_binary(file_path: str, num_workers: int = 4) -> BinaryIO:
+    """Opens `file_path` for reading, decompressing it according to its suffix.
+    Multi-frame zstd files are decompressed by `num_workers` threads.
+    """
+    file_path = str(file_path)
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rb")
+    if file_path.endswith(".bz2"):
+        return bz2.open(file_path, "rb")
+    if file_path.endswith(".zst"):
+        zstandard = _zstandard()
+        with open(file_path, "rb") as rf:
+            frames = find_zstd_frames(rf)
+        if len(frames) > 1 and num_workers > 0:
+            chunks = iter_zstd_frames(file_path, num_workers=num_workers, frames=frames)
+            return io.BufferedReader(ChunkReader(chunks), buffer_size=1 << 20)
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, "rb"), closefd=True, read_across_frames=True
+        )
+    return open(file_path, "rb")
+
+
+def open_text(file_path: str, num_workers: int = 4) -> TextIO:
+    """Like `open(file_path, "r")`, for plain and compressed files alike."""
+    if not is_compressed(file_path):
+        return open(file_path, "r")
+    return io.TextIOWrapper(open_binary(file_path, num_workers), encoding="utf-8")
+
+
+def compress_zstd_frames(
+    file_path: str, output_path: str, frame_size: int = 1 << 22, level: int = 3
+) -> str:
+    """Compresses `file_path` into `output_path` as independent zstd frames of about
+    `frame_size` uncompressed bytes each, ending at line boundaries, which
+    `open_text` can decompress in parallel.
+    """
+    compressor = _zstandard().ZstdCompressor(level=level)
+    with open(file_path, "rb") as rf, open(output_path, "wb") as wf:
+        while True:
+            chunk = rf.read(frame_size)
+            if not chunk:
+                break
+            chunk += rf.readline()
+            wf.write(compressor.compress(chunk))
+    return output_path
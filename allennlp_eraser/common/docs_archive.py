@@ -0,0 +1,250 @@
+"""
+A packed, indexed alternative to the `docs/` directory and the `docs.jsonl` file.
+
+The archive (`docs.pack`) is laid out as
+
+    magic (8 bytes) | index offset (uint64) | source size (int64)
+        | source mtime (int64, ns) | documents ... | index
+
+in little endian, where each document is its newline separated sentences, optionally
+zlib compressed, and the index is a JSON object mapping docids to `(offset, length)`
+of their bytes.
+Documents are read through a single mmap, so loading a subset of them needs neither
+one `open` per document nor parsing the whole `docs.jsonl`.
+
+Convert an ERASER dataset directory once with
+
+    python -m allennlp_eraser.common.docs_archive path/to/data_dir [--compress]
+
+after which `load_documents` picks up the archive automatically. The header also
+records the size and mtime of the `docs.jsonl` file the archive was packed from, or
+the mtime of the `docs` directory, which changes when documents are added, removed
+or renamed; an archive whose source has changed since is ignored until it is packed
+again. Documents of a `docs` directory edited in place need packing again by hand.
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from allennlp_eraser.common.compression import find_compressed, open_text
+from allennlp_eraser.common.document import DocumentView
+
+logger = logging.getLogger(__name__)
+
+DOCS_ARCHIVE_NAME = "docs.pack"
+
+_MAGIC = b"ERDOCS02"
+_HEADER = struct.Struct("<8sQqq")
+# the source size of a `docs` directory
+_NO_SIZE = -1
+
+
+def _source_layout(data_dir: str) -> str:
+    if find_compressed(os.path.join(data_dir, "docs.jsonl")):
+        return "docs.jsonl"
+    return "docs"
+
+
+def _source_key(data_dir: str) -> Optional[Tuple[int, int]]:
+    """Size and mtime (ns) of the `docs.jsonl` of `data_dir`, or the mtime of its
+    `docs` directory; None if it has neither layout. Only needs a single `stat`.
+    """
+    docs_file = find_compressed(os.path.join(data_dir, "docs.jsonl"))
+    if docs_file:
+        stat = os.stat(docs_file)
+        return stat.st_size, stat.st_mtime_ns
+
+    docs_dir = os.path.join(data_dir, "docs")
+    if not os.path.isdir(docs_dir):
+        return None
+    return _NO_SIZE, os.stat(docs_dir).st_mtime_ns
+
+
+def _iter_source_documents(data_dir: str) -> Iterator[Tuple[str, str]]:
+    if _source_layout(data_dir) == "docs.jsonl":
+        docs_file = find_compressed(os.path.join(data_dir, "docs.jsonl"))
+        with open_text(docs_file) as rf:
+            for line in rf:
+                content = json.loads(line)
+                yield content["docid"], content["document"]
+        return
+
+    docs_dir = os.path.join(data_dir, "docs")
+    for docid in sorted(os.listdir(docs_dir)):
+        with open(os.path.join(docs_dir, docid), "r") as rf:
+            # same normalization as `load_documents` applies to the docs/ layout
+            lines = [line.strip() for line in rf.readlines()]
+            yield docid, "\n".join(filter(lambda x: bool(len(x)), lines))
+
+
+def pack_documents(
+    data_dir: str, output_path: Optional[str] = None, compress: bool = False
+) -> str:
+    """Packs the documents of `data_dir` (either layout) into a docs archive.
+    Returns the path of the written archive.
+    """
+    output_path = output_path or os.path.join(data_dir, DOCS_ARCHIVE_NAME)
+    index: Dict[str, Tuple[int, int]] = {}
+    # taken before reading, so that changes made while packing make it stale
+    source_key = _source_key(data_dir)
+    if source_key is None:
+        raise FileNotFoundError(f"{data_dir} has neither docs.jsonl nor docs/")
+    source_size, source_mtime_ns = source_key
+
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as wf:
+            wf.write(_HEADER.pack(_MAGIC, 0, 0, 0))
+            for docid, document in _iter_source_documents(data_dir):
+                data = document.encode("utf-8")
+                if compress:
+                    data = zlib.compress(data)
+                index[docid] = (wf.tell(), len(data))
+                wf.write(data)
+
+            index_offset = wf.tell()
+            meta = {
+                "layout": _source_layout(data_dir),
+                "compression": "zlib" if compress else None,
+                "docs": index,
+            }
+            wf.write(json.dumps(meta).encode("utf-8"))
+            wf.seek(0)
+            wf.write(_HEADER.pack(_MAGIC, index_offset, source_size, source_mtime_ns))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return output_path
+
+
+class DocsArchive:
+    """Random access by docid to the documents of a docs archive."""
+
+    def __init__(self, file_path: str) -> None:
+        self._file = open(file_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_offset, source_size, source_mtime_ns = _HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{file_path} is not a docs archive")
+        self.source_key = source_size, source_mtime_ns
+
+        meta = json.loads(self._mmap[index_offset:].decode("utf-8"))
+        self._layout = meta["layout"]
+        self._compressed = meta["compression"] == "zlib"
+        self._index: Dict[str, Tuple[int, int]] = meta["docs"]
+
+    def __enter__(self) -> "DocsArchive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __contains__(self, docid: str) -> bool:
+        return docid in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def docids(self) -> List[str]:
+        return sorted(self._index.keys())
+
+    def read(self, docid: str) -> str:
+        offset, length = self._index[docid]
+        data = self._mmap[offset : offset + length]
+        if self._compressed:
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+    def read_document(self, docid: str) -> DocumentView:
+        # documents of the docs/ layout were normalized when packed, stripping them
+        # again only turns an empty document into zero sentences, as load_documents does
+        return DocumentView(self.read(docid), strip=self._layout == "docs")
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+
+def _read_header(file_path: str) -> Tuple[bytes, Tuple[int, int]]:
+    with open(file_path, "rb") as rf:
+        magic, _, source_size, source_mtime_ns = _HEADER.unpack(rf.read(_HEADER.size))
+    return magic, (source_size, source_mtime_ns)
+
+
+def find_docs_archive(data_dir: str) -> Optional[DocsArchive]:
+    """The opened docs archive of `data_dir`, None if there is none or if the
+    documents it was packed from have changed since. Only the archive's header is
+    read to tell. The caller closes the archive.
+    """
+    archive_path = os.path.join(data_dir, DOCS_ARCHIVE_NAME)
+    if not os.path.exists(archive_path):
+        return None
+    magic, packed_key = _read_header(archive_path)
+    if magic != _MAGIC:
+        logger.warning(
+            "Ignoring %s, it was packed by another version and needs packing again",
+            archive_path,
+        )
+        return None
+    source_key = _source_key(data_dir)
+    # without a source, the archive is all there is
+    if source_key is None or source_key == packed_key:
+        return DocsArchive(archive_path)
+    logger.warning(
+        "Ignoring %s, the documents of %s changed since it was packed",
+        archive_path,
+        data_dir,
+    )
+    return None
+
+
+def load_documents_from_archive(
+    archive: DocsArchive, docids: Set[str] = None
+) -> Dict[str, DocumentView]:
+    """Loads a subset of the documents of an opened docs archive,
+    in the same format as `load_documents`.
+    """
+    if docids is None:
+        docids = archive.docids()
+    else:
+        docids = sorted(set(str(d) for d in docids))
+
+    res = dict()
+    for d in docids:
+        res[d] = archive.read_document(d)
+    return res
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Pack the docs/ directory or docs.jsonl of an ERASER dataset "
+        f"into a single indexed {DOCS_ARCHIVE_NAME} archive."
+    )
+    parser.add_argument("data_dir", help="dataset directory containing the documents")
+    parser.add_argument(
+        "--output", default=None, help=f"defaults to <data_dir>/{DOCS_ARCHIVE_NAME}"
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="zlib compress each document"
+    )
+    parsed = parser.parse_args(args)
+
+    output_path = pack_documents(parsed.data_dir, parsed.output, parsed.compress)
+    print(output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+from array import array
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+def _sentence_spans(text: str, strip: bool) -> array:
+    """Character spans of the newline separated sentences of `text`, as a flat
+    `[start_0, end_0, start_1, end_1, ...]` array. With `strip`, sentences are
+    stripped of surrounding whitespace and empty ones are skipped.
+    """
+    spans = array("q")
+    start = 0
+    while start <= len(text):
+        end = text.find("\n", start)
+        if end == -1:
+            end = len(text)
+        if strip:
+            line = text[start:end]
+            stripped = line.strip()
+            if stripped:
+                sentence_start = start + len(line) - len(line.lstrip())
+                spans.extend((sentence_start, sentence_start + len(stripped)))
+        else:
+            spans.extend((start, end))
+        start = end + 1
+    return spans
+
+
+class _ReadOnlySequence(Sequence):
+    __slots__ = ()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self)!r})"
+
+
+class DocumentView(_ReadOnlySequence):
+    """
+    Read-only view of a document whose newline separated sentences are kept in a
+    single string. Sentence boundaries are computed on first access and stored as
+    offsets into that string, so no per-sentence objects are kept around.
+
+    Like the lists returned by `load_documents` before, indexing yields one-element
+    `[sentence]` lists; use `sentence`, `flattened` and `tokens` for direct access.
+    """
+
+    __slots__ = ("_text", "_strip", "_spans")
+
+    def __init__(self, text: str, strip: bool = False) -> None:
+        self._text = text
+        self._strip = strip
+        self._spans = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def spans(self) -> array:
+        if self._spans is None:
+            self._spans = _sentence_spans(self._text, self._strip)
+        return self._spans
+
+    def __len__(self) -> int:
+        return len(self.spans) // 2
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[List[str], List[List[str]]]:
+        if isinstance(index, slice):
+            return [[self.sentence(i)] for i in range(*index.indices(len(self)))]
+        return [self.sentence(index)]
+
+    def sentence(self, index: int) -> str:
+        start, end = self.sentence_span(index)
+        return self._text[start:end]
+
+    def sentence_span(self, index: int) -> Tuple[int, int]:
+        """Character span of the `index`-th sentence in the backing string."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sentence index out of range")
+        return self.spans[2 * index], self.spans[2 * index + 1]
+
+    def flattened(self) -> "FlattenedDocumentView":
+        return FlattenedDocumentView(self)
+
+    def tokens(self) -> "TokenView":
+        return TokenView(self)
+
+
+class FlattenedDocumentView(_ReadOnlySequence):
+    """The sentences of a `DocumentView` as a sequence of strings."""
+
+    __slots__ = ("_document",)
+
+    def __init__(self, document: DocumentView) -> None:
+        self._document = document
+
+    def __len__(self) -> int:
+        return len(self._document)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [
+                self._document.sentence(i) for i in range(*index.indices(len(self)))
+            ]
+        return self._document.sentence(index)
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self._document.sentence(i)
+
+
+class TokenView(_ReadOnlySequence):
+    """The space separated tokens of all sentences of a `DocumentView`."""
+
+    __slots__ = ("_document", "_spans")
+
+    def __init__(self, document: DocumentView) -> None:
+        self._document = document
+        self._spans = None
+
+    @property
+    def spans(self) -> array:
+        if self._spans is None:
+            text = self._document.text
+            spans = array("q")
+            for i in range(len(self._document)):
+                start, end = self._document.sentence_span(i)
+                position = start
+                for token in text[start:end].split():
+                    position = text.index(token, position, end)
+                    spans.extend((position, position + len(token)))
+                    position += len(token)
+            self._spans = spans
+        return self._spans
+
+    def __len__(self) -> int:
+        return len(self.spans) // 2
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return self._document.text[self.spans[2 * index] : self.spans[2 * index + 1]]
+
+
+def _num_tokens(sentence: Union[str, Sequence[str]]) -> int:
+    if isinstance(sentence, str):
+        return len(sentence.split())
+    # either a `[sentence]` list as returned by `load_documents` or a tokenized sentence
+    return sum(len(part.split()) for part in sentence)
+
+
+class SentenceOffsetIndex:
+    """
+    Sentence boundaries of documents in token coordinates.
+
+    For each document, `offsets(docid)` is an array of `len(document) + 1` token
+    offsets where sentence `i` covers tokens `[offsets[i], offsets[i + 1])`. Arrays
+    are computed once per document and cached, which makes converting between
+    sentence and token positions O(1) and lets token scores be reduced to sentence
+    scores with a single `reduceat`.
+
+    `docs` are documents as returned by `load_documents`, i.e. sequences of sentences.
+    """
+
+    def __init__(self, docs: Dict[str, Sequence]) -> None:
+        self._docs = docs
+        self._offsets: Dict[str, np.ndarray] = {}
+        self._token_to_sentence: Dict[str, np.ndarray] = {}
+
+    def offsets(self, docid: str) -> np.ndarray:
+        if docid not in self._offsets:
+            counts = np.fromiter(
+                (_num_tokens(sentence) for sentence in self._docs[docid]),
+                dtype=np.int64,
+            )
+            offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._offsets[docid] = offsets
+        return self._offsets[docid]
+
+    def num_tokens(self, docid: str) -> int:
+        return int(self.offsets(docid)[-1])
+
+    def token_to_sentence(self, docid: str) -> np.ndarray:
+        """Sentence index of every token of `docid`."""
+        if docid not in self._token_to_sentence:
+            offsets = self.offsets(docid)
+            self._token_to_sentence[docid] = np.repeat(
+                np.arange(len(offsets) - 1), np.diff(offsets)
+            )
+        return self._token_to_sentence[docid]
+
+    def sentence_span_to_tokens(
+        self, docid: str, start_sentence: int, end_sentence: int
+    ) -> Tuple[int, int]:
+        offsets = self.offsets(docid)
+        return int(offsets[start_sentence]), int(offsets[end_sentence])
+
+    def token_span_to_sentences(
+        self, docid: str, start_token: int, end_token: int
+    ) -> Tuple[int, int]:
+        """The smallest sentence span covering tokens `[start_token, end_token)`."""
+        if end_token <= start_token:
+            sentence = int(np.searchsorted(self.offsets(docid), start_token, "right"))
+            return sentence - 1, sentence - 1
+        token_to_sentence = self.token_to_sentence(docid)
+        return (
+            int(token_to_sentence[start_token]),
+            int(token_to_sentence[end_token - 1]) + 1,
+        )
+
+    def sentence_scores(
+        self,
+        docid: str,
+        token_scores: Sequence[float],
+        reduction: Callable[..., np.ndarray] = np.maximum,
+    ) -> np.ndarray:
+        """Reduces per-token scores of `docid` to per-sentence scores with the
+        `reduceat` of the numpy ufunc `reduction`. Empty sentences score 0.
+        """
+        offsets = self.offsets(docid)
+        token_scores = np.asarray(token_scores, dtype=float)
+        if len(token_scores) != offsets[-1]:
+            raise ValueError(
+                f"Expected {offsets[-1]} token scores for {docid}, "
+                f"got {len(token_scores)}"
+            )
+
+        scores = np.zeros(len(offsets) - 1)
+        non_empty = np.flatnonzero(np.diff(offsets))
+        if len(non_empty) > 0:
+            scores[non_empty] = reduction.reduceat(token_scores, offsets[non_empty])
+        return scores
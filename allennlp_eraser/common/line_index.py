@@ -0,0 +1,210 @@
+"""
+Byte offsets of the records of a JSONL file, for random access, byte-range
+sharding, reading the first records and sampling records without scanning the file.
+
+The index of `train.jsonl` is stored next to it as `train.jsonl.lineidx`:
+
+    magic (8 bytes) | file size | file mtime (ns) | number of records | offsets ...
+
+with `number of records + 1` uint64 offsets, the last one being the file size.
+It is rebuilt whenever the size or the mtime of the file changes.
+"""
+
+import json
+import os
+import random
+import struct
+from array import array
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from allennlp_eraser.common.compression import is_compressed, open_text
+
+LINE_INDEX_SUFFIX = ".lineidx"
+
+_MAGIC = b"ERLIDX01"
+_HEADER = struct.Struct("<8sQqQ")
+
+
+def _file_key(file_path: str) -> Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class LineIndex:
+    """
+    Start offsets of the non-blank lines of a JSONL file. Record `i` spans the bytes
+    `[offsets[i], offsets[i + 1])`, which may include trailing blank lines.
+    Use `LineIndex.open` to load the stored index or build and store it.
+    """
+
+    def __init__(self, file_path: str, offsets: array) -> None:
+        self._file_path = str(file_path)
+        self._offsets = offsets
+
+    @classmethod
+    def build(cls, file_path: str) -> "LineIndex":
+        offsets = array("Q")
+        position = 0
+        with open(file_path, "rb") as rf:
+            for line in rf:
+                if line.strip():
+                    offsets.append(position)
+                position += len(line)
+        offsets.append(position)
+        return cls(file_path, offsets)
+
+    @classmethod
+    def index_path(cls, file_path: str) -> str:
+        return str(file_path) + LINE_INDEX_SUFFIX
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["LineIndex"]:
+        """The stored index of `file_path`, or `None` if it is missing or stale."""
+        try:
+            with open(cls.index_path(file_path), "rb") as rf:
+                magic, size, mtime_ns, num_records = _HEADER.unpack(
+                    rf.read(_HEADER.size)
+                )
+                if magic != _MAGIC or (size, mtime_ns) != _file_key(file_path):
+                    return None
+                offsets = array("Q")
+                offsets.fromfile(rf, num_records + 1)
+        except (OSError, EOFError, struct.error):
+            return None
+        return cls(file_path, offsets)
+
+    def save(self) -> None:
+        size, mtime_ns = _file_key(self._file_path)
+        index_path = self.index_path(self._file_path)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as wf:
+            wf.write(_HEADER.pack(_MAGIC, size, mtime_ns, len(self)))
+            self._offsets.tofile(wf)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def open(cls, file_path: str) -> "LineIndex":
+        index = cls.load(file_path)
+        if index is None:
+            index = cls.build(file_path)
+            try:
+                index.save()
+            except OSError:
+                # e.g. a read-only dataset directory, keep the index in memory
+                pass
+        return index
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def byte_range(self, start: int, stop: int) -> Tuple[int, int]:
+        """Byte span of the records `[start, stop)`."""
+        return self._offsets[start], self._offsets[stop]
+
+    def shard_range(self, index: int, count: int) -> Tuple[int, int]:
+        """The contiguous records `[start, stop)` of shard `index` out of `count`."""
+        return len(self) * index // count, len(self) * (index + 1) // count
+
+    def iter_lines(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        """The lines of the records `[start, stop)`, reading only their bytes."""
+        stop = len(self) if stop is None else stop
+        if start >= stop:
+            return
+        begin, end = self.byte_range(start, stop)
+        with open(self._file_path, "rb") as rf:
+            rf.seek(begin)
+            while rf.tell() < end:
+                line = rf.readline()
+                if line.strip():
+                    yield line.decode("utf-8")
+
+    def iter_shard(self, index: int, count: int) -> Iterator[str]:
+        return self.iter_lines(*self.shard_range(index, count))
+
+    def iter_lines_at(self, indices: Iterable[int]) -> Iterator[str]:
+        """The lines of the records `indices`, in the order given, reading only
+        their bytes through a single file handle.
+        """
+        with open(self._file_path, "rb") as rf:
+            for i in indices:
+                begin, end = self.byte_range(i, i + 1)
+                rf.seek(begin)
+                yield rf.read(end - begin).decode("utf-8")
+
+    def sample(self, num_samples: int, seed: Optional[int] = None) -> List[int]:
+        """`num_samples` distinct record indices drawn uniformly, in file order."""
+        return sorted(random.Random(seed).sample(range(len(self)), num_samples))
+
+    def line(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("record index out of range")
+        begin, end = self.byte_range(i, i + 1)
+        with open(self._file_path, "rb") as rf:
+            rf.seek(begin)
+            return rf.read(end - begin).decode("utf-8")
+
+    def __getitem__(self, i: int) -> Any:
+        return json.loads(self.line(i))
+
+
+def iter_jsonl_lines(
+    file_path: str,
+    shard: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[str]:
+    """The non-blank lines of the JSONL file at `file_path`. With an `(index, count)`
+    shard, only those of a contiguous block of records, read through its `LineIndex`.
+    With a `limit`, only the first `limit` of them; their bytes are then the only
+    ones read if the file has a `LineIndex`, whether stored or opened for a shard.
+    Compressed files have no byte offsets to seek to, their shards are every
+    count-th line instead.
+    """
+    if not is_compressed(file_path):
+        index: Optional[LineIndex] = None
+        if shard is not None and shard[1] > 1:
+            index = LineIndex.open(file_path)
+        elif limit is not None:
+            # building an index reads the whole file, only use a stored one
+            index = LineIndex.load(file_path)
+        if index is not None:
+            start, stop = index.shard_range(*(shard or (0, 1)))
+            if limit is not None:
+                stop = min(stop, start + limit)
+            yield from index.iter_lines(start, stop)
+            return
+
+    with open_text(file_path) as rf:
+        lines = (line for line in rf if line.strip())
+        if shard is not None:
+            lines = islice(lines, shard[0], None, shard[1])
+        if limit is not None:
+            lines = islice(lines, limit)
+        yield from lines
+
+
+def sample_jsonl_lines(
+    file_path: str, num_samples: int, seed: Optional[int] = None
+) -> List[str]:
+    """`num_samples` non-blank lines of the JSONL file at `file_path` drawn uniformly
+    without replacement (all of them if it has fewer), in file order. Only the
+    sampled lines are read, through the file's `LineIndex`; a compressed file is
+    read whole, keeping a reservoir of lines.
+    """
+    if not is_compressed(file_path):
+        index = LineIndex.open(file_path)
+        num_samples = min(num_samples, len(index))
+        return list(index.iter_lines_at(index.sample(num_samples, seed)))
+
+    rng = random.Random(seed)
+    reservoir: List[Tuple[int, str]] = []
+    for i, line in enumerate(iter_jsonl_lines(file_path)):
+        if len(reservoir) < num_samples:
+            reservoir.append((i, line))
+        else:
+            j = rng.randrange(i + 1)
+            if j < num_samples:
+                reservoir[j] = (i, line)
+    return [line for _, line in sorted(reservoir)]
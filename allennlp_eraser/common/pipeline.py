@@ -0,0 +1,186 @@
+"""
+Threaded producer/consumer stages connected by bounded queues.
+
+The first stage iterates the source (typically file reading and parsing), every
+following stage maps each item it receives to zero or more items for the next one.
+Each stage runs in its own thread, so an I/O bound stage keeps reading ahead while a
+CPU bound one (tokenization, field building) is busy, at most `queue_size` items
+ahead. A full queue blocks its producer, which bounds the memory in flight.
+
+Per-stage counters are available from `Pipeline.stats()`, while or after the
+pipeline runs:
+
+    items_in, items_out  items received and produced
+    busy_seconds         time spent in the stage's own work
+    blocked_seconds      time spent waiting for room in the output queue
+    items_per_second     items_out / busy_seconds
+    queue_capacity, queue_max_occupancy, queue_mean_occupancy
+                         of the output queue, sampled on every put
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Sequence
+
+Stage = Callable[[Any], Iterable[Any]]
+
+_END = object()
+
+
+class _Failure(NamedTuple):
+    error: BaseException
+
+
+class StageStats:
+    def __init__(self, name: str, queue_capacity: int) -> None:
+        self.name = name
+        self.queue_capacity = queue_capacity
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.queue_max_occupancy = 0
+        self._occupancy_total = 0
+        self._occupancy_samples = 0
+
+    def sample_occupancy(self, occupancy: int) -> None:
+        self.queue_max_occupancy = max(self.queue_max_occupancy, occupancy)
+        self._occupancy_total += occupancy
+        self._occupancy_samples += 1
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_seconds": self.busy_seconds,
+            "blocked_seconds": self.blocked_seconds,
+            "items_per_second": (
+                self.items_out / self.busy_seconds if self.busy_seconds else 0.0
+            ),
+            "queue_capacity": self.queue_capacity,
+            "queue_max_occupancy": self.queue_max_occupancy,
+            "queue_mean_occupancy": (
+                self._occupancy_total / self._occupancy_samples
+                if self._occupancy_samples
+                else 0.0
+            ),
+        }
+
+
+class Pipeline:
+    """
+    `stages` are `(name, function)` pairs; each function maps one item to an iterable
+    of items for the next stage. `run(source)` yields the items of the last stage in
+    order. Exceptions raised in any stage are re-raised by `run`.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Any],
+        queue_size: int = 64,
+        source_name: str = "read",
+    ) -> None:
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be positive, got {queue_size}")
+        self._stages = list(stages)
+        self._queue_size = queue_size
+        self._stats = [StageStats(source_name, queue_size)] + [
+            StageStats(name, queue_size) for name, _ in self._stages
+        ]
+        self._stop = threading.Event()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {stats.name: stats.to_dict() for stats in self._stats}
+
+    def _put(self, out: queue.Queue, item: Any, stats: StageStats) -> bool:
+        stats.sample_occupancy(out.qsize())
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.blocked_seconds += time.perf_counter() - start
+
+    def _produce(self, source: Iterable[Any], out: queue.Queue) -> None:
+        stats = self._stats[0]
+        try:
+            iterator = iter(source)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy_seconds += time.perf_counter() - start
+                stats.items_out += 1
+                if not self._put(out, item, stats):
+                    return
+        except BaseException as e:
+            self._put(out, _Failure(e), stats)
+            return
+        self._put(out, _END, stats)
+
+    def _transform(
+        self, function: Stage, stats: StageStats, in_: queue.Queue, out: queue.Queue
+    ) -> None:
+        while True:
+            try:
+                item = in_.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _END or isinstance(item, _Failure):
+                self._put(out, item, stats)
+                return
+
+            stats.items_in += 1
+            start = time.perf_counter()
+            try:
+                outputs = list(function(item))
+            except BaseException as e:
+                self._put(out, _Failure(e), stats)
+                return
+            finally:
+                stats.busy_seconds += time.perf_counter() - start
+            for output in outputs:
+                stats.items_out += 1
+                if not self._put(out, output, stats):
+                    return
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        queues: List[queue.Queue] = [
+            queue.Queue(maxsize=self._queue_size) for _ in self._stats
+        ]
+        threads = [threading.Thread(target=self._produce, args=(source, queues[0]))] + [
+            threading.Thread(
+                target=self._transform,
+                args=(function, stats, queues[i], queues[i + 1]),
+            )
+            for i, ((_, function), stats) in enumerate(
+                zip(self._stages, self._stats[1:])
+            )
+        ]
+        for thread in threads:
+            # a source blocked on I/O must not keep the interpreter alive
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            # also reached when the consumer stops early, which unblocks the stages
+            self._stop.set()
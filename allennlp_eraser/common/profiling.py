@@ -0,0 +1,445 @@
+"""
+Opt-in per-stage timing of the dataset readers.
+
+A reader built with `profile=True` times its stages (reading, decoding, tokenization,
+instance building, ...) through a `ReaderProfiler`:
+
+    reader = BoolqDatasetReader(profile=True)
+    instances = list(reader.read("train.jsonl"))
+    reader.profiler.report()
+    # {"read": {"count": 9427, "wall_seconds": 0.41, "cpu_seconds": 0.40,
+    #           "items_per_second": 22992.7}, "tokenize": {...}, ...}
+
+Stages nest, e.g. a tokenization stage pulling its texts from a reading stage, and
+the time of a stage excludes the time of the stages nested in it, so the times of
+all the stages add up to the time spent in the reader. CPU time is the CPU time of
+the thread running the stage. With `log_interval`, the report is logged every that
+many seconds while reading.
+
+With `memory=True` (`profile_memory=True` on the readers) every stage also reports
+
+    tracemalloc_peak_bytes  the largest tracemalloc peak of one item of the stage,
+                            above the traced memory at its start, nested stages
+                            included; None if it cannot be measured, see below
+    rss_delta_bytes         the change of the resident set size over the stage,
+                            nested stages excluded
+    peak_rss_bytes          the peak resident set size of the process so far
+    objects                 the live objects of `TRACKED_TYPES` (by type name) after
+                            the stage, counted at most every `object_count_interval`
+                            seconds per stage
+
+Tracing is started when a memory stage is entered while tracemalloc is not running,
+and stopped again once no memory stage is active in any thread. tracemalloc is
+process wide and its peak cannot tell threads apart, so the peak of a stage that ran
+while memory stages were active in another thread (e.g. in the threads of a
+pipelined reader) is not measured. Neither is any peak before Python 3.9, where
+tracemalloc peaks cannot be reset. Memory accounting slows reading down
+considerably, so times should be taken with it off.
+
+Without `profile`, readers use `NULL_PROFILER`, whose `stage` is a shared no-op
+context manager and whose `iterate` returns the iterable unchanged.
+"""
+
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRACKED_TYPES = (
+    "Annotation",
+    "Evidence",
+    "PositionScoredDocument",
+    "Rationale",
+    "Token",
+)
+
+
+def rss_bytes() -> Optional[int]:
+    """The resident set size of the process, None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as rf:
+            return int(rf.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """The peak resident set size of the process, None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_objects(type_names: Sequence[str] = TRACKED_TYPES) -> Dict[str, int]:
+    """The number of live objects of each of the types named `type_names`."""
+    counts = dict.fromkeys(type_names, 0)
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in counts:
+            counts[name] += 1
+    return counts
+
+
+class _StageTotals:
+    __slots__ = (
+        "count",
+        "wall_seconds",
+        "cpu_seconds",
+        "tracemalloc_peak_bytes",
+        "peak_measured",
+        "rss_delta_bytes",
+        "peak_rss_bytes",
+        "objects",
+        "objects_counted_at",
+    )
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.tracemalloc_peak_bytes = 0
+        self.peak_measured = True
+        self.rss_delta_bytes = 0
+        self.peak_rss_bytes: Optional[int] = None
+        self.objects: Optional[Dict[str, int]] = None
+        self.objects_counted_at = 0.0
+
+
+class _Timing:
+    __slots__ = (
+        "_profiler",
+        "_name",
+        "_items",
+        "_wall",
+        "_cpu",
+        "child_wall",
+        "child_cpu",
+    )
+
+    def __init__(self, profiler: "ReaderProfiler", name: str, items: int) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._items = items
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+
+    def __enter__(self) -> "_Timing":
+        self._profiler._stack().append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        stack = self._profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+            stack[-1].child_cpu += cpu
+        self._profiler._add(
+            self._name, self._items, wall - self.child_wall, cpu - self.child_cpu
+        )
+        if not stack:
+            self._profiler._maybe_log()
+
+
+# tracemalloc is process wide, so the peaks of the stages of all the profilers of a
+# thread nest in one stack
+_memory_local = threading.local()
+
+# the non-empty stacks of memory stages by thread, and whether tracing was started
+# by them
+_memory_lock = threading.Lock()
+_active_memory_stacks: Dict[int, List["_MemoryTiming"]] = {}
+_started_tracing = False
+
+_CAN_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+
+def _memory_stack() -> List["_MemoryTiming"]:
+    stack = getattr(_memory_local, "stack", None)
+    if stack is None:
+        stack = _memory_local.stack = []
+    return stack
+
+
+class _MemoryTiming(_Timing):
+    __slots__ = ("_traced", "_rss", "peak", "child_rss", "concurrent")
+
+    def __enter__(self) -> "_MemoryTiming":
+        global _started_tracing
+        self.concurrent = False
+        stack = _memory_stack()
+        with _memory_lock:
+            if not _active_memory_stacks and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            others = [
+                other_stack
+                for thread, other_stack in _active_memory_stacks.items()
+                if thread != threading.get_ident()
+            ]
+            if others:
+                # the peaks of all the stages active from now on mix both threads
+                self.concurrent = True
+                for timing in stack + [t for other in others for t in other]:
+                    timing.concurrent = True
+            _active_memory_stacks[threading.get_ident()] = stack
+
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # the peak of the enclosing stage so far, before it is reset
+                stack[-1].peak = max(stack[-1].peak, peak)
+            stack.append(self)
+            if _CAN_RESET_PEAK:
+                tracemalloc.reset_peak()
+        self._traced = current
+        self._rss = rss_bytes()
+        self.peak = current
+        self.child_rss = 0
+        return super().__enter__()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        global _started_tracing
+        super().__exit__(*exc_info)
+        rss = rss_bytes()
+        rss_delta = rss - self._rss if rss is not None and self._rss is not None else 0
+        stack = _memory_stack()
+        with _memory_lock:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            stack.pop()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+                stack[-1].child_rss += rss_delta
+            else:
+                del _active_memory_stacks[threading.get_ident()]
+                if not _active_memory_stacks and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
+        traced_peak = (
+            peak - self._traced if _CAN_RESET_PEAK and not self.concurrent else None
+        )
+        self._profiler._add_memory(self._name, traced_peak, rss_delta - self.child_rss)
+
+
+class _NullTiming:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTiming":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_TIMING = _NullTiming()
+
+
+class ReaderProfiler:
+    """Cumulative wall time, CPU time and item counts of named stages, and with
+    `memory` their memory use.
+    """
+
+    enabled = True
+
+    def __init__(
+        self,
+        name: str = "reader",
+        log_interval: Optional[float] = None,
+        memory: bool = False,
+        object_count_interval: float = 1.0,
+        tracked_types: Sequence[str] = TRACKED_TYPES,
+    ):
+        self.name = name
+        self.log_interval = log_interval
+        self.memory = memory
+        self.object_count_interval = object_count_interval
+        self.tracked_types = tuple(tracked_types)
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._totals: Dict[str, _StageTotals] = {}
+        self._last_log = time.perf_counter()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # readers are pickled into data loader workers, which start afresh
+        return {
+            "name": self.name,
+            "log_interval": self.log_interval,
+            "memory": self.memory,
+            "object_count_interval": self.object_count_interval,
+            "tracked_types": self.tracked_types,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def _stack(self) -> List[_Timing]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, name: str, items: int, wall: float, cpu: float) -> None:
+        with self._lock:
+            totals = self._totals.get(name)
+            if totals is None:
+                totals = self._totals[name] = _StageTotals()
+            totals.count += items
+            totals.wall_seconds += wall
+            totals.cpu_seconds += cpu
+
+    def _add_memory(
+        self, name: str, traced_peak: Optional[int], rss_delta: int
+    ) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            totals = self._totals[name]
+            count = (
+                totals.objects is None
+                or now - totals.objects_counted_at >= self.object_count_interval
+            )
+            if count:
+                totals.objects_counted_at = now
+        # counted outside the lock, this walks all the objects tracked by gc
+        objects = count_objects(self.tracked_types) if count else None
+        peak_rss = peak_rss_bytes()
+        with self._lock:
+            if traced_peak is None:
+                totals.peak_measured = False
+            else:
+                totals.tracemalloc_peak_bytes = max(
+                    totals.tracemalloc_peak_bytes, traced_peak
+                )
+            totals.rss_delta_bytes += rss_delta
+            totals.peak_rss_bytes = peak_rss
+            if objects is not None:
+                totals.objects = objects
+
+    def _maybe_log(self) -> None:
+        if self.log_interval is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            self.log()
+
+    def stage(self, name: str, items: int = 1) -> Any:
+        """A context manager timing its block as `items` items of the stage `name`."""
+        return self._timing(name, items)
+
+    def _timing(self, name: str, items: int) -> _Timing:
+        if self.memory:
+            return _MemoryTiming(self, name, items)
+        return _Timing(self, name, items)
+
+    def iterate(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yields the items of `iterable`, timing the production of each one as an
+        item of the stage `name`.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self._timing(name, 1) as timing:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    timing._items = 0
+                    break
+            yield item
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            report = {}
+            for name, totals in self._totals.items():
+                stats = report[name] = {
+                    "count": totals.count,
+                    "wall_seconds": totals.wall_seconds,
+                    "cpu_seconds": totals.cpu_seconds,
+                    "items_per_second": (
+                        totals.count / totals.wall_seconds
+                        if totals.wall_seconds
+                        else 0.0
+                    ),
+                }
+                if self.memory:
+                    stats["tracemalloc_peak_bytes"] = (
+                        totals.tracemalloc_peak_bytes if totals.peak_measured else None
+                    )
+                    stats["rss_delta_bytes"] = totals.rss_delta_bytes
+                    stats["peak_rss_bytes"] = totals.peak_rss_bytes
+                    stats["objects"] = dict(totals.objects or {})
+            return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals = {}
+
+    def log(self) -> None:
+        for name, stats in self.report().items():
+            logger.info(
+                "%s %s: %d items, %.3fs wall, %.3fs cpu, %.1f items/s",
+                self.name,
+                name,
+                stats["count"],
+                stats["wall_seconds"],
+                stats["cpu_seconds"],
+                stats["items_per_second"],
+            )
+            if self.memory:
+                peak = stats["tracemalloc_peak_bytes"]
+                logger.info(
+                    "%s %s: %s MiB traced peak, %+.1f MiB rss, objects %s",
+                    self.name,
+                    name,
+                    "n/a" if peak is None else f"{peak / 2**20:.1f}",
+                    stats["rss_delta_bytes"] / 2**20,
+                    stats["objects"],
+                )
+
+
+class _NullProfiler(ReaderProfiler):
+    enabled = False
+
+    def stage(self, name: str, items: int = 1) -> Any:
+        return _NULL_TIMING
+
+    def iterate(self, name: str, iterable: Iterable[T]) -> Iterable[T]:
+        return iterable
+
+
+NULL_PROFILER: ReaderProfiler = _NullProfiler("disabled")
+
+
+def reader_profiler(
+    reader: Any,
+    profile: bool,
+    log_interval: Optional[float] = None,
+    memory: bool = False,
+) -> ReaderProfiler:
+    """The profiler of `reader`: a new `ReaderProfiler` if `profile` or `memory`,
+    else `NULL_PROFILER`.
+    """
+    if not profile and not memory:
+        return NULL_PROFILER
+    return ReaderProfiler(type(reader).__name__, log_interval, memory=memory)
@@ -0,0 +1,210 @@
+import copy
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from allennlp.common.checks import ConfigurationError
+from allennlp.common.util import lazy_groups_of
+from allennlp.data.tokenizers import SpacyTokenizer, Token, Tokenizer
+from allennlp.data.tokenizers.sentence_splitter import (
+    SentenceSplitter,
+    SpacySentenceSplitter,
+)
+
+T = TypeVar("T")
+
+
+class BatchedSentenceSegmenter:
+    """
+    Splits texts into sentences and tokenizes the sentences, `batch_size` texts at
+    a time. Sentences are split with one `pipe` over the batch and all sentences of
+    the batch are tokenized with a single `batch_tokenize` call.
+
+    `n_process` only applies to `segment` with a spaCy splitter, which then parses
+    the whole stream of texts with a single multi-process `pipe`, so the worker
+    processes are started once per stream rather than once per batch.
+    `split_and_tokenize` always parses in the current process.
+
+    With `single_parse`, which requires a `SpacyTokenizer` and a
+    `SpacySentenceSplitter`, the tokens of every sentence are taken from the
+    splitter's own parse of the text, so each text goes through spaCy once instead
+    of being parsed by the splitter and then again by the tokenizer. The tokens then
+    carry the annotations of the splitter's pipeline rather than the tokenizer's;
+    the tokenizer's start and end tokens are added to every sentence, and its
+    whitespace tokens are kept if it keeps them. Token offsets are relative to the
+    whole text rather than to the sentence.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        sentence_splitter: SentenceSplitter,
+        batch_size: int = 1,
+        n_process: int = 1,
+        single_parse: bool = False,
+    ) -> None:
+        if single_parse and not (
+            isinstance(tokenizer, SpacyTokenizer)
+            and isinstance(sentence_splitter, SpacySentenceSplitter)
+        ):
+            raise ConfigurationError(
+                "single_parse requires a SpacyTokenizer and a SpacySentenceSplitter"
+            )
+        self._tokenizer = tokenizer
+        self._sentence_splitter = sentence_splitter
+        self._batch_size = batch_size
+        self._n_process = n_process
+        self._single_parse = single_parse
+        if single_parse:
+            (
+                self._start_tokens,
+                self._end_tokens,
+                self._keep_spaces,
+            ) = self._tokenizer_settings(tokenizer)
+
+    @staticmethod
+    def _tokenizer_settings(
+        tokenizer: Tokenizer,
+    ) -> Tuple[List[Token], List[Token], bool]:
+        """The start and end tokens `tokenizer` adds to every text and whether it
+        keeps whitespace tokens, found from its output for an empty and a two word
+        text.
+        """
+        added = tokenizer.tokenize("")
+        tokens = tokenizer.tokenize("x  x")
+        num_start = 0
+        while (
+            num_start < len(added) and tokens[num_start].text == added[num_start].text
+        ):
+            num_start += 1
+        num_words = len(tokens) - len(added)
+        words = tokens[num_start : num_start + num_words]
+        keep_spaces = any(not token.text.strip() for token in words)
+        return added[:num_start], added[num_start:], keep_spaces
+
+    def _tokenize_splits(
+        self, sentence_splits: List[List[str]]
+    ) -> List[List[List[Token]]]:
+        tokens = self._tokenizer.batch_tokenize(
+            [sentence for sentences in sentence_splits for sentence in sentences]
+        )
+
+        ret = []
+        start = 0
+        for sentences in sentence_splits:
+            ret.append(tokens[start : start + len(sentences)])
+            start += len(sentences)
+        return ret
+
+    def _tokenize_docs(self, docs: List) -> List[List[List[Token]]]:
+        """Returns the tokens of every sentence of the parsed spaCy `docs`."""
+        if self._single_parse:
+            return [
+                [self._sentence_tokens(sentence) for sentence in doc.sents]
+                for doc in docs
+            ]
+        return self._tokenize_splits(
+            [[sentence.text.strip() for sentence in doc.sents] for doc in docs]
+        )
+
+    def _sentence_tokens(self, sentence: Iterable) -> List[Token]:
+        """The tokens of the spaCy `sentence`, as the tokenizer would give them for
+        the stripped sentence text.
+        """
+        words = list(sentence)
+        # sentences are stripped before they are tokenized in the two pass mode
+        first, last = 0, len(words)
+        while first < last and words[first].is_space:
+            first += 1
+        while last > first and words[last - 1].is_space:
+            last -= 1
+        tokens = [
+            Token(
+                word.text,
+                word.idx,
+                word.idx + len(word.text),
+                word.lemma_,
+                word.pos_,
+                word.tag_,
+                word.dep_,
+                word.ent_type_,
+            )
+            for word in words[first:last]
+            if self._keep_spaces or not word.is_space
+        ]
+        return (
+            [copy.copy(token) for token in self._start_tokens]
+            + tokens
+            + [copy.copy(token) for token in self._end_tokens]
+        )
+
+    def split_and_tokenize(self, texts: List[str]) -> List[List[List[Token]]]:
+        """Returns the tokens of every sentence of every text."""
+        if self._single_parse:
+            return self._tokenize_docs(list(self._sentence_splitter.spacy.pipe(texts)))
+        return self._tokenize_splits(
+            self._sentence_splitter.batch_split_sentences(texts)
+        )
+
+    def segment(
+        self, items: Iterable[T], get_text: Callable[[T], str]
+    ) -> Iterator[Tuple[T, List[List[Token]]]]:
+        """Pairs every item with the sentence tokens of `get_text(item)`,
+        keeping the order of `items`.
+        """
+        if self._n_process <= 1 or not isinstance(
+            self._sentence_splitter, SpacySentenceSplitter
+        ):
+            for batch in lazy_groups_of(items, self._batch_size):
+                texts = [get_text(item) for item in batch]
+                yield from zip(batch, self.split_and_tokenize(texts))
+            return
+
+        # the items whose texts were handed to the pipe, in order; spaCy returns
+        # the docs in the order of their texts
+        pending: Deque[T] = deque()
+
+        def texts() -> Iterator[str]:
+            for item in items:
+                pending.append(item)
+                yield get_text(item)
+
+        docs = self._sentence_splitter.spacy.pipe(
+            texts(), batch_size=self._batch_size, n_process=self._n_process
+        )
+        for batch_docs in lazy_groups_of(docs, self._batch_size):
+            batch = [pending.popleft() for _ in batch_docs]
+            yield from zip(batch, self._tokenize_docs(batch_docs))
+
+
+def _truncate(tokens: List[Token], max_length: Optional[int]) -> List[Token]:
+    if max_length and len(tokens) > max_length:
+        tokens = tokens[:max_length]
+    return tokens
+
+
+def segment_or_tokenize(
+    texts: List[str],
+    tokenizer: Tokenizer,
+    segmenter: Optional[BatchedSentenceSegmenter] = None,
+    max_length: Optional[int] = None,
+) -> List[Union[List[Token], List[List[Token]]]]:
+    """
+    Tokenizes every text, into the tokens of each of its sentences when a
+    `segmenter` is given, truncating every token sequence to `max_length` tokens.
+    """
+    if segmenter is not None:
+        return [
+            [_truncate(tokens, max_length) for tokens in sentences]
+            for sentences in segmenter.split_and_tokenize(texts)
+        ]
+    return [_truncate(tokens, max_length) for tokens in tokenizer.batch_tokenize(texts)]
@@ -0,0 +1,65 @@
+"""
+The shard of the data a `DatasetReader` reads in the current process. Kept apart
+from `allennlp_eraser.common.util` so that torch is only imported by the readers
+that shard their input.
+"""
+
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Tuple, TypeVar
+
+import torch.distributed as dist
+from allennlp.data.dataset_readers import DatasetReader
+from torch.utils.data import get_worker_info
+
+T = TypeVar("T")
+
+
+def reader_shard(reader: DatasetReader) -> Tuple[int, int]:
+    """`(index, count)` of the shard of the data the current process reads with
+    `reader`, following its `manual_distributed_sharding` and
+    `manual_multi_process_sharding` flags the same way `DatasetReader` does.
+    """
+    index, count = 0, 1
+    if (
+        reader.manual_distributed_sharding
+        and dist.is_available()
+        and dist.is_initialized()
+    ):
+        index, count = dist.get_rank(), dist.get_world_size()
+    if reader.manual_multi_process_sharding:
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            index = index * worker_info.num_workers + worker_info.id
+            count *= worker_info.num_workers
+    return index, count
+
+
+def reader_record_limit(reader: DatasetReader) -> Optional[int]:
+    """The number of records of its shard that `reader` reads at most to produce its
+    `max_instances`, if it produces at least one instance per record; None without
+    `max_instances`. `DatasetReader` itself spreads the instances over the
+    processes that do not shard manually, each taking up to `max_instances`.
+    """
+    if reader.max_instances is None:
+        return None
+    count = 1
+    if (
+        not reader.manual_distributed_sharding
+        and dist.is_available()
+        and dist.is_initialized()
+    ):
+        count *= dist.get_world_size()
+    if not reader.manual_multi_process_sharding:
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            count *= worker_info.num_workers
+    return reader.max_instances * count
+
+
+def shard_iterable(reader: DatasetReader, iterable: Iterable[T]) -> Iterator[T]:
+    """The items of `iterable` owned by the current shard of `reader`, see
+    `reader_shard`. Items owned by other shards are skipped without being touched,
+    e.g. undecoded lines of a file.
+    """
+    index, count = reader_shard(reader)
+    return islice(iterable, index, None, count)
@@ -0,0 +1,255 @@
+"""
+Deterministic, ERASER-shaped synthetic data for benchmarks and scale tests.
+
+`write_synthetic_dataset` writes into `data_dir`
+
+    docs/<docid>            newline separated sentences of space separated tokens,
+      or docs.jsonl         one `{"docid": ..., "document": ...}` per line
+    <split>.jsonl           annotations, one evidence group per annotation
+    predictions.jsonl       one prediction per annotation, with hard and soft
+                            rationales, classification scores and thresholded scores
+
+Sentence and document lengths are lognormal around the requested medians, and
+everything is written as it is generated, so the size of a dataset is only
+bounded by the disk. The same arguments and `seed` always give the same files,
+and a smaller dataset is a prefix of a larger one with the same arguments.
+
+    python -m allennlp_eraser.common.synthetic <data_dir> --documents 1000000
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+LABELS = ("POS", "NEG")
+DEFAULT_THRESHOLDS = (0.01, 0.05, 0.1, 0.2, 0.5)
+DOCS_FORMATS = ("dir", "jsonl")
+
+
+class SyntheticDataset(NamedTuple):
+    data_dir: str
+    annotations_path: str
+    predictions_path: str
+    thresholds: Sequence[float]
+
+
+def _word(rng: random.Random) -> str:
+    return f"w{rng.randrange(5000)}"
+
+
+def _length(rng: random.Random, median: int, sigma: float) -> int:
+    """A lognormal length with the given median; exactly `median` when `sigma` is 0."""
+    if sigma <= 0:
+        return median
+    return max(1, round(rng.lognormvariate(math.log(median), sigma)))
+
+
+def synthetic_document(
+    rng: random.Random,
+    num_sentences: int,
+    tokens_per_sentence: int,
+    length_sigma: float = 0.0,
+) -> List[List[str]]:
+    return [
+        [_word(rng) for _ in range(_length(rng, tokens_per_sentence, length_sigma))]
+        for _ in range(_length(rng, num_sentences, length_sigma))
+    ]
+
+
+def _class_scores(rng: random.Random, label: str) -> Dict[str, float]:
+    score = rng.uniform(0.5, 1.0)
+    return {label: score, **{other: 1 - score for other in LABELS if other != label}}
+
+
+def synthetic_annotation(
+    rng: random.Random,
+    annotation_id: str,
+    docid: str,
+    document: List[List[str]],
+    num_evidences: int,
+) -> Dict[str, Any]:
+    offsets = [0]
+    for sentence in document:
+        offsets.append(offsets[-1] + len(sentence))
+    sentence_ids = sorted(rng.sample(range(len(document)), num_evidences))
+
+    evidences = []
+    for i in sentence_ids:
+        start_token = offsets[i] + rng.randrange(len(document[i]))
+        end_token = rng.randint(start_token + 1, offsets[i + 1])
+        evidences.append(
+            {
+                "docid": docid,
+                "start_token": start_token,
+                "end_token": end_token,
+                "start_sentence": i,
+                "end_sentence": i + 1,
+                "text": " ".join(
+                    document[i][start_token - offsets[i] : end_token - offsets[i]]
+                ),
+            }
+        )
+    return {
+        "annotation_id": annotation_id,
+        "query": " ".join(_word(rng) for _ in range(8)),
+        "evidences": [evidences],
+        "classification": rng.choice(LABELS),
+        "query_type": None,
+        "docids": None,
+    }
+
+
+def synthetic_prediction(
+    rng: random.Random,
+    annotation: Dict[str, Any],
+    document: List[List[str]],
+    thresholds: Sequence[float],
+) -> Dict[str, Any]:
+    num_tokens = sum(len(sentence) for sentence in document)
+    hard_predictions = []
+    for evidence in annotation["evidences"][0]:
+        # predicted spans overlap the evidences partially
+        start_token = max(0, evidence["start_token"] + rng.randint(-3, 3))
+        end_token = min(
+            num_tokens, max(start_token + 1, evidence["end_token"] + rng.randint(-3, 3))
+        )
+        if hard_predictions and start_token < hard_predictions[-1]["end_token"]:
+            continue
+        hard_predictions.append({"start_token": start_token, "end_token": end_token})
+
+    label = annotation["classification"]
+    if rng.random() < 0.2:
+        label = rng.choice(LABELS)
+    return {
+        "annotation_id": annotation["annotation_id"],
+        "rationales": [
+            {
+                "docid": annotation["evidences"][0][0]["docid"],
+                "hard_rationale_predictions": hard_predictions,
+                "soft_rationale_predictions": [rng.random() for _ in range(num_tokens)],
+                "soft_sentence_predictions": [rng.random() for _ in document],
+            }
+        ],
+        "classification": label,
+        "classification_scores": _class_scores(rng, label),
+        "comprehensiveness_classification_scores": _class_scores(rng, label),
+        "sufficiency_classification_scores": _class_scores(rng, label),
+        "tokens_to_flip": rng.randint(1, num_tokens),
+        "thresholded_scores": [
+            {
+                "threshold": threshold,
+                "comprehensiveness_classification_scores": _class_scores(rng, label),
+                "sufficiency_classification_scores": _class_scores(rng, label),
+            }
+            for threshold in thresholds
+        ],
+    }
+
+
+def write_synthetic_dataset(
+    data_dir: str,
+    num_documents: int = 100,
+    sentences_per_document: int = 10,
+    tokens_per_sentence: int = 20,
+    evidences_per_annotation: int = 2,
+    thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+    split: str = "train",
+    seed: int = 0,
+    length_sigma: float = 0.5,
+    docs_format: str = "dir",
+) -> SyntheticDataset:
+    """Writes `num_documents` documents with one annotation and one prediction each.
+    `sentences_per_document` and `tokens_per_sentence` are the median lengths, spread
+    by `length_sigma` (the sigma of the underlying normal; 0 for fixed lengths).
+    `docs_format` is "dir" for a `docs` directory or "jsonl" for `docs.jsonl`.
+    """
+    if docs_format not in DOCS_FORMATS:
+        raise ValueError(
+            f"docs_format must be one of {DOCS_FORMATS}, not {docs_format}"
+        )
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    docs_dir = os.path.join(data_dir, "docs")
+    if docs_format == "dir":
+        os.makedirs(docs_dir, exist_ok=True)
+    annotations_path = os.path.join(data_dir, f"{split}.jsonl")
+    predictions_path = os.path.join(data_dir, "predictions.jsonl")
+    docs_path = os.path.join(data_dir, "docs.jsonl")
+
+    with open(annotations_path, "w") as af, open(predictions_path, "w") as pf, open(
+        docs_path if docs_format == "jsonl" else os.devnull, "w"
+    ) as df:
+        for i in range(num_documents):
+            docid = f"doc{i:08d}"
+            document = synthetic_document(
+                rng, sentences_per_document, tokens_per_sentence, length_sigma
+            )
+            text = "\n".join(" ".join(sentence) for sentence in document)
+            if docs_format == "jsonl":
+                df.write(json.dumps({"docid": docid, "document": text}) + "\n")
+            else:
+                with open(os.path.join(docs_dir, docid), "w") as wf:
+                    wf.write(text + "\n")
+
+            annotation = synthetic_annotation(
+                rng,
+                f"ann{i:08d}",
+                docid,
+                document,
+                min(evidences_per_annotation, len(document)),
+            )
+            af.write(json.dumps(annotation) + "\n")
+            prediction = synthetic_prediction(rng, annotation, document, thresholds)
+            pf.write(json.dumps(prediction) + "\n")
+
+    return SyntheticDataset(data_dir, annotations_path, predictions_path, thresholds)
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write a deterministic synthetic ERASER dataset: documents, "
+        "annotations and predictions with hard and soft rationales."
+    )
+    parser.add_argument("data_dir", help="directory to write the dataset into")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument(
+        "--sentences", type=int, default=10, help="median sentences per document"
+    )
+    parser.add_argument(
+        "--tokens", type=int, default=20, help="median tokens per sentence"
+    )
+    parser.add_argument("--evidences", type=int, default=2)
+    parser.add_argument(
+        "--length-sigma",
+        type=float,
+        default=0.5,
+        help="spread of the lognormal lengths, 0 for fixed lengths",
+    )
+    parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=list(DEFAULT_THRESHOLDS)
+    )
+    parser.add_argument("--docs-format", choices=DOCS_FORMATS, default="dir")
+    parser.add_argument("--split", default="train")
+    parser.add_argument("--seed", type=int, default=0)
+    parsed = parser.parse_args(args)
+
+    dataset = write_synthetic_dataset(
+        parsed.data_dir,
+        num_documents=parsed.documents,
+        sentences_per_document=parsed.sentences,
+        tokens_per_sentence=parsed.tokens,
+        evidences_per_annotation=parsed.evidences,
+        thresholds=parsed.thresholds,
+        split=parsed.split,
+        seed=parsed.seed,
+        length_sigma=parsed.length_sigma,
+        docs_format=parsed.docs_format,
+    )
+    print(dataset.data_dir)
+
+
+if __name__ == "__main__":
+    main()
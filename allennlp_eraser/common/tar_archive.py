@@ -0,0 +1,312 @@
+"""
+Random access to the members of a (possibly gzip compressed) tarball without
+extracting it.
+
+The offsets and sizes of the regular members are indexed on first access and
+stored next to the tarball as `<tarball>.index.json`, which is rebuilt when the size
+or the mtime of the tarball changes. Members of an uncompressed tarball are read
+with a single seek. A gzip stream cannot be seeked into, so members of a
+`.tar.gz` are reached by inflating forward from the closest of the checkpoints
+(copies of the inflate state taken every `checkpoint_spacing` uncompressed bytes)
+recorded in this process, the first being the start of the file. The inflate state
+cannot be stored, so a new process starts from the beginning of the file; reading
+many members, e.g. the documents of a dataset, with `read_many` inflates the
+stream once, in a single forward pass over the members sorted by offset.
+"""
+
+import bisect
+import io
+import json
+import os
+import tarfile
+import zlib
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from allennlp_eraser.common.compression import ChunkReader
+from allennlp_eraser.common.document import DocumentView
+
+
+class TarMember(NamedTuple):
+    offset: int
+    size: int
+
+
+class _Checkpoint(NamedTuple):
+    # uncompressed offset, compressed offset and the inflate state at that point
+    position: int
+    compressed_position: int
+    inflater: "zlib._Decompress"
+
+
+class _GzipSeeker:
+    """Reads uncompressed byte ranges of a gzip file through inflate checkpoints."""
+
+    def __init__(
+        self,
+        file_path: str,
+        checkpoint_spacing: int = 1 << 26,
+        chunk_size: int = 1 << 16,
+    ) -> None:
+        self._file_path = file_path
+        self._checkpoint_spacing = checkpoint_spacing
+        self._chunk_size = chunk_size
+        self._checkpoints: List[_Checkpoint] = [
+            _Checkpoint(0, 0, zlib.decompressobj(zlib.MAX_WBITS | 16))
+        ]
+
+    def _add_checkpoint(self, checkpoint: _Checkpoint) -> None:
+        positions = [c.position for c in self._checkpoints]
+        i = bisect.bisect_left(positions, checkpoint.position)
+        if i == len(positions) or positions[i] != checkpoint.position:
+            self._checkpoints.insert(i, checkpoint)
+
+    def iter_chunks(self, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """`(position, data)` chunks of the uncompressed stream, starting from the
+        last checkpoint at or before `start`.
+        """
+        positions = [c.position for c in self._checkpoints]
+        checkpoint = self._checkpoints[bisect.bisect_right(positions, start) - 1]
+        position = checkpoint.position
+        compressed_position = checkpoint.compressed_position
+        inflater = checkpoint.inflater.copy()
+        next_checkpoint = position + self._checkpoint_spacing
+
+        with open(self._file_path, "rb") as rf:
+            rf.seek(compressed_position)
+            while True:
+                chunk = rf.read(self._chunk_size)
+                if not chunk:
+                    break
+                compressed_position += len(chunk)
+                data = inflater.decompress(chunk)
+                # concatenated gzip members
+                while inflater.eof and inflater.unused_data:
+                    unused = inflater.unused_data
+                    inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                    data += inflater.decompress(unused)
+
+                if data:
+                    yield position, data
+                    position += len(data)
+                if position >= next_checkpoint:
+                    self._add_checkpoint(
+                        _Checkpoint(position, compressed_position, inflater.copy())
+                    )
+                    next_checkpoint = position + self._checkpoint_spacing
+
+    def read_ranges(self, ranges: List[Tuple[int, int]]) -> Iterator[bytes]:
+        """The bytes of the `(offset, size)` ranges, which must be sorted and must
+        not overlap, read in a single forward pass over the stream.
+        """
+        if not ranges:
+            return
+        i = 0
+        ret = bytearray()
+        for position, data in self.iter_chunks(ranges[0][0]):
+            while i < len(ranges):
+                offset, size = ranges[i]
+                begin = max(offset - position, 0)
+                end = min(offset + size - position, len(data))
+                if begin < end:
+                    ret += data[begin:end]
+                if len(ret) < size:
+                    break
+                yield bytes(ret)
+                ret = bytearray()
+                i += 1
+            if i == len(ranges):
+                return
+
+    def read(self, offset: int, size: int) -> bytes:
+        return b"".join(self.read_ranges([(offset, size)]))
+
+    def iter_range(self, offset: int, size: int) -> Iterator[bytes]:
+        """The bytes of the range `(offset, size)`, chunk by chunk as they are
+        inflated.
+        """
+        end = offset + size
+        for position, data in self.iter_chunks(offset):
+            begin = max(offset - position, 0)
+            stop = min(end - position, len(data))
+            if begin < stop:
+                yield data[begin:stop]
+            if position + len(data) >= end:
+                return
+
+
+def _is_gzip(file_path: str) -> bool:
+    with open(file_path, "rb") as rf:
+        return rf.read(2) == b"\x1f\x8b"
+
+
+class TarArchive:
+    """Indexed, read-only access to the regular members of a `.tar` or `.tar.gz`."""
+
+    def __init__(self, file_path: str, checkpoint_spacing: int = 1 << 26) -> None:
+        self._file_path = str(file_path)
+        self._gzip: Optional[_GzipSeeker] = None
+        if _is_gzip(self._file_path):
+            self._gzip = _GzipSeeker(self._file_path, checkpoint_spacing)
+        self._index = self._load_index()
+        # member names by each of their path suffixes, built on first lookup
+        self._by_suffix: Optional[Dict[str, str]] = None
+
+    @property
+    def index_path(self) -> str:
+        return self._file_path + ".index.json"
+
+    def _file_key(self) -> List[int]:
+        stat = os.stat(self._file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _build_index(self) -> Dict[str, TarMember]:
+        if self._gzip is None:
+            fileobj = open(self._file_path, "rb")
+        else:
+            # inflating the whole stream once also records the checkpoints
+            chunks = (data for _, data in self._gzip.iter_chunks())
+            fileobj = io.BufferedReader(ChunkReader(chunks), buffer_size=1 << 20)
+
+        index = {}
+        with fileobj, tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            for member in tar:
+                if member.isfile():
+                    index[member.name] = TarMember(member.offset_data, member.size)
+        return index
+
+    def _load_index(self) -> Dict[str, TarMember]:
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as rf:
+                stored = json.load(rf)
+            if stored["file"] == self._file_key():
+                return {
+                    name: TarMember(*member)
+                    for name, member in stored["members"].items()
+                }
+
+        index = self._build_index()
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as wf:
+            json.dump({"file": self._file_key(), "members": index}, wf)
+        os.replace(tmp_path, self.index_path)
+        return index
+
+    def names(self) -> List[str]:
+        return sorted(self._index.keys())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def find(self, suffix: str) -> Optional[str]:
+        """The name of the member ending with the path `suffix`, if any."""
+        if self._by_suffix is None:
+            self._by_suffix = {}
+            for name in self._index:
+                parts = name.split("/")
+                for i in range(len(parts)):
+                    self._by_suffix.setdefault("/".join(parts[i:]), name)
+        return self._by_suffix.get(suffix.strip("/"))
+
+    def list_dir(self, suffix: str) -> Dict[str, str]:
+        """Base name to member name of the members directly inside the directory
+        ending with the path `suffix`.
+        """
+        suffix = suffix.strip("/")
+        ret = {}
+        for name in self._index:
+            directory, base_name = os.path.split(name)
+            if directory == suffix or directory.endswith("/" + suffix):
+                ret[base_name] = name
+        return ret
+
+    def read(self, name: str) -> bytes:
+        member = self._index[name]
+        if self._gzip is not None:
+            return self._gzip.read(member.offset, member.size)
+        with open(self._file_path, "rb") as rf:
+            rf.seek(member.offset)
+            return rf.read(member.size)
+
+    def read_many(self, names: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+        """`(name, data)` of the members `names`, in the order of their offsets in
+        the archive, so that a compressed archive is inflated only once.
+        """
+        names = sorted(set(names), key=lambda name: self._index[name].offset)
+        if self._gzip is not None:
+            ranges = [
+                (self._index[name].offset, self._index[name].size) for name in names
+            ]
+            yield from zip(names, self._gzip.read_ranges(ranges))
+            return
+        with open(self._file_path, "rb") as rf:
+            for name in names:
+                member = self._index[name]
+                rf.seek(member.offset)
+                yield name, rf.read(member.size)
+
+    def iter_chunks(self, name: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        """The bytes of the member `name`, chunk by chunk."""
+        member = self._index[name]
+        if self._gzip is not None:
+            yield from self._gzip.iter_range(member.offset, member.size)
+            return
+        with open(self._file_path, "rb") as rf:
+            rf.seek(member.offset)
+            remaining = member.size
+            while remaining > 0:
+                data = rf.read(min(chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
+    def iter_lines(self, name: str) -> Iterator[str]:
+        """The lines of the member `name`, read as they are iterated rather than
+        holding the whole member in memory.
+        """
+        raw = io.BufferedReader(ChunkReader(self.iter_chunks(name)))
+        with io.TextIOWrapper(raw, encoding="utf-8", newline="\n") as lines:
+            yield from lines
+
+
+def load_documents_from_tar(
+    archive: TarArchive, data_dir: str, docids: Optional[Set[str]] = None
+) -> Dict[str, DocumentView]:
+    """Like `load_documents`, for the dataset directory ending with the path
+    `data_dir` inside `archive`. Documents may be stored as a `docs.jsonl` member,
+    as members of a `docs` directory or inside a nested `docs.tar.gz`.
+    """
+    if docids is not None:
+        docids = set(str(d) for d in docids)
+
+    docs_file = archive.find(f"{data_dir}/docs.jsonl")
+    if docs_file is not None:
+        documents = {}
+        for line in archive.iter_lines(docs_file):
+            content = json.loads(line)
+            if docids is None or content["docid"] in docids:
+                documents[content["docid"]] = DocumentView(content["document"])
+        return {
+            d: documents[d] for d in sorted(documents if docids is None else docids)
+        }
+
+    docs_dir = archive.list_dir(f"{data_dir}/docs")
+    if docs_dir:
+        wanted = sorted(docs_dir if docids is None else docids)
+        texts = dict(archive.read_many(docs_dir[d] for d in wanted))
+        return {
+            d: DocumentView(texts[docs_dir[d]].decode("utf-8"), strip=True)
+            for d in wanted
+        }
+
+    nested = archive.find(f"{data_dir}/docs.tar.gz")
+    if nested is None:
+        raise FileNotFoundError(f"no documents for {data_dir} in the archive")
+    documents = {}
+    with tarfile.open(fileobj=io.BytesIO(archive.read(nested)), mode="r:gz") as tar:
+        for member in tar:
+            docid = os.path.basename(member.name)
+            if member.isfile() and (docids is None or docid in docids):
+                text = tar.extractfile(member).read().decode("utf-8")
+                documents[docid] = DocumentView(text, strip=True)
+    return {d: documents[d] for d in sorted(documents if docids is None else docids)}
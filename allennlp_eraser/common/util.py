@@ -1,9 +1,33 @@
+import hashlib
 import json
 import os
-from collections import defaultdict
+import re
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from itertools import chain
-from typing import Dict, FrozenSet, List, Set, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from allennlp_eraser.common.compression import find_compressed, open_text
+from allennlp_eraser.common.docs_archive import (
+    find_docs_archive,
+    load_documents_from_archive,
+)
+from allennlp_eraser.common.document import DocumentView, FlattenedDocumentView
+from allennlp_eraser.common.line_index import iter_jsonl_lines
 
 
 @dataclass(eq=True, frozen=True)
@@ -61,81 +85,350 @@ def check_phase(phase: str) -> None:
         raise ValueError(f"Invalid phase: {phase}")
 
 
+def file_version(file_path: str) -> str:
+    """Identifies the contents of the file at `file_path` by its size and mtime,
+    which is cheap enough to check on every read, unlike a checksum of the file.
+    """
+    stat = os.stat(file_path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def iter_jsonl(file_path: str) -> Iterator[dict]:
+    with open_text(file_path) as rf:
+        for line in rf:
+            yield json.loads(line)
+
+
+_JSON_DELIMITERS = {" ", "\t", "\n", "\r", ",", ":", "]", "}"}
+
+
+class _JsonStream:
+    """A cursor over JSON text that is read from `fp` as needed."""
+
+    def __init__(self, fp: TextIO, chunk_size: int) -> None:
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self, size: int) -> None:
+        # drop what has been consumed so the buffer only holds the current value
+        chunk = self._fp.read(size)
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+        self._eof = len(chunk) == 0
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, or "" at the end."""
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position].isspace()
+            ):
+                self._position += 1
+            if self._position < len(self._buffer) or self._eof:
+                return self._buffer[self._position : self._position + 1]
+            self._fill(self._chunk_size)
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(
+                f"Expected {char!r} in JSON stream, got {self.peek()!r} instead"
+            )
+        self._position += 1
+
+    def decode(self) -> Any:
+        size = self._chunk_size
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+                # a number at the end of the buffer may continue in the next chunk
+                if self._eof or self._buffer[end : end + 1] in _JSON_DELIMITERS:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill(size)
+            size *= 2
+
+
+def iter_json_array(fp: TextIO, key: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Incrementally parses the array stored under the top-level `key` of the JSON
+    object in `fp` and yields its items one at a time, so that only the item being
+    parsed has to be held in memory. Values of other keys are parsed and discarded.
+    """
+    stream = _JsonStream(fp, chunk_size)
+    stream.expect("{")
+    while stream.peek() != "}":
+        name = stream.decode()
+        stream.expect(":")
+        if name != key:
+            stream.decode()
+        else:
+            stream.expect("[")
+            while stream.peek() != "]":
+                yield stream.decode()
+                if stream.peek() == ",":
+                    stream.expect(",")
+            stream.expect("]")
+        if stream.peek() == ",":
+            stream.expect(",")
+    stream.expect("}")
+
+
+def versioned_sidecar(
+    file_path: str, suffix: str, write: Callable[[TextIO], None]
+) -> str:
+    """Returns the path of the sidecar `{file_path}.{version}.{suffix}` next to
+    `file_path`, where `version` is its `file_version`, so that a changed file gets
+    a new sidecar. On first use the sidecar is written by `write`, and the sidecars
+    of earlier versions of `file_path` are removed.
+    """
+    version = file_version(file_path)
+    sidecar_path = f"{file_path}.{version}.{suffix}"
+    if not os.path.exists(sidecar_path):
+        tmp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as wf:
+            write(wf)
+        os.replace(tmp_path, sidecar_path)
+
+        pattern = re.compile(
+            re.escape(os.path.basename(file_path))
+            + r"\.[0-9a-f]+-[0-9a-f]+\."
+            + re.escape(suffix)
+        )
+        directory = os.path.dirname(sidecar_path) or "."
+        for name in os.listdir(directory):
+            if pattern.fullmatch(name) and name != os.path.basename(sidecar_path):
+                os.remove(os.path.join(directory, name))
+    return sidecar_path
+
+
+def cached_split_sidecar(
+    archive_path: str, split: str, extract: Callable[[], Iterable[dict]]
+) -> str:
+    """Returns the path of a JSONL sidecar of `split` next to `archive_path`, see
+    `versioned_sidecar`. On first use the sidecar is written from the records of
+    `extract()`.
+    """
+
+    def write(wf: TextIO) -> None:
+        for record in extract():
+            wf.write(json.dumps(record) + "\n")
+
+    return versioned_sidecar(archive_path, f"{split}.jsonl", write)
+
+
+_MISSING = object()
+
+
+class ContentCache:
+    """
+    LRU cache of values computed from strings, keyed by a digest of the string
+    content so that long texts are not kept alive as keys. `maxsize=None` makes
+    the cache unbounded.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 4096) -> None:
+        self._maxsize = maxsize
+        self._values: "OrderedDict[bytes, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _lookup(self, key: bytes) -> Any:
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._values.move_to_end(key)
+        return value
+
+    def _store(self, key: bytes, value: Any) -> None:
+        self._values[key] = value
+        if self._maxsize is not None and len(self._values) > self._maxsize:
+            self._values.popitem(last=False)
+
+    def get(self, text: str, compute: Callable[[str], Any]) -> Any:
+        key = self.key(text)
+        value = self._lookup(key)
+        if value is _MISSING:
+            value = compute(text)
+            self._store(key, value)
+        return value
+
+    def get_batch(
+        self, texts: List[str], compute: Callable[[List[str]], List[Any]]
+    ) -> List[Any]:
+        """Values of all `texts`, computing the missing ones, each distinct text
+        once, with a single `compute` call.
+        """
+        keys = [self.key(text) for text in texts]
+        found: Dict[bytes, Any] = {}
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            value = self._lookup(key)
+            if value is _MISSING:
+                missing[key] = text
+            else:
+                found[key] = value
+
+        if missing:
+            for key, value in zip(missing, compute(list(missing.values()))):
+                found[key] = value
+                self._store(key, value)
+        return [found[key] for key in keys]
+
+
 def load_jsonl(file_path: str) -> List[dict]:
     ret = []
-    with open(file_path, "r") as rf:
+    with open_text(file_path) as rf:
         for line in rf:
             content = json.loads(line)
             ret.append(content)
     return ret
 
 
-def annotations_from_jsonl(file_path: str) -> List[Annotation]:
+def annotations_from_jsonl(
+    file_path: str,
+    shard: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+) -> List[Annotation]:
+    """With an `(index, count)` shard, only the lines of a contiguous block of
+    annotations are read, and with a `limit` only the first `limit` of them, see
+    `iter_jsonl_lines`.
+    """
 
     ret = []
+    for line in iter_jsonl_lines(file_path, shard=shard, limit=limit):
+        ret.append(annotation_from_json(line))
+
+    return ret
+
+
+def annotation_from_json(line: str) -> Annotation:
+    content = json.loads(line)
+
+    ev_groups = []
+    for ev_group in content["evidences"]:
+        ev_group = tuple([Evidence(**ev) for ev in ev_group])
+        ev_groups.append(ev_group)
+    content["evidences"] = frozenset(ev_groups)
+    return Annotation(**content)
+
+
+def _read_document(file_path: str) -> DocumentView:
     with open(file_path, "r") as rf:
-        for line in rf:
-            content = json.loads(line)
+        # sentences are stripped and empty ones skipped by the view
+        return DocumentView(rf.read(), strip=True)
 
-            ev_groups = []
-            for ev_group in content["evidences"]:
-                ev_group = tuple([Evidence(**ev) for ev in ev_group])
-                ev_groups.append(ev_group)
-            content["evidences"] = frozenset(ev_groups)
-            ret.append(Annotation(**content))
 
-    return ret
+def prefetch_documents(
+    docs_dir: str,
+    docids: Iterable[str],
+    num_workers: int = 8,
+    max_in_flight: Optional[int] = None,
+) -> Iterator[Tuple[str, DocumentView]]:
+    """Reads documents from `docs_dir` through a thread pool.
+    At most `max_in_flight` reads (by default `4 * num_workers`) are outstanding at
+    any time, and `(docid, document)` pairs are yielded in completion order.
+    """
+    max_in_flight = max_in_flight or 4 * num_workers
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending: Dict[Future, str] = {}
+
+        def drain() -> Iterator[Tuple[str, DocumentView]]:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+        for docid in docids:
+            future = executor.submit(_read_document, os.path.join(docs_dir, docid))
+            pending[future] = docid
+            if len(pending) >= max_in_flight:
+                yield from drain()
+        while pending:
+            yield from drain()
 
 
 def load_documents(
-    data_dir: str, docids: Set[str] = None
-) -> Dict[str, List[List[str]]]:
+    data_dir: str, docids: Set[str] = None, num_workers: int = 0
+) -> Dict[str, DocumentView]:
     """Loads a subset of available documents from disk.
     Each document is assumed to be serialized as newline ('\n') separated sentences.
     Each sentence is assumed to be space (' ') joined tokens.
+    Documents are returned as read-only `DocumentView`s which behave like the
+    list of one-element `[sentence]` lists they replace.
+    With `num_workers > 0` the files of the `docs` directory are read concurrently
+    (see `prefetch_documents`); the result is ordered by docid either way.
+    A packed docs archive (see `allennlp_eraser.common.docs_archive`) is preferred
+    over both the `docs` directory and `docs.jsonl` when present and up to date.
     """
-    if os.path.exists(os.path.join(data_dir, "docs.jsonl")):
+    archive = find_docs_archive(data_dir)
+    if archive is not None:
+        with archive:
+            return load_documents_from_archive(archive, docids)
+
+    if find_compressed(os.path.join(data_dir, "docs.jsonl")):
         assert not os.path.exists(os.path.join(data_dir, "docs"))
         return load_documents_from_file(data_dir, docids)
 
     docs_dir = os.path.join(data_dir, "docs")
-    res = dict()
     if docids is None:
         docids = sorted(os.listdir(docs_dir))
     else:
         docids = sorted(set(str(d) for d in docids))
+
+    if num_workers > 0:
+        fetched = dict(prefetch_documents(docs_dir, docids, num_workers=num_workers))
+        return {d: fetched[d] for d in docids}
+
+    res = dict()
     for d in docids:
-        with open(os.path.join(docs_dir, d), "r") as rf:
-            lines: List[str] = [line.strip() for line in rf.readlines()]
-            lines = list(filter(lambda x: bool(len(x)), lines))
-            # tokenized = [
-            #     list(filter(lambda x: bool(len(x)), line.strip().split(" ")))
-            #     for line in lines
-            # ]
-            lines: List[List[str]] = [[line] for line in lines]
-            res[d] = lines
+        res[d] = _read_document(os.path.join(docs_dir, d))
     return res
 
 
-def load_flattened_documents(data_dir: str, docids: Set[str]) -> Dict[str, List[str]]:
+def load_flattened_documents(
+    data_dir: str, docids: Set[str], num_workers: int = 0
+) -> Dict[str, FlattenedDocumentView]:
     """Loads a subset of available documents from disk.
     Returns a tokenized version of the document.
     """
-    unflattened_docs = load_documents(data_dir, docids)
+    unflattened_docs = load_documents(data_dir, docids, num_workers=num_workers)
     flattened_docs = {}
     for doc, unflattened in unflattened_docs.items():
-        flattened_docs[doc] = list(chain.from_iterable(unflattened))
+        flattened_docs[doc] = unflattened.flattened()
     return flattened_docs
 
 
 def load_documents_from_file(
     data_dir: str, docids: Set[str] = None
-) -> Dict[str, List[List[str]]]:
+) -> Dict[str, DocumentView]:
     """Loads a subset of available documents from 'docs.jsonl' file on disk.
     Each document is assumed to be serialized as newline ('\n') separated sentences.
     Each sentence is assumed to be space (' ') joined tokens.
     """
-    docs_file = os.path.join(data_dir, "docs.jsonl")
+    archive = find_docs_archive(data_dir)
+    if archive is not None:
+        with archive:
+            return load_documents_from_archive(archive, docids)
+
+    # docs.jsonl may also be stored compressed, e.g. as docs.jsonl.gz
+    docs_file = find_compressed(os.path.join(data_dir, "docs.jsonl"))
     documents = load_jsonl(docs_file)
     documents = {doc["docid"]: doc["document"] for doc in documents}
     res = dict()
@@ -144,10 +437,7 @@ def load_documents_from_file(
     else:
         docids = sorted(set(str(d) for d in docids))
     for d in docids:
-        lines: List[str] = documents[d].split("\n")
-        lines: List[List[str]] = [[line] for line in lines]
-        # tokenized = [line.strip().split(" ") for line in lines]
-        res[d] = lines
+        res[d] = DocumentView(documents[d])
     return res
 
 
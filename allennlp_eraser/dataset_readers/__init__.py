@@ -2,5 +2,6 @@ from allennlp_eraser.dataset_readers.eraser import (  # isort:skip # NOQA
     EraserDatasetReader,
 )
 from allennlp_eraser.dataset_readers.boolq import BoolqDatasetReader  # NOQA
+from allennlp_eraser.dataset_readers.esnli import ESNLIDatasetReader  # NOQA
 from allennlp_eraser.dataset_readers.movies import MoviesDatasetReader  # NOQA
 from allennlp_eraser.dataset_readers.multirc import MultiRCDatasetReader  # NOQA
@@ -1,7 +1,10 @@
 import json
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
+from allennlp.common import JsonDict
+from allennlp.common.checks import ConfigurationError
 from allennlp.common.file_utils import cached_path
+from allennlp.common.util import lazy_groups_of
 from allennlp.data.dataset_readers import DatasetReader
 from allennlp.data.fields import Field, LabelField, ListField, TextField
 from allennlp.data.instance import Instance
@@ -10,6 +13,19 @@ from allennlp.data.tokenizers import SpacyTokenizer, Token, Tokenizer
 from allennlp.data.tokenizers.sentence_splitter import SpacySentenceSplitter
 from overrides import overrides
 
+from allennlp_eraser.common.columnar import ColumnarFile, is_columnar
+from allennlp_eraser.common.line_index import iter_jsonl_lines
+from allennlp_eraser.common.profiling import reader_profiler
+from allennlp_eraser.common.segmentation import (
+    BatchedSentenceSegmenter,
+    segment_or_tokenize,
+)
+from allennlp_eraser.common.sharding import reader_record_limit, reader_shard
+from allennlp_eraser.common.util import ContentCache
+
+# the fields of a BoolQ line, in the order of `text_to_instance`
+COLUMNS = ("title", "passage", "question", "answer")
+
 
 @DatasetReader.register("boolq")
 class BoolqDatasetReader(DatasetReader):
@@ -20,6 +36,14 @@ class BoolqDatasetReader(DatasetReader):
         segment_sentences: bool = False,
         max_sequence_length: Optional[int] = None,
         skip_label_indexing: bool = False,
+        segmentation_batch_size: int = 1,
+        segmentation_n_process: int = 1,
+        segmentation_single_parse: bool = False,
+        tokenization_batch_size: Optional[int] = None,
+        token_cache_size: Optional[int] = 4096,
+        profile: bool = False,
+        profile_log_interval: Optional[float] = None,
+        profile_memory: bool = False,
         lazy: bool = False,
         cache_directory: Optional[str] = None,
         max_instances: Optional[int] = None,
@@ -34,6 +58,13 @@ class BoolqDatasetReader(DatasetReader):
             manual_multi_process_sharding=manual_multi_process_sharding,
         )
 
+        if segment_sentences and segmentation_n_process > 1 and tokenization_batch_size:
+            # passages are then segmented in the batches of the passage cache,
+            # which would start the worker processes anew for every batch
+            raise ConfigurationError(
+                "segmentation_n_process cannot be combined with tokenization_batch_size"
+            )
+
         self._tokenizer = tokenizer or SpacyTokenizer()
         self._token_indexers = token_indexers or {"tokens": SingleIdTokenIndexer()}
 
@@ -41,19 +72,109 @@ class BoolqDatasetReader(DatasetReader):
         self._max_sequence_length = max_sequence_length
         self._skip_label_indexing = skip_label_indexing
 
+        # with a batch size, the fields of that many lines are tokenized together
+        # and the tokens of repeated titles and passages are reused
+        self._tokenization_batch_size = tokenization_batch_size
+        self._title_cache = ContentCache(token_cache_size)
+        self._passage_cache = ContentCache(token_cache_size)
+
+        # opt-in timing and memory accounting of the reading, decoding,
+        # tokenization and instance stages
+        self.profiler = reader_profiler(
+            self, profile, profile_log_interval, memory=profile_memory
+        )
+
+        self._batched_segmenter: Optional[BatchedSentenceSegmenter] = None
         if segment_sentences:
             self._sentence_segmenter = SpacySentenceSplitter()
+            self._batched_segmenter = BatchedSentenceSegmenter(
+                self._tokenizer,
+                self._sentence_segmenter,
+                batch_size=segmentation_batch_size,
+                n_process=segmentation_n_process,
+                single_parse=segmentation_single_parse,
+            )
 
     @overrides
     def _read(self, file_path: str) -> Iterable[Instance]:
-        with open(cached_path(file_path), "r") as rf:
-            for line in rf:
-                data = json.loads(line)
-                yield self.text_to_instance(**data)
+        lines = self._read_lines(file_path)
+        if self._tokenization_batch_size:
+            for batch in lazy_groups_of(lines, self._tokenization_batch_size):
+                yield from self._batch_to_instances(batch)
+        elif self._segment_sentences:
+            segmented = self._batched_segmenter.segment(
+                lines, lambda data: data["passage"]
+            )
+            for data, sentences in self.profiler.iterate("tokenize", segmented):
+                with self.profiler.stage("instance"):
+                    passage_tokens = [self._truncate(tokens) for tokens in sentences]
+                    instance = self.text_to_instance(
+                        **data, passage_tokens=passage_tokens
+                    )
+                yield instance
+        else:
+            for data in lines:
+                with self.profiler.stage("instance"):
+                    instance = self.text_to_instance(**data)
+                yield instance
+
+    def _read_lines(self, file_path: str) -> Iterator[JsonDict]:
+        if is_columnar(file_path):
+            # blocks of row groups are assigned to the shards of a sharded reader
+            columnar_file = ColumnarFile(cached_path(file_path))
+            index, count = reader_shard(self)
+            records = columnar_file.iter_records(
+                columns=[c for c in COLUMNS if c in columnar_file.column_names],
+                row_groups=columnar_file.shard_row_groups(index, count),
+            )
+            yield from self.profiler.iterate("read", records)
+        else:
+            # a sharded reader only reads the byte range of its block of lines
+            lines = iter_jsonl_lines(
+                cached_path(file_path),
+                shard=reader_shard(self),
+                limit=reader_record_limit(self),
+            )
+            yield from self.profiler.iterate(
+                "decode", map(json.loads, self.profiler.iterate("read", lines))
+            )
+
+    def _batch_to_instances(self, batch: List[JsonDict]) -> Iterable[Instance]:
+        with self.profiler.stage("tokenize", items=len(batch)):
+            titles = self._title_cache.get_batch(
+                [data["title"] for data in batch], self._tokenizer.batch_tokenize
+            )
+            passages = self._passage_cache.get_batch(
+                [data["passage"] for data in batch], self._tokenize_passages
+            )
+            questions = self._tokenizer.batch_tokenize(
+                [data["question"] for data in batch]
+            )
+        for data, title_tokens, passage_tokens, question_tokens in zip(
+            batch, titles, passages, questions
+        ):
+            with self.profiler.stage("instance"):
+                instance = self.text_to_instance(
+                    **data,
+                    passage_tokens=passage_tokens,
+                    title_tokens=title_tokens,
+                    question_tokens=question_tokens,
+                )
+            yield instance
+
+    def _tokenize_passages(
+        self, passages: List[str]
+    ) -> List[Union[List[Token], List[List[Token]]]]:
+        return segment_or_tokenize(
+            passages,
+            self._tokenizer,
+            self._batched_segmenter,
+            self._max_sequence_length,
+        )
 
     def _truncate_tokens(self, tokens: List[Token]) -> List[Token]:
         if len(tokens) > self._max_sequence_length:
-            tokens = tokens[:, self._max_sequence_length]
+            tokens = tokens[: self._max_sequence_length]
         return tokens
 
     def _truncate(self, tokens: List[Token]) -> List[Token]:
@@ -68,29 +189,35 @@ class BoolqDatasetReader(DatasetReader):
         passage: str,
         question: str,
         answer: Optional[bool] = None,
+        passage_tokens: Optional[Union[List[Token], List[List[Token]]]] = None,
+        title_tokens: Optional[List[Token]] = None,
+        question_tokens: Optional[List[Token]] = None,
     ) -> Instance:
 
+        if passage_tokens is None:
+            with self.profiler.stage("tokenize"):
+                passage_tokens = self._tokenize_passages([passage])[0]
+
         fields: Dict[str, Field] = {}
         if self._segment_sentences:
-            sentences: List[Field] = []
-            sentence_splits = self._sentence_segmenter.split_sentences(passage)
-            for sentence in sentence_splits:
-                tokens = self._tokenizer.tokenize(sentence)
-                tokens = self._truncate(tokens)
-                sentences.append(TextField(tokens, self._token_indexers))
+            sentences: List[Field] = [
+                TextField(sentence_tokens, self._token_indexers)
+                for sentence_tokens in passage_tokens
+            ]
             fields["passage"] = ListField(sentences)
 
         else:
-            tokens = self._tokenizer.tokenize(passage)
-            tokens = self._truncate(tokens)
-            fields["passage"] = TextField(tokens, self._token_indexers)
+            fields["passage"] = TextField(passage_tokens, self._token_indexers)
 
-        fields["title"] = TextField(
-            self._tokenizer.tokenize(title), self._token_indexers
-        )
-        fields["question"] = TextField(
-            self._tokenizer.tokenize(question), self._token_indexers
-        )
+        if title_tokens is None:
+            with self.profiler.stage("tokenize"):
+                title_tokens = self._tokenizer.tokenize(title)
+        fields["title"] = TextField(title_tokens, self._token_indexers)
+
+        if question_tokens is None:
+            with self.profiler.stage("tokenize"):
+                question_tokens = self._tokenizer.tokenize(question)
+        fields["question"] = TextField(question_tokens, self._token_indexers)
 
         if answer is not None:
             fields["answer"] = LabelField(
@@ -1,8 +1,23 @@
 import os
-from typing import Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import numpy as np
 import pydantic
+from allennlp.common.checks import ConfigurationError
+from allennlp.common.file_utils import cached_path
+from allennlp.common.util import lazy_groups_of
 from allennlp.data import Token
 from allennlp.data.dataset_readers import DatasetReader
 from allennlp.data.fields import (
@@ -14,16 +29,30 @@ from allennlp.data.fields import (
 )
 from allennlp.data.instance import Instance
 from allennlp.data.token_indexers import SingleIdTokenIndexer, TokenIndexer
-from allennlp.data.tokenizers import SpacyTokenizer, Tokenizer
+from allennlp.data.tokenizers import Tokenizer, WhitespaceTokenizer
+from overrides import overrides
+
+from allennlp_eraser.common.docs_archive import find_docs_archive
+from allennlp_eraser.common.line_index import iter_jsonl_lines
+from allennlp_eraser.common.pipeline import Pipeline
+from allennlp_eraser.common.profiling import (
+    NULL_PROFILER,
+    ReaderProfiler,
+    reader_profiler,
+)
+from allennlp_eraser.common.sharding import reader_record_limit, reader_shard
+from allennlp_eraser.common.tar_archive import TarArchive, load_documents_from_tar
 from allennlp_eraser.common.util import (
     Annotation,
     Evidence,
-    annotations_from_jsonl,
+    annotation_from_json,
     generate_doc_evidence_map,
     load_flattened_documents,
     sort_docids_from_evidences,
 )
-from overrides import overrides
+
+# `file_path`s with this prefix are read from the ERASER tarball at `dataset_url`
+TARBALL_PREFIX = "tar://"
 
 ERASER_DATASET_URL = (
     "https://storage.googleapis.com/sfr-nazneen-website-files-research/data_v1.2.tar.gz"
@@ -38,11 +67,136 @@ class EraserData(pydantic.BaseModel):
     label: str
 
 
-def read_eraser_data(file_path: str) -> Iterable[EraserData]:
+def _referenced_docids(annotations: List[Annotation]) -> Set[str]:
+    docids: Set[str] = set()
+    for ann in annotations:
+        docids.update(sort_docids_from_evidences(ann.evidences))
+    return docids
+
+
+def _with_documents(
+    annotations: Iterable[Annotation],
+    chunk_size: int,
+    load: Callable[[Set[str]], Dict[str, Sequence[str]]],
+    cache_size: int,
+) -> Iterable[Tuple[List[Annotation], Dict[str, Sequence[str]]]]:
+    """`annotations` in chunks of `chunk_size`, each with the documents it refers to.
+    Documents are loaded with `load`, and the `cache_size` most recently used ones
+    are kept so that documents shared across chunks are only loaded once.
+    """
+    cache: "OrderedDict[str, Sequence[str]]" = OrderedDict()
+    for chunk in lazy_groups_of(annotations, chunk_size):
+        docids = _referenced_docids(chunk)
+        missing = {docid for docid in docids if docid not in cache}
+        if missing:
+            cache.update(load(missing))
+        docs = {}
+        for docid in docids:
+            cache.move_to_end(docid)
+            docs[docid] = cache[docid]
+        while len(cache) > max(cache_size, len(docids)):
+            cache.popitem(last=False)
+        yield chunk, docs
+
+
+def read_eraser_data(
+    file_path: str,
+    num_workers: int = 0,
+    shard: Optional[Tuple[int, int]] = None,
+    profiler: ReaderProfiler = NULL_PROFILER,
+    chunk_size: int = 64,
+    document_cache_size: int = 1024,
+    limit: Optional[int] = None,
+) -> Iterable[EraserData]:
+    """With an `(index, count)` shard, only the annotations of that shard are read
+    and only the documents they refer to are loaded. With a `limit`, only the first
+    `limit` annotations (of the shard) are, see `iter_jsonl_lines`.
+
+    Documents in a `docs` directory or a docs archive are loaded `chunk_size`
+    annotations at a time, right before those annotations are yielded, so the first
+    `EraserData` is available before the whole file is read. The
+    `document_cache_size` most recently used documents are kept across chunks.
+    Documents in a `docs.jsonl` can only be read whole; the annotations are then
+    read first.
+    """
     data_dir = os.path.dirname(file_path)
-    annotations: List[Annotation] = annotations_from_jsonl(file_path)
-    docs: Dict[str, List[str]] = load_flattened_documents(data_dir, docids=None)
+    lines = profiler.iterate(
+        "read", iter_jsonl_lines(file_path, shard=shard, limit=limit)
+    )
+    annotations = profiler.iterate("decode", map(annotation_from_json, lines))
 
+    archive = find_docs_archive(data_dir)
+    if archive is not None:
+        with archive:
+
+            def load(docids: Set[str]) -> Dict[str, Sequence[str]]:
+                with profiler.stage("documents"):
+                    return {
+                        docid: archive.read_document(docid).flattened()
+                        for docid in docids
+                    }
+
+            for chunk, docs in _with_documents(
+                annotations, chunk_size, load, document_cache_size
+            ):
+                yield from _to_eraser_data(chunk, docs)
+    elif os.path.isdir(os.path.join(data_dir, "docs")):
+
+        def load(docids: Set[str]) -> Dict[str, Sequence[str]]:
+            with profiler.stage("documents"):
+                return load_flattened_documents(
+                    data_dir, docids=docids, num_workers=num_workers
+                )
+
+        for chunk, docs in _with_documents(
+            annotations, chunk_size, load, document_cache_size
+        ):
+            yield from _to_eraser_data(chunk, docs)
+    else:
+        annotations = list(annotations)
+        docids: Optional[Set[str]] = None
+        if shard is not None:
+            docids = _referenced_docids(annotations)
+        with profiler.stage("documents"):
+            docs = load_flattened_documents(
+                data_dir, docids=docids, num_workers=num_workers
+            )
+        yield from _to_eraser_data(annotations, docs)
+
+
+def read_eraser_data_from_tarfile(
+    archive: TarArchive,
+    file_path: str,
+    shard: Optional[Tuple[int, int]] = None,
+    profiler: ReaderProfiler = NULL_PROFILER,
+) -> Iterable[EraserData]:
+    """Like `read_eraser_data`, for the annotations file ending with the path
+    `file_path` (e.g. `boolq/train.jsonl`) inside the ERASER tarball `archive`.
+    Only the members of that dataset are read.
+    """
+    name = archive.find(file_path)
+    if name is None:
+        raise FileNotFoundError(f"{file_path} is not in the archive")
+    lines = (line for line in archive.iter_lines(name) if line.strip())
+    if shard is not None:
+        # the same contiguous blocks of lines as the shards of a file on disk
+        index, count = shard
+        lines = list(lines)
+        lines = lines[len(lines) * index // count : len(lines) * (index + 1) // count]
+    lines = profiler.iterate("read", lines)
+    annotations = list(profiler.iterate("decode", map(annotation_from_json, lines)))
+
+    with profiler.stage("documents"):
+        docs = load_documents_from_tar(
+            archive, os.path.dirname(file_path), _referenced_docids(annotations)
+        )
+        flattened_docs = {docid: doc.flattened() for docid, doc in docs.items()}
+    yield from _to_eraser_data(annotations, flattened_docs)
+
+
+def _to_eraser_data(
+    annotations: List[Annotation], docs: Dict[str, Sequence[str]]
+) -> Iterable[EraserData]:
     for ann in annotations:
         annotation_id: str = ann.annotation_id
         evidences: List[List[Evidence]] = ann.evidences
@@ -50,7 +204,7 @@ def read_eraser_data(file_path: str) -> Iterable[EraserData]:
         query: str = ann.query
         docids: List[str] = sort_docids_from_evidences(evidences)
 
-        filtered_docs: Dict[str, List[str]] = {d: docs[d] for d in docids}
+        filtered_docs: Dict[str, List[str]] = {d: list(docs[d]) for d in docids}
         doc_evidence_map = generate_doc_evidence_map(evidences)
 
         if label is not None:
@@ -65,7 +219,83 @@ def read_eraser_data(file_path: str) -> Iterable[EraserData]:
         )
 
 
+def stitch_window_scores(
+    metadata: Sequence[Dict[str, Any]], window_scores: Sequence[Sequence[float]]
+) -> Dict[Tuple[str, str], List[float]]:
+    """Stitches per-window token scores back into document coordinates.
+
+    `metadata` are the `metadata` fields of the windowed instances and `window_scores`
+    the matching per-token scores over each window's `tokens`. Positions covered by
+    several overlapping windows are averaged. Returns scores keyed by
+    `(annotation_id, docid)`, ready to be used as `soft_rationale_predictions`.
+    """
+    totals: Dict[Tuple[str, str], np.ndarray] = {}
+    counts: Dict[Tuple[str, str], np.ndarray] = {}
+    for meta, scores in zip(metadata, window_scores):
+        scores = np.asarray(scores, dtype=float)
+        for docid, (start, end) in meta["doc_to_span_map"].items():
+            key = (meta["annotation_id"], docid)
+            if key not in totals:
+                totals[key] = np.zeros(meta["doc_lengths"][docid])
+                counts[key] = np.zeros(meta["doc_lengths"][docid])
+            offset = meta["doc_offsets"][docid]
+            totals[key][offset : offset + end - start] += scores[start:end]
+            counts[key][offset : offset + end - start] += 1
+
+    return {key: (totals[key] / np.maximum(counts[key], 1)).tolist() for key in totals}
+
+
+def window_span_to_document(
+    metadata: Dict[str, Any], docid: str, start_token: int, end_token: int
+) -> Tuple[int, int]:
+    """Maps a `[start_token, end_token)` span over a window's `tokens` back to
+    document coordinates of `docid`, clipping it to the part of the window that
+    belongs to that document.
+    """
+    span_start, span_end = metadata["doc_to_span_map"][docid]
+    offset = metadata["doc_offsets"][docid] - span_start
+    start_token = min(max(start_token, span_start), span_end)
+    end_token = min(max(end_token, span_start), span_end)
+    return start_token + offset, end_token + offset
+
+
 class EraserDatasetReader(DatasetReader):
+    """
+    Reads ERASER annotations and their documents.
+
+    ERASER documents are pre-tokenized and evidences index their space separated
+    tokens, so `tokenizer` (a `WhitespaceTokenizer` by default) must give one token
+    per such token; a `ConfigurationError` is raised for a sentence where it does
+    not. The query is tokenized with it too.
+
+    If `max_sequence_length` is given, it bounds the number of document tokens
+    (including the `[SEP]` following each document) in an instance. Without
+    `window_stride` documents are truncated; with it, every annotation yields one
+    instance per window of `max_sequence_length` tokens, consecutive windows starting
+    `window_stride` tokens apart. Each instance's metadata carries `doc_offsets`
+    and `doc_lengths` so that predictions can be mapped back with
+    `window_span_to_document` and `stitch_window_scores`.
+
+    `file_path` is an annotations file on disk next to its documents. A
+    `tar://<dataset>/<split>.jsonl` path, or any path with `use_tarball=True`, is
+    instead read from the ERASER tarball at `dataset_url`, which is downloaded on
+    first use, without extracting it.
+
+    `document_loading_workers > 0` reads the files of a `docs/` directory through a
+    thread pool, which helps on network filesystems.
+
+    `pipeline_queue_size > 0` runs reading and parsing, building the token streams
+    and building the fields in three threads connected by queues of that size (see
+    `allennlp_eraser.common.pipeline`). `pipelined_read` also returns the pipeline
+    of a read, whose `stats()` report per-stage throughput and queue occupancy.
+
+    `profile=True` times the reading, decoding, document loading, `EraserData`
+    construction, tokenization, rationale mask and instance building stages, see
+    `allennlp_eraser.common.profiling`; the report is logged every
+    `profile_log_interval` seconds if given. `profile_memory=True` also reports
+    the memory use of each stage.
+    """
+
     SEP = "[SEP]"
 
     def __init__(
@@ -73,9 +303,17 @@ class EraserDatasetReader(DatasetReader):
         tokenizer: Optional[Tokenizer] = None,
         token_indexers: Optional[Dict[str, TokenIndexer]] = None,
         max_sequence_length: Optional[int] = None,
+        window_stride: Optional[int] = None,
+        document_loading_workers: int = 0,
         keep_prob: float = 1.0,
         evidence_labels_namespace: str = "evidence_labels",
         kept_token_labels_namespace: str = "kept_token_labels",
+        dataset_url: str = ERASER_DATASET_URL,
+        use_tarball: bool = False,
+        pipeline_queue_size: int = 0,
+        profile: bool = False,
+        profile_log_interval: Optional[float] = None,
+        profile_memory: bool = False,
         lazy: bool = False,
         cache_directory: Optional[str] = None,
         max_instances: Optional[int] = None,
@@ -91,61 +329,242 @@ class EraserDatasetReader(DatasetReader):
             manual_multi_process_sharding=manual_multi_process_sharding,
         )
 
-        self._tokenizer = tokenizer or SpacyTokenizer()
+        if window_stride is not None:
+            if max_sequence_length is None:
+                raise ConfigurationError(
+                    "window_stride requires max_sequence_length to be set"
+                )
+            if not 0 < window_stride <= max_sequence_length:
+                raise ConfigurationError(
+                    f"window_stride must be in (0, {max_sequence_length}], "
+                    f"got {window_stride}"
+                )
+
+        self._tokenizer = tokenizer or WhitespaceTokenizer()
         self._token_indexers = token_indexers or {"tokens": SingleIdTokenIndexer()}
         self._is_bert = "bert" in self._token_indexers
 
         self._max_sequence_length = max_sequence_length
+        self._window_stride = window_stride
+        self._document_loading_workers = document_loading_workers
         self._keep_prob = keep_prob
 
         self._evidence_labels_namespace = evidence_labels_namespace
         self._kept_token_labels_namespace = kept_token_labels_namespace
 
+        self._dataset_url = dataset_url
+        self._use_tarball = use_tarball
+        self._archive: Optional[TarArchive] = None
+
+        self._pipeline_queue_size = pipeline_queue_size
+
+        self.profiler = reader_profiler(
+            self, profile, profile_log_interval, memory=profile_memory
+        )
+
+    def _tar_archive(self) -> TarArchive:
+        if self._archive is None:
+            self._archive = TarArchive(cached_path(self._dataset_url))
+        return self._archive
+
+    def _read_tarfile(self, file_path: str, dataset_name: str) -> Iterable[str]:
+        """Lines of the file `file_path` of the dataset `dataset_name`, read from the
+        ERASER tarball at `dataset_url` without extracting it.
+        """
+        archive = self._tar_archive()
+        name = archive.find(f"{dataset_name}/{file_path}")
+        if name is None:
+            raise FileNotFoundError(f"{dataset_name}/{file_path} is not in the archive")
+        yield from archive.iter_lines(name)
+
     @overrides
     def _read(self, file_path: str) -> Iterable[Instance]:
-        for eraser_data in read_eraser_data(file_path):
-            yield self.text_to_instance(**eraser_data.dict())
+        if self._pipeline_queue_size > 0:
+            instances, _ = self.pipelined_read(file_path)
+            yield from instances
+            return
 
-    @overrides
-    def text_to_instance(
-        self,
-        annotation_id: str,
-        docs: Dict[str, List[str]],
-        rationales: Dict[str, List[Tuple[int, int]]],
-        query: str = None,
-        label: str = None,
-    ) -> Instance:
+        for eraser_data in self._read_eraser_data(file_path):
+            for item in self._stream_stage(eraser_data):
+                yield from self._fields_stage(item)
 
-        fields: Dict[str, Field] = {}
+    def pipelined_read(self, file_path: str) -> Tuple[Iterator[Instance], Pipeline]:
+        """The instances of `file_path`, read through a pipeline with queues of
+        `pipeline_queue_size` items, and that pipeline. Its `stats()` cover this read
+        only, even while other reads run. Unlike `read`, no `max_instances` or cache
+        are applied.
+        """
+        pipeline = Pipeline(
+            [("stream", self._stream_stage), ("fields", self._fields_stage)],
+            queue_size=self._pipeline_queue_size,
+        )
+        return pipeline.run(self._read_eraser_data(file_path)), pipeline
+
+    def _read_eraser_data(self, file_path: str) -> Iterable[EraserData]:
+        if file_path.startswith(TARBALL_PREFIX) or self._use_tarball:
+            if file_path.startswith(TARBALL_PREFIX):
+                file_path = file_path[len(TARBALL_PREFIX) :]
+            data = read_eraser_data_from_tarfile(
+                self._tar_archive(),
+                file_path,
+                shard=reader_shard(self),
+                profiler=self.profiler,
+            )
+        elif os.path.exists(file_path):
+            data = read_eraser_data(
+                file_path,
+                num_workers=self._document_loading_workers,
+                shard=reader_shard(self),
+                profiler=self.profiler,
+                limit=reader_record_limit(self),
+            )
+        else:
+            raise FileNotFoundError(
+                f"{file_path} does not exist; read it as {TARBALL_PREFIX}{file_path} "
+                "or with use_tarball=True to read it from the ERASER tarball"
+            )
+        return self.profiler.iterate("eraser_data", data)
+
+    def _stream_stage(
+        self, eraser_data: EraserData
+    ) -> Iterable[Tuple[EraserData, Any]]:
+        with self.profiler.stage("rationales"):
+            stream = self._document_stream(eraser_data.docs, eraser_data.rationales)
+        yield eraser_data, stream
+
+    def _fields_stage(self, item: Tuple[EraserData, Any]) -> Iterable[Instance]:
+        eraser_data, stream = item
+        for window in self._window_spans(len(stream[0])):
+            with self.profiler.stage("instance"):
+                instance = self._stream_to_instance(
+                    eraser_data.annotation_id,
+                    stream,
+                    window,
+                    eraser_data.query,
+                    eraser_data.label,
+                )
+            yield instance
+
+    def _window_spans(self, length: int) -> List[Tuple[int, int]]:
+        max_length = self._max_sequence_length
+        if max_length is None or length <= max_length:
+            return [(0, length)]
+        if self._window_stride is None:
+            return [(0, max_length)]
+
+        starts = list(range(0, length - max_length + 1, self._window_stride))
+        if starts[-1] + max_length < length:
+            starts.append(length - max_length)
+        return [(start, start + max_length) for start in starts]
+
+    def _document_stream(
+        self, docs: Dict[str, List[str]], rationales: Dict[str, List[Tuple[int, int]]]
+    ) -> Tuple[List[Token], List[int], List[int], Dict[str, Tuple[int, int]]]:
 
         tokens: List[Token] = []
-        is_evidence = []
-        doc_to_span_map: Dict[str, Tuple[int, int]] = {}
+        is_evidence: List[int] = []
         always_keep_mask: List[int] = []
+        doc_to_span_map: Dict[str, Tuple[int, int]] = {}
 
-        for docid, doc_words in docs.items():
-            # doc_tokens = [Token(w) for w in doc_words]
-            doc_tokens = self._tokenizer.tokenize(doc_words)
+        for docid, doc_sentences in docs.items():
+            with self.profiler.stage("tokenize"):
+                doc_tokens = self._tokenize_document(docid, doc_sentences)
             tokens.extend(doc_tokens)
-            doc_to_span_map[docid] = (len(tokens) - len(doc_words), len(tokens))
+            doc_to_span_map[docid] = (len(tokens) - len(doc_tokens), len(tokens))
 
             always_keep_mask.extend([0] * len(doc_tokens))
             tokens.append(Token(self.SEP))
             always_keep_mask.extend([1])
 
-            rationale: List[int] = [0] * len(doc_words)
+            rationale: List[int] = [0] * len(doc_tokens)
             if docid in rationales:
                 for start_token, end_token in rationales[docid]:
                     for i in range(start_token, end_token):
                         rationale[i] = 1
             is_evidence.extend(rationale + [1])
 
+        return tokens, is_evidence, always_keep_mask, doc_to_span_map
+
+    def _tokenize_document(self, docid: str, sentences: List[str]) -> List[Token]:
+        tokens: List[Token] = []
+        for sentence in sentences:
+            sentence_tokens = self._tokenizer.tokenize(sentence)
+            # ERASER evidences index the space separated tokens of the document
+            if len(sentence_tokens) != len(sentence.split()):
+                raise ConfigurationError(
+                    f"{type(self._tokenizer).__name__} does not keep the space "
+                    f"separated tokens of {docid} that its evidences index: "
+                    f"{sentence!r}"
+                )
+            tokens.extend(sentence_tokens)
+        return tokens
+
+    def text_to_instances(
+        self,
+        annotation_id: str,
+        docs: Dict[str, List[str]],
+        rationales: Dict[str, List[Tuple[int, int]]],
+        query: str = None,
+        label: str = None,
+    ) -> Iterable[Instance]:
+        stream = self._document_stream(docs, rationales)
+        for window in self._window_spans(len(stream[0])):
+            yield self._stream_to_instance(annotation_id, stream, window, query, label)
+
+    @overrides
+    def text_to_instance(
+        self,
+        annotation_id: str,
+        docs: Dict[str, List[str]],
+        rationales: Dict[str, List[Tuple[int, int]]],
+        query: str = None,
+        label: str = None,
+        window: Optional[Tuple[int, int]] = None,
+    ) -> Instance:
+        stream = self._document_stream(docs, rationales)
+        if window is None:
+            window = self._window_spans(len(stream[0]))[0]
+        return self._stream_to_instance(annotation_id, stream, window, query, label)
+
+    def _stream_to_instance(
+        self,
+        annotation_id: str,
+        stream: Tuple[List[Token], List[int], List[int], Dict[str, Tuple[int, int]]],
+        window: Tuple[int, int],
+        query: str = None,
+        label: str = None,
+    ) -> Instance:
+
+        fields: Dict[str, Field] = {}
+
+        doc_tokens, doc_is_evidence, doc_always_keep_mask, doc_spans = stream
+        window_start, window_end = window
+        tokens = doc_tokens[window_start:window_end]
+        is_evidence = doc_is_evidence[window_start:window_end]
+        always_keep_mask = doc_always_keep_mask[window_start:window_end]
+
+        doc_to_span_map: Dict[str, Tuple[int, int]] = {}
+        doc_offsets: Dict[str, int] = {}
+        doc_lengths: Dict[str, int] = {}
+        for docid, (start, end) in doc_spans.items():
+            doc_lengths[docid] = end - start
+            clipped_start = max(start, window_start)
+            clipped_end = min(end, window_end)
+            is_empty_doc_in_window = start == end and window_start <= start < window_end
+            if clipped_start < clipped_end or is_empty_doc_in_window:
+                doc_to_span_map[docid] = (
+                    clipped_start - window_start,
+                    clipped_end - window_start,
+                )
+                doc_offsets[docid] = clipped_start - start
+
         if (query is not None) and (not isinstance(query, list)):
-            query_words = query.split()
-            tokens.extend([Token(w) for w in query_words])
+            with self.profiler.stage("tokenize"):
+                query_tokens = self._tokenizer.tokenize(query)
+            tokens.extend(query_tokens)
             tokens.append(Token(self.SEP))
-            is_evidence.extend([1] * (len(query_words) + 1))
-            always_keep_mask.extend([1] * (len(query_words) + 1))
+            is_evidence.extend([1] * (len(query_tokens) + 1))
+            always_keep_mask.extend([1] * (len(query_tokens) + 1))
 
         fields["doc"] = TextField(tokens, self._token_indexers)
         fields["rationale"] = SequenceLabelField(
@@ -163,6 +582,8 @@ class EraserDatasetReader(DatasetReader):
             "annotation_id": annotation_id,
             "tokens": tokens,
             "doc_to_span_map": doc_to_span_map,
+            "doc_offsets": doc_offsets,
+            "doc_lengths": doc_lengths,
             "convert_tokens_to_instance": self._convert_tokens_to_instances,
             "always_keep_mask": np.array(always_keep_mask),
         }
@@ -1,8 +1,10 @@
 import json
-from typing import Dict, Iterable, List, Optional
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from allennlp.common import JsonDict
 from allennlp.common.file_utils import cached_path
+from allennlp.common.util import lazy_groups_of
 from allennlp.data.dataset_readers import DatasetReader
 from allennlp.data.fields import Field, LabelField, ListField, MetadataField, TextField
 from allennlp.data.instance import Instance
@@ -11,6 +13,26 @@ from allennlp.data.tokenizers import SpacyTokenizer, Token, Tokenizer
 from allennlp.data.tokenizers.sentence_splitter import SpacySentenceSplitter
 from overrides import overrides
 
+from allennlp_eraser.common.columnar import ColumnarFile, is_columnar
+from allennlp_eraser.common.line_index import iter_jsonl_lines
+from allennlp_eraser.common.profiling import reader_profiler
+from allennlp_eraser.common.segmentation import (
+    BatchedSentenceSegmenter,
+    segment_or_tokenize,
+)
+from allennlp_eraser.common.sharding import reader_record_limit, reader_shard
+from allennlp_eraser.common.util import ContentCache
+
+# the columns of an e-SNLI row used by the reader, and the names they are read as
+COLUMNS = {
+    "pairID": "pair_id",
+    "gold_label": "label",
+    "Sentence1": "premise",
+    "Sentence2": "hypothesis",
+    "Sentence1_marked_1": "premise_marked",
+    "Sentence2_marked_1": "hypothesis_marked",
+}
+
 
 @DatasetReader.register("esnli")
 class ESNLIDatasetReader(DatasetReader):
@@ -21,6 +43,14 @@ class ESNLIDatasetReader(DatasetReader):
         segment_sentences: bool = False,
         max_sequence_length: Optional[int] = None,
         skip_label_indexing: bool = False,
+        segmentation_batch_size: int = 1,
+        segmentation_n_process: int = 1,
+        segmentation_single_parse: bool = False,
+        tokenization_batch_size: Optional[int] = None,
+        premise_cache_size: Optional[int] = 4096,
+        profile: bool = False,
+        profile_log_interval: Optional[float] = None,
+        profile_memory: bool = False,
         lazy: bool = False,
         cache_directory: Optional[str] = None,
         max_instances: Optional[int] = None,
@@ -42,12 +72,36 @@ class ESNLIDatasetReader(DatasetReader):
         self._max_sequence_length = max_sequence_length
         self._skip_label_indexing = skip_label_indexing
 
+        # each premise comes with several hypotheses, its tokens are shared by them.
+        # The premises and hypotheses of that many rows are tokenized together, by
+        # default as many as are segmented together
+        self._premise_cache = ContentCache(premise_cache_size)
+        self._tokenization_batch_size = (
+            tokenization_batch_size or segmentation_batch_size
+        )
+        # premises are then segmented by a single multi-process pipe over the file
+        self._segment_in_processes = segment_sentences and segmentation_n_process > 1
+
+        # opt-in timing and memory accounting of the reading, decoding,
+        # tokenization and instance stages
+        self.profiler = reader_profiler(
+            self, profile, profile_log_interval, memory=profile_memory
+        )
+
+        self._batched_segmenter: Optional[BatchedSentenceSegmenter] = None
         if segment_sentences:
             self._sentence_segmenter = SpacySentenceSplitter()
+            self._batched_segmenter = BatchedSentenceSegmenter(
+                self._tokenizer,
+                self._sentence_segmenter,
+                batch_size=segmentation_batch_size,
+                n_process=segmentation_n_process,
+                single_parse=segmentation_single_parse,
+            )
 
     def _truncate_tokens(self, tokens: List[Token]) -> List[Token]:
         if len(tokens) > self._max_sequence_length:
-            tokens = tokens[:, self._max_sequence_length]
+            tokens = tokens[: self._max_sequence_length]
         return tokens
 
     def _truncate(self, tokens: List[Token]) -> List[Token]:
@@ -56,29 +110,87 @@ class ESNLIDatasetReader(DatasetReader):
         return tokens
 
     def cleanup_data(self, data: JsonDict) -> JsonDict:
-
-        data["pair_id"] = data.pop("pairID")
-        data["label"] = data.pop("gold_label")
-        data["premise"] = data.pop("Sentence1")
-        data["hypothesis"] = data.pop("Sentence2")
-        data["premise_marked"] = data.pop("Sentence1_marked_1")
-        data["hypothesis_marked"] = data.pop("Sentence2_marked_1")
-        data["explanation"] = data.pop("Explanation_1")
-
-        del data["WorkerID"]
-        del data["Sentence1_Highlighted_1"]
-        del data["Sentence2_Highlighted_1"]
-
-        return data
+        """Projects a raw e-SNLI row onto the arguments of `text_to_instance`."""
+        return {name: data[column] for column, name in COLUMNS.items()}
 
     @overrides
     def _read(self, file_path: str) -> Iterable[Instance]:
-        with open(cached_path(file_path), "r") as rf:
-            for line in rf:
-                data = json.loads(line)
-                data = self.cleanup_data(data)
-
-                yield self.text_to_instance(**data)
+        rows = self._read_rows(file_path)
+        if self._segment_in_processes:
+            tokenized = self._segment_premises(rows)
+        else:
+            tokenized = self._tokenize_premises_in_batches(rows)
+        for batch in lazy_groups_of(tokenized, self._tokenization_batch_size):
+            with self.profiler.stage("tokenize", items=len(batch)):
+                hypotheses = self._tokenizer.batch_tokenize(
+                    [data["hypothesis"] for data, _ in batch]
+                )
+            for (data, premise_tokens), hypothesis_tokens in zip(batch, hypotheses):
+                with self.profiler.stage("instance"):
+                    instance = self.text_to_instance(
+                        **data,
+                        premise_tokens=premise_tokens,
+                        hypothesis_tokens=hypothesis_tokens,
+                    )
+                yield instance
+
+    def _tokenize_premises_in_batches(
+        self, rows: Iterable[JsonDict]
+    ) -> Iterator[Tuple[JsonDict, Union[List[Token], List[List[Token]]]]]:
+        for batch in lazy_groups_of(rows, self._tokenization_batch_size):
+            with self.profiler.stage("tokenize", items=len(batch)):
+                premises = self._premise_cache.get_batch(
+                    [data["premise"] for data in batch], self._tokenize_premises
+                )
+            yield from zip(batch, premises)
+
+    def _segment_premises(
+        self, rows: Iterable[JsonDict]
+    ) -> Iterator[Tuple[JsonDict, List[List[Token]]]]:
+        # the rows of a premise follow each other, each premise is segmented once
+        groups = (list(group) for _, group in groupby(rows, lambda d: d["premise"]))
+        segmented = self._batched_segmenter.segment(
+            groups, lambda group: group[0]["premise"]
+        )
+        for group, sentences in self.profiler.iterate("tokenize", segmented):
+            premise_tokens = [self._truncate(tokens) for tokens in sentences]
+            for data in group:
+                yield data, premise_tokens
+
+    def _read_rows(self, file_path: str) -> Iterator[JsonDict]:
+        if is_columnar(file_path):
+            # only the used columns are decoded, and blocks of row groups are
+            # assigned to the shards of a sharded reader
+            columnar_file = ColumnarFile(cached_path(file_path))
+            index, count = reader_shard(self)
+            records = columnar_file.iter_records(
+                columns=list(COLUMNS),
+                row_groups=columnar_file.shard_row_groups(index, count),
+                dictionary_columns=("gold_label",),
+            )
+            for record in self.profiler.iterate("read", records):
+                yield self.cleanup_data(record)
+        else:
+            # a sharded reader only reads the byte range of its block of lines
+            lines = iter_jsonl_lines(
+                cached_path(file_path),
+                shard=reader_shard(self),
+                limit=reader_record_limit(self),
+            )
+            for line in self.profiler.iterate("read", lines):
+                with self.profiler.stage("decode"):
+                    data = self.cleanup_data(json.loads(line))
+                yield data
+
+    def _tokenize_premises(
+        self, premises: List[str]
+    ) -> List[Union[List[Token], List[List[Token]]]]:
+        return segment_or_tokenize(
+            premises,
+            self._tokenizer,
+            self._batched_segmenter,
+            self._max_sequence_length,
+        )
 
     @overrides
     def text_to_instance(
@@ -89,26 +201,31 @@ class ESNLIDatasetReader(DatasetReader):
         hypothesis_marked: str,
         label: Optional[str] = None,
         pair_id: Optional[str] = None,
+        premise_tokens: Optional[Union[List[Token], List[List[Token]]]] = None,
+        hypothesis_tokens: Optional[List[Token]] = None,
     ) -> Instance:
 
+        if premise_tokens is None:
+            with self.profiler.stage("tokenize"):
+                premise_tokens = self._premise_cache.get(
+                    premise, lambda text: self._tokenize_premises([text])[0]
+                )
+
         fields: Dict[str, Field] = {}
         if self._segment_sentences:
-            sentences: List[Field] = []
-            sentence_splits = self._sentence_segmenter.split_sentences(premise)
-            for sentence in sentence_splits:
-                tokens = self._tokenizer.tokenize(sentence)
-                tokens = self._truncate(tokens)
-                sentences.append(TextField(tokens, self._token_indexers))
+            sentences: List[Field] = [
+                TextField(sentence_tokens, self._token_indexers)
+                for sentence_tokens in premise_tokens
+            ]
             fields["premise"] = ListField(sentences)
 
         else:
-            tokens = self._tokenizer.tokenize(premise)
-            tokens = self._truncate(tokens)
-            fields["premise"] = TextField(tokens, self._token_indexers)
+            fields["premise"] = TextField(premise_tokens, self._token_indexers)
 
-        fields["hypothesis"] = TextField(
-            self._tokenizer.tokenize(hypothesis), self._token_indexers
-        )
+        if hypothesis_tokens is None:
+            with self.profiler.stage("tokenize"):
+                hypothesis_tokens = self._tokenizer.tokenize(hypothesis)
+        fields["hypothesis"] = TextField(hypothesis_tokens, self._token_indexers)
         fields["metadata"] = MetadataField({"pair_id": pair_id})
 
         if label is not None:
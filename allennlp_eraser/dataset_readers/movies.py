@@ -1,8 +1,26 @@
 import json
+import multiprocessing.util
+import os
 import pathlib
-from typing import Dict, Iterable, List, Optional, Tuple
-from zipfile import ZipFile, ZipInfo
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
 
+from allennlp.common.checks import ConfigurationError
 from allennlp.common.file_utils import cached_path
 from allennlp.data.dataset_readers import DatasetReader
 from allennlp.data.fields import Field, LabelField, ListField, TextField
@@ -12,10 +30,107 @@ from allennlp.data.tokenizers import SpacyTokenizer, Token, Tokenizer
 from allennlp.data.tokenizers.sentence_splitter import SpacySentenceSplitter
 from overrides import overrides
 
-from allennlp_eraser.common.util import check_phase
+from allennlp_eraser.common.profiling import reader_profiler
+from allennlp_eraser.common.segmentation import (
+    BatchedSentenceSegmenter,
+    segment_or_tokenize,
+)
+from allennlp_eraser.common.sharding import shard_iterable
+from allennlp_eraser.common.util import (
+    cached_split_sidecar,
+    check_phase,
+    versioned_sidecar,
+)
 
 DATASET_URL = "http://www.cs.jhu.edu/~ozaidan/rationales/review_polarity_rationales.zip"
 
+_LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+class ZipMember(NamedTuple):
+    filename: str
+    header_offset: int
+    compress_type: int
+    compress_size: int
+
+    @classmethod
+    def from_zip_info(cls, zip_info: ZipInfo) -> "ZipMember":
+        return cls(
+            zip_info.filename,
+            zip_info.header_offset,
+            zip_info.compress_type,
+            zip_info.compress_size,
+        )
+
+
+def read_zip_member(fp: BinaryIO, member: ZipMember) -> bytes:
+    """Reads a stored or deflated member by seeking to its local file header,
+    without going through the central directory of the archive.
+    """
+    fp.seek(member.header_offset)
+    header = _LOCAL_FILE_HEADER.unpack(fp.read(_LOCAL_FILE_HEADER.size))
+    filename_length, extra_length = header[-2], header[-1]
+    fp.seek(filename_length + extra_length, os.SEEK_CUR)
+    data = fp.read(member.compress_size)
+
+    if member.compress_type == ZIP_STORED:
+        return data
+    if member.compress_type == ZIP_DEFLATED:
+        return zlib.decompress(data, -zlib.MAX_WBITS)
+    raise ValueError(
+        f"Unsupported compression type {member.compress_type} of {member.filename}"
+    )
+
+
+class _WorkerConfig(NamedTuple):
+    """What a decoding worker needs to tokenize like the reader, instead of the
+    reader itself with its loaded models.
+    """
+
+    file_path: str
+    # `None` for the default tokenizer, which is rebuilt in the worker
+    tokenizer: Optional[Tokenizer]
+    segment_sentences: bool
+    segmentation_single_parse: bool
+    max_sequence_length: Optional[int]
+
+
+# per worker process state of `MoviesDatasetReader._read_zipfile_parallel`
+_worker_file: Optional[BinaryIO] = None
+_worker_tokenize: Optional[
+    Callable[[List[str]], List[Union[List[Token], List[List[Token]]]]]
+] = None
+
+
+def _init_worker(config: _WorkerConfig) -> None:
+    global _worker_file, _worker_tokenize
+    _worker_file = open(config.file_path, "rb")
+    # atexit handlers do not run in forked workers, their finalizers do
+    multiprocessing.util.Finalize(_worker_file, _worker_file.close, exitpriority=0)
+
+    tokenizer = config.tokenizer or SpacyTokenizer()
+    segmenter = None
+    if config.segment_sentences:
+        segmenter = BatchedSentenceSegmenter(
+            tokenizer,
+            SpacySentenceSplitter(),
+            single_parse=config.segmentation_single_parse,
+        )
+    _worker_tokenize = partial(
+        segment_or_tokenize,
+        tokenizer=tokenizer,
+        segmenter=segmenter,
+        max_length=config.max_sequence_length,
+    )
+
+
+def _load_review(
+    label_and_member: Tuple[str, ZipMember],
+) -> Tuple[str, str, Union[List[Token], List[List[Token]]]]:
+    label, member = label_and_member
+    text = read_zip_member(_worker_file, member).decode("utf-8").rstrip()
+    return text, label, _worker_tokenize([text])[0]
+
 
 @DatasetReader.register("movies")
 class MoviesDatasetReader(DatasetReader):
@@ -27,6 +142,14 @@ class MoviesDatasetReader(DatasetReader):
         segment_sentences: bool = False,
         max_sequence_length: Optional[int] = None,
         skip_label_indexing: bool = False,
+        num_decoding_workers: int = 0,
+        cache_extracted_splits: bool = False,
+        segmentation_batch_size: int = 1,
+        segmentation_n_process: int = 1,
+        segmentation_single_parse: bool = False,
+        profile: bool = False,
+        profile_log_interval: Optional[float] = None,
+        profile_memory: bool = False,
         lazy: bool = False,
         cache_directory: Optional[str] = None,
         max_instances: Optional[int] = None,
@@ -41,16 +164,40 @@ class MoviesDatasetReader(DatasetReader):
             manual_distributed_sharding=manual_distributed_sharding,
             manual_multi_process_sharding=manual_multi_process_sharding,
         )
+        if num_decoding_workers > 0 and cache_extracted_splits:
+            # the workers inflate their members from the archive itself
+            raise ConfigurationError(
+                "num_decoding_workers cannot be combined with cache_extracted_splits"
+            )
+
         self._dataset_url = dataset_url
+        self._custom_tokenizer = tokenizer
         self._tokenizer = tokenizer or SpacyTokenizer()
         self._token_indexers = token_indexers or {"tokens": SingleIdTokenIndexer()}
 
         self._segment_sentences = segment_sentences
+        self._segmentation_single_parse = segmentation_single_parse
         self._max_sequence_length = max_sequence_length
         self._skip_label_indexing = skip_label_indexing
+        self._num_decoding_workers = num_decoding_workers
+        self._cache_extracted_splits = cache_extracted_splits
 
+        # opt-in timing and memory accounting of the reading, tokenization and
+        # instance stages
+        self.profiler = reader_profiler(
+            self, profile, profile_log_interval, memory=profile_memory
+        )
+
+        self._batched_segmenter: Optional[BatchedSentenceSegmenter] = None
         if segment_sentences:
             self._sentence_segmenter = SpacySentenceSplitter()
+            self._batched_segmenter = BatchedSentenceSegmenter(
+                self._tokenizer,
+                self._sentence_segmenter,
+                batch_size=segmentation_batch_size,
+                n_process=segmentation_n_process,
+                single_parse=segmentation_single_parse,
+            )
 
     def _is_file_in_phase(self, phase: str, num: int) -> bool:
         if phase == "train":
@@ -82,24 +229,132 @@ class MoviesDatasetReader(DatasetReader):
                 if self._is_file_in_phase(phase, num):
                     yield zip_info, label
 
+    def _build_member_index(
+        self, file_path: str
+    ) -> Dict[str, List[Tuple[str, ZipMember]]]:
+        index: Dict[str, List[Tuple[str, ZipMember]]] = {}
+        with ZipFile(file_path, "r") as zip_file:
+            for phase in ("train", "valid", "test"):
+                index[phase] = [
+                    (label, ZipMember.from_zip_info(zip_info))
+                    for zip_info, label in self._find_file_from_zip(phase, zip_file)
+                ]
+        return index
+
+    def _member_index(self, file_path: str) -> Dict[str, List[Tuple[str, ZipMember]]]:
+        """Phase to `(label, member)` index of the archive at `file_path`.
+        It is built once per version of the archive and persisted next to it, see
+        `versioned_sidecar`.
+        """
+
+        def write(wf: TextIO) -> None:
+            json.dump(self._build_member_index(file_path), wf)
+
+        with open(versioned_sidecar(file_path, "index.json", write), "r") as rf:
+            index = json.load(rf)
+        return {
+            phase: [(label, ZipMember(*member)) for label, member in members]
+            for phase, members in index.items()
+        }
+
+    def _read_members(
+        self, file_path: str, members: Iterable[Tuple[str, ZipMember]]
+    ) -> Iterable[Tuple[str, str]]:
+        with open(file_path, "rb") as rf:
+            for label, member in members:
+                line = read_zip_member(rf, member).decode("utf-8").rstrip()
+                yield line, label
+
     def _read_zipfile(self, phase: str):
         file_path = cached_path(self._dataset_url)
 
-        with ZipFile(file_path, "r") as zip_file:
-            for zip_info, label in self._find_file_from_zip(phase, zip_file):
-                with zip_file.open(zip_info, "r") as rf:
-                    line = rf.read().decode("utf-8").rstrip()
-                    yield line, label
+        # members owned by other shards are never inflated
+        members = self._member_index(file_path)[phase]
+        yield from self._read_members(file_path, shard_iterable(self, members))
+
+    def _read_sidecar(self, phase: str) -> Iterable[Tuple[str, str]]:
+        """Like `_read_zipfile`, but streams the reviews from a JSONL sidecar that is
+        extracted next to the cached archive on first read.
+        """
+        file_path = cached_path(self._dataset_url)
+
+        def extract() -> Iterable[dict]:
+            members = self._member_index(file_path)[phase]
+            for text, label in self._read_members(file_path, members):
+                yield {"text": text, "label": label}
+
+        with open(cached_split_sidecar(file_path, phase, extract), "r") as rf:
+            for line in shard_iterable(self, rf):
+                record = json.loads(line)
+                yield record["text"], record["label"]
+
+    def _read_zipfile_parallel(
+        self, phase: str
+    ) -> Iterable[Tuple[str, str, Union[List[Token], List[List[Token]]]]]:
+        """Like `_read_zipfile`, but members are inflated, decoded and tokenized by
+        `num_decoding_workers` processes, each with its own handle on the archive
+        and its own tokenizer built from a `_WorkerConfig`. Reviews are yielded in
+        archive order together with their tokens.
+        """
+        file_path = cached_path(self._dataset_url)
+
+        members = list(shard_iterable(self, self._member_index(file_path)[phase]))
+        chunksize = max(1, len(members) // (4 * self._num_decoding_workers))
+        with ProcessPoolExecutor(
+            max_workers=self._num_decoding_workers,
+            initializer=_init_worker,
+            initargs=(self._worker_config(file_path),),
+        ) as executor:
+            yield from executor.map(_load_review, members, chunksize=chunksize)
+
+    def _worker_config(self, file_path: str) -> _WorkerConfig:
+        return _WorkerConfig(
+            file_path,
+            self._custom_tokenizer,
+            self._segment_sentences,
+            self._segmentation_single_parse,
+            self._max_sequence_length,
+        )
 
     @overrides
     def _read(self, phase: str) -> Iterable[Instance]:
         check_phase(phase)
-        for text, label in self._read_zipfile(phase):
-            yield self.text_to_instance(text, label)
+        if self._num_decoding_workers > 0:
+            # reading and tokenization happen in the worker processes, "read" is the
+            # time spent waiting for them
+            reviews = self.profiler.iterate("read", self._read_zipfile_parallel(phase))
+            for text, label, tokens in reviews:
+                with self.profiler.stage("instance"):
+                    instance = self.text_to_instance(text, label, tokens=tokens)
+                yield instance
+            return
+
+        if self._cache_extracted_splits:
+            reviews = self._read_sidecar(phase)
+        else:
+            reviews = self._read_zipfile(phase)
+        reviews = self.profiler.iterate("read", reviews)
+
+        if self._segment_sentences:
+            segmented = self._batched_segmenter.segment(
+                reviews, lambda review: review[0]
+            )
+            for (text, label), sentences in self.profiler.iterate(
+                "tokenize", segmented
+            ):
+                with self.profiler.stage("instance"):
+                    tokens = [self._truncate(sentence) for sentence in sentences]
+                    instance = self.text_to_instance(text, label, tokens=tokens)
+                yield instance
+        else:
+            for text, label in reviews:
+                with self.profiler.stage("instance"):
+                    instance = self.text_to_instance(text, label)
+                yield instance
 
     def _truncate_tokens(self, tokens: List[Token]) -> List[Token]:
         if len(tokens) > self._max_sequence_length:
-            tokens = tokens[:, self._max_sequence_length]
+            tokens = tokens[: self._max_sequence_length]
         return tokens
 
     def _truncate(self, tokens: List[Token]) -> List[Token]:
@@ -107,21 +362,34 @@ class MoviesDatasetReader(DatasetReader):
             tokens = self._truncate_tokens(tokens)
         return tokens
 
+    def _tokenize(self, text: str) -> Union[List[Token], List[List[Token]]]:
+        return segment_or_tokenize(
+            [text],
+            self._tokenizer,
+            self._batched_segmenter,
+            self._max_sequence_length,
+        )[0]
+
     @overrides
-    def text_to_instance(self, text: str, label: Optional[str] = None) -> Instance:
+    def text_to_instance(
+        self,
+        text: str,
+        label: Optional[str] = None,
+        tokens: Optional[Union[List[Token], List[List[Token]]]] = None,
+    ) -> Instance:
+
+        if tokens is None:
+            with self.profiler.stage("tokenize"):
+                tokens = self._tokenize(text)
 
         fields: Dict[str, Field] = {}
         if self._segment_sentences:
-            sentences: List[Field] = []
-            sentence_splits = self._sentence_segmenter.split_sentences(text)
-            for sentence in sentence_splits:
-                tokens = self._tokenizer.tokenize(sentence)
-                tokens = self._truncate(tokens)
-                sentences.append(TextField(tokens, self._token_indexers))
+            sentences: List[Field] = [
+                TextField(sentence_tokens, self._token_indexers)
+                for sentence_tokens in tokens
+            ]
             fields["tokens"] = ListField(sentences)
         else:
-            tokens = self._tokenizer.tokenize(text)
-            tokens = self._truncate(tokens)
             fields["tokens"] = TextField(tokens, self._token_indexers)
 
         if label is not None:
@@ -1,18 +1,31 @@
+import io
 import json
+import os
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from zipfile import ZipFile
 
+from allennlp.common import JsonDict
 from allennlp.common.file_utils import cached_path
 from allennlp.data.dataset_readers import DatasetReader
 from allennlp.data.fields import Field, LabelField, ListField, MetadataField, TextField
 from allennlp.data.instance import Instance
 from allennlp.data.token_indexers import SingleIdTokenIndexer, TokenIndexer
-from allennlp.data.tokenizers import SpacyTokenizer, Tokenizer
+from allennlp.data.tokenizers import SpacyTokenizer, Token, Tokenizer
 from allennlp.data.tokenizers.sentence_splitter import SpacySentenceSplitter
 from overrides import overrides
 
-from allennlp_eraser.common.util import check_phase
+from allennlp_eraser.common.profiling import reader_profiler
+from allennlp_eraser.common.segmentation import (
+    BatchedSentenceSegmenter,
+    segment_or_tokenize,
+)
+from allennlp_eraser.common.sharding import shard_iterable
+from allennlp_eraser.common.util import (
+    cached_split_sidecar,
+    check_phase,
+    iter_json_array,
+)
 
 DATASET_URL = "https://cogcomp.seas.upenn.edu/multirc/data/mutlirc-v2.zip"
 
@@ -34,6 +47,13 @@ class MultiRCDatasetReader(DatasetReader):
         segment_sentences: bool = False,
         max_sequence_length: Optional[int] = None,
         skip_label_indexing: bool = False,
+        cache_extracted_splits: bool = False,
+        segmentation_batch_size: int = 1,
+        segmentation_n_process: int = 1,
+        segmentation_single_parse: bool = False,
+        profile: bool = False,
+        profile_log_interval: Optional[float] = None,
+        profile_memory: bool = False,
         lazy: bool = False,
         cache_directory: Optional[str] = None,
         max_instances: Optional[int] = None,
@@ -54,9 +74,24 @@ class MultiRCDatasetReader(DatasetReader):
         self._segment_sentences = segment_sentences
         self._max_sequence_length = max_sequence_length
         self._skip_label_indexing = skip_label_indexing
+        self._cache_extracted_splits = cache_extracted_splits
 
+        # opt-in timing and memory accounting of the reading, tokenization and
+        # instance stages
+        self.profiler = reader_profiler(
+            self, profile, profile_log_interval, memory=profile_memory
+        )
+
+        self._batched_segmenter: Optional[BatchedSentenceSegmenter] = None
         if segment_sentences:
             self._sentence_segmenter = SpacySentenceSplitter()
+            self._batched_segmenter = BatchedSentenceSegmenter(
+                self._tokenizer,
+                self._sentence_segmenter,
+                batch_size=segmentation_batch_size,
+                n_process=segmentation_n_process,
+                single_parse=segmentation_single_parse,
+            )
 
     def get_filename_in_zip(self, phase: str) -> str:
         if phase == "train":
@@ -65,23 +100,94 @@ class MultiRCDatasetReader(DatasetReader):
         else:
             return "splitv2/dev_83-fixedIds.json"
 
+    def _read_paragraphs(self, phase: str) -> Iterable[JsonDict]:
+        file_path = cached_path(self._dataset_url)
+        with ZipFile(file_path, "r") as zip_file:
+            with zip_file.open(self.get_filename_in_zip(phase), "r") as rf:
+                # parse one paragraph at a time instead of loading the whole split
+                for data in iter_json_array(io.TextIOWrapper(rf, "utf-8"), "data"):
+                    yield data["paragraph"]
+
+    def _read_sidecar(self, phase: str) -> Iterable[JsonDict]:
+        """Like `_read_paragraphs`, but streams the paragraphs from a JSONL sidecar
+        that is extracted next to the cached archive on first read.
+        """
+        file_path = cached_path(self._dataset_url)
+        filename = self.get_filename_in_zip(phase)
+        split = os.path.splitext(os.path.basename(filename))[0]
+
+        def extract() -> Iterable[JsonDict]:
+            for paragraph in self._read_paragraphs(phase):
+                yield {"text": paragraph["text"], "questions": paragraph["questions"]}
+
+        with open(cached_split_sidecar(file_path, split, extract), "r") as rf:
+            # lines owned by other shards are not decoded
+            for line in shard_iterable(self, rf):
+                yield json.loads(line)
+
     @overrides
     def _read(self, phase: str) -> Iterable[Instance]:
         check_phase(phase)
-        file_path = cached_path(self._dataset_url)
-        with ZipFile(file_path, "r") as zip_file:
-            with zip_file.open(self._get_filename_in_zip(phase), "r") as rf:
-                content = json.load(rf)
+        if self._cache_extracted_splits:
+            paragraphs = self._read_sidecar(phase)
+        else:
+            # paragraphs owned by other shards are parsed but never tokenized
+            paragraphs = shard_iterable(self, self._read_paragraphs(phase))
+        paragraphs = self.profiler.iterate("read", paragraphs)
 
-        for data in content["data"]:
-            paragraph = data["paragraph"]
+        tokenized = self.profiler.iterate(
+            "tokenize", self._tokenize_paragraphs(paragraphs)
+        )
+        for paragraph, passage_tokens in tokenized:
             text = paragraph["text"]
-            questions = paragraph["questions"]
+            # passage_tokens are shared by all the instances derived from this paragraph
+            for question in paragraph["questions"]:
+                with self.profiler.stage("tokenize"):
+                    question_tokens = self._tokenizer.tokenize(question["question"])
+                for ans in question["answers"]:
+                    with self.profiler.stage("instance"):
+                        instance = self.text_to_instance(
+                            text=text,
+                            question=question["question"],
+                            idx=question["idx"],
+                            multisent=question["multisent"],
+                            sentence_used=question["sentences_used"],
+                            answer=MultiRCAnswer(**ans),
+                            passage_tokens=passage_tokens,
+                            question_tokens=question_tokens,
+                        )
+                    yield instance
+
+    def _truncate_tokens(self, tokens: List[Token]) -> List[Token]:
+        if len(tokens) > self._max_sequence_length:
+            tokens = tokens[: self._max_sequence_length]
+        return tokens
+
+    def _truncate(self, tokens: List[Token]) -> List[Token]:
+        if self._max_sequence_length:
+            tokens = self._truncate_tokens(tokens)
+        return tokens
+
+    def _tokenize_paragraphs(
+        self, paragraphs: Iterable[JsonDict]
+    ) -> Iterable[Tuple[JsonDict, Union[List[Token], List[List[Token]]]]]:
+        if self._segment_sentences:
+            segmented = self._batched_segmenter.segment(
+                paragraphs, lambda paragraph: paragraph["text"]
+            )
+            for paragraph, sentences in segmented:
+                yield paragraph, [self._truncate(tokens) for tokens in sentences]
+        else:
+            for paragraph in paragraphs:
+                yield paragraph, self._tokenize_passage(paragraph["text"])
 
-            for question in questions:
-                answers = [MultiRCAnswer(**ans) for ans in question.pop("answers")]
-                for answer in answers:
-                    yield self.text_to_instance(text=text, answer=answer, **question)
+    def _tokenize_passage(self, text: str) -> Union[List[Token], List[List[Token]]]:
+        return segment_or_tokenize(
+            [text],
+            self._tokenizer,
+            self._batched_segmenter,
+            self._max_sequence_length,
+        )[0]
 
     @overrides
     def text_to_instance(
@@ -92,32 +198,35 @@ class MultiRCDatasetReader(DatasetReader):
         multisent: bool,
         sentence_used: List[int],
         answer: Optional[MultiRCAnswer] = None,
+        passage_tokens: Optional[Union[List[Token], List[List[Token]]]] = None,
+        question_tokens: Optional[List[Token]] = None,
     ) -> Instance:
+
+        with self.profiler.stage("tokenize"):
+            if passage_tokens is None:
+                passage_tokens = self._tokenize_passage(text)
+            if question_tokens is None:
+                question_tokens = self._tokenizer.tokenize(question)
+
         fields: Dict[str, Field] = {}
         if self._segment_sentences:
-            sentences: List[Field] = []
-            sentence_splits = self._sentence_segmenter.split_sentences(text)
-            for sentence in sentence_splits:
-                tokens = self._tokenizer.tokenize(sentence)
-                tokens = self._truncate(tokens)
-                sentences.append(TextField(tokens, self._token_indexers))
+            sentences: List[Field] = [
+                TextField(sentence_tokens, self._token_indexers)
+                for sentence_tokens in passage_tokens
+            ]
             fields["passage"] = ListField(sentences)
         else:
-            tokens = self._tokenizer.tokenize(text)
-            tokens = self._truncate(tokens)
-            fields["passage"] = TextField(tokens, self._token_indexers)
+            fields["passage"] = TextField(passage_tokens, self._token_indexers)
 
-        fields["question"] = TextField(
-            self._tokenizer.tokenize(question), self._token_indexers
-        )
+        fields["question"] = TextField(question_tokens, self._token_indexers)
 
         metadata = {"idx": idx, "multisent": multisent, "sentence_used": sentence_used}
         fields["metadata"] = MetadataField(metadata)
 
         if answer is not None:
-            fields["answer_tokens"] = TextField(
-                self._tokenizer.tokenize(answer["text"]), self._token_indexers
-            )
-            fields["label"] = LabelField(str(answer["isAnswer"]))
+            with self.profiler.stage("tokenize"):
+                answer_tokens = self._tokenizer.tokenize(answer.text)
+            fields["answer_tokens"] = TextField(answer_tokens, self._token_indexers)
+            fields["label"] = LabelField(str(answer.isAnswer))
 
         return Instance(fields)
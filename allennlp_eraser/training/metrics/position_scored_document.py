@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 from itertools import chain
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from allennlp_eraser.common.document import SentenceOffsetIndex
+from allennlp_eraser.common.profiling import NULL_PROFILER, ReaderProfiler
 from allennlp_eraser.common.util import Annotation
 
 
@@ -19,42 +21,61 @@ class PositionScoredDocument:
         annotations: List[Annotation],
         docs: Dict[str, List[Any]],
         use_tokens: bool = True,
+        sentence_index: Optional[SentenceOffsetIndex] = None,
+        profiler: ReaderProfiler = NULL_PROFILER,
     ) -> List["PositionScoredDocument"]:
-        """Creates a paired list of annotation ids/docids/predictions/truth values"""
+        """Creates a paired list of annotation ids/docids/predictions/truth values
+        With `use_tokens=False`, evidences without sentence positions are mapped to
+        the sentences covering their tokens through `sentence_index`, if given, and
+        rationales without `soft_sentence_predictions` are scored with the maximum
+        of their `soft_rationale_predictions` over each sentence.
+        Building the truth masks and pairing the scores are the "truths" and
+        "scores" stages of `profiler`.
+        """
         key_to_annotation = dict()
-        for ann in annotations:
-            for ev in chain.from_iterable(ann.evidences):
-                key = (ann.annotation_id, ev.docid)
-                if key not in key_to_annotation:
-                    key_to_annotation[key] = [False for _ in docs[ev.docid]]
-                if use_tokens:
-                    start, end = ev.start_token, ev.end_token
-                else:
-                    start, end = ev.start_sentence, ev.end_sentence
-                for t in range(start, end):
-                    key_to_annotation[key][t] = True
+        with profiler.stage("truths", items=len(annotations)):
+            for ann in annotations:
+                for ev in chain.from_iterable(ann.evidences):
+                    key = (ann.annotation_id, ev.docid)
+                    if key not in key_to_annotation:
+                        key_to_annotation[key] = [False for _ in docs[ev.docid]]
+                    if use_tokens:
+                        start, end = ev.start_token, ev.end_token
+                    elif ev.start_sentence < 0 and sentence_index is not None:
+                        start, end = sentence_index.token_span_to_sentences(
+                            ev.docid, ev.start_token, ev.end_token
+                        )
+                    else:
+                        start, end = ev.start_sentence, ev.end_sentence
+                    for t in range(start, end):
+                        key_to_annotation[key][t] = True
         ret = []
         if use_tokens:
             field = "soft_rationale_predictions"
         else:
             field = "soft_sentence_predictions"
-        for inst in instances:
-            for rat in inst["rationales"]:
-                docid = rat["docid"]
-                scores = rat[field]
-                key = (inst["annotation_id"], docid)
-                assert len(scores) == len(docs[docid])
-                if key in key_to_annotation:
-                    assert len(scores) == len(key_to_annotation[key])
-                else:
-                    # In case model makes a prediction on document(s) for which ground truth evidence is not present
-                    key_to_annotation[key] = [False for _ in docs[docid]]
-                ret.append(
-                    PositionScoredDocument(
-                        inst["annotation_id"],
-                        docid,
-                        tuple(scores),
-                        tuple(key_to_annotation[key]),
+        with profiler.stage("scores", items=len(instances)):
+            for inst in instances:
+                for rat in inst["rationales"]:
+                    docid = rat["docid"]
+                    scores = rat.get(field)
+                    if scores is None and not use_tokens and sentence_index is not None:
+                        scores = sentence_index.sentence_scores(
+                            docid, rat["soft_rationale_predictions"]
+                        ).tolist()
+                    key = (inst["annotation_id"], docid)
+                    assert len(scores) == len(docs[docid])
+                    if key in key_to_annotation:
+                        assert len(scores) == len(key_to_annotation[key])
+                    else:
+                        # In case model makes a prediction on document(s) for which ground truth evidence is not present
+                        key_to_annotation[key] = [False for _ in docs[docid]]
+                    ret.append(
+                        PositionScoredDocument(
+                            inst["annotation_id"],
+                            docid,
+                            tuple(scores),
+                            tuple(key_to_annotation[key]),
+                        )
                     )
-                )
         return ret
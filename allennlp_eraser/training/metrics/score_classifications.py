@@ -1,3 +1,4 @@
+from itertools import chain
 from typing import Dict, List
 
 import numpy as np
@@ -0,0 +1,192 @@
+"""
+Offline, CPU-only benchmarks of the readers and metrics on synthetic data.
+
+    python -m benchmarks run [--documents 1000] [--repeats 3] [--only reader.boolq]
+                             [--memory]
+    python -m benchmarks compare [--tolerance 0.1]
+
+`run` appends its timings to the history (`benchmarks/history.jsonl` by default,
+which git ignores); with `--memory` it also runs every benchmark once with memory
+accounting and records the tracemalloc peak, RSS change and live object counts of
+their stages.
+`compare` compares the latest run with the previous run of the same configuration
+and exits with status 1 if a benchmark got slower, or the tracemalloc peak of a
+stage grew by more than 1 MiB and, either way, by more than `tolerance`. Peaks that
+were not measured, before Python 3.9 or for stages running in several threads, are
+reported as such and not compared.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from typing import Iterable, Optional
+
+from benchmarks.history import (
+    append_record,
+    compare_memory,
+    compare_records,
+    find_baseline,
+    load_history,
+    make_record,
+)
+
+DEFAULT_HISTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "history.jsonl"
+)
+
+# growths of the tracemalloc peak below this are noise, whatever their ratio
+MEMORY_SLACK_BYTES = 2**20
+
+
+def run(args: argparse.Namespace) -> int:
+    # imported here so that `compare` does not need the full environment
+    from benchmarks.corpora import write_corpus
+    from benchmarks.suite import BENCHMARKS, profile_memory, run_benchmarks
+
+    config = {
+        "documents": args.documents,
+        "sentences_per_document": args.sentences,
+        "tokens_per_sentence": args.tokens,
+        "evidences_per_annotation": args.evidences,
+        "length_sigma": args.length_sigma,
+        "thresholds": args.thresholds,
+        "repeats": args.repeats,
+        "seed": args.seed,
+    }
+    unknown = set(args.only or ()) - set(BENCHMARKS)
+    if unknown:
+        print(f"unknown benchmarks: {sorted(unknown)}", file=sys.stderr)
+        return 2
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        corpus = write_corpus(
+            output_dir,
+            num_documents=args.documents,
+            sentences_per_document=args.sentences,
+            tokens_per_sentence=args.tokens,
+            evidences_per_annotation=args.evidences,
+            thresholds=args.thresholds,
+            seed=args.seed,
+            length_sigma=args.length_sigma,
+        )
+        timings = run_benchmarks(corpus, repeats=args.repeats, names=args.only)
+        memory = profile_memory(corpus, names=args.only) if args.memory else None
+
+    results = {name: timing._asdict() for name, timing in timings.items()}
+    for name, timing in timings.items():
+        print(f"{name:<32} min {timing.min:9.4f}s  median {timing.median:9.4f}s")
+    for name, stages in (memory or {}).items():
+        for stage, stats in stages.items():
+            objects = ", ".join(f"{k}={v}" for k, v in stats["objects"].items() if v)
+            print(
+                f"{name + '/' + stage:<48} "
+                f"peak {_peak(stats['tracemalloc_peak_bytes'])}  "
+                f"rss {_mib(stats['rss_delta_bytes']):+9.2f}MiB  {objects}"
+            )
+    if not args.no_record:
+        append_record(args.history, make_record(config, results, memory))
+    return 0
+
+
+def _mib(size: float) -> float:
+    return size / 2**20
+
+
+def _peak(size: Optional[float]) -> str:
+    return "      n/a   " if size is None else f"{_mib(size):9.2f}MiB"
+
+
+def compare(args: argparse.Namespace) -> int:
+    history = load_history(args.history)
+    if not history:
+        print(f"no benchmark history in {args.history}", file=sys.stderr)
+        return 2
+    current = history[-1]
+    baseline = find_baseline(history, current)
+    if baseline is None:
+        print("no earlier run with the same configuration to compare with")
+        return 0
+
+    regressions = 0
+    print(f"baseline {baseline['timestamp']} ({baseline['commit']})")
+    print(f"current  {current['timestamp']} ({current['commit']})")
+    for comparison in compare_records(baseline, current, args.statistic):
+        flag = ""
+        if comparison.is_regression(args.tolerance):
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{comparison.name:<32} {comparison.baseline:9.4f}s -> "
+            f"{comparison.current:9.4f}s  x{comparison.ratio:5.2f}{flag}"
+        )
+    for comparison in compare_memory(baseline, current):
+        flag = ""
+        if (
+            comparison.is_regression(args.tolerance)
+            and comparison.current - comparison.baseline > MEMORY_SLACK_BYTES
+        ):
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{comparison.name:<48} {_mib(comparison.baseline):9.2f}MiB -> "
+            f"{_mib(comparison.current):9.2f}MiB  x{comparison.ratio:5.2f}{flag}"
+        )
+    unmeasured = sorted(
+        {
+            f"{name}/{stage}"
+            for record in (baseline, current)
+            for name, stages in record.get("memory", {}).items()
+            for stage, stats in stages.items()
+            if stats["tracemalloc_peak_bytes"] is None
+        }
+    )
+    if unmeasured:
+        print(f"tracemalloc peaks not measured, not compared: {', '.join(unmeasured)}")
+    return 1 if regressions else 0
+
+
+def main(args: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--documents", type=int, default=1000)
+    run_parser.add_argument("--sentences", type=int, default=10)
+    run_parser.add_argument("--tokens", type=int, default=20)
+    run_parser.add_argument("--evidences", type=int, default=2)
+    run_parser.add_argument("--length-sigma", type=float, default=0.5)
+    run_parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=[0.01, 0.05, 0.1, 0.2, 0.5]
+    )
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--only", nargs="+", default=None, help="benchmark names")
+    run_parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="also record the memory use of the stages of each benchmark",
+    )
+    run_parser.add_argument(
+        "--no-record", action="store_true", help="do not append to the history"
+    )
+    run_parser.set_defaults(function=run)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare the latest run with the previous one"
+    )
+    compare_parser.add_argument("--tolerance", type=float, default=0.1)
+    compare_parser.add_argument(
+        "--statistic", choices=("min", "median", "mean"), default="median"
+    )
+    compare_parser.set_defaults(function=compare)
+
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument("--history", default=DEFAULT_HISTORY)
+
+    parsed = parser.parse_args(args)
+    return parsed.function(parsed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Synthetic inputs of the benchmarked readers, derived from a synthetic ERASER dataset
+so that every reader sees the same texts.
+"""
+
+import json
+import os
+import zipfile
+from typing import Dict, List, NamedTuple
+
+from allennlp_eraser.common.synthetic import (
+    SyntheticDataset,
+    write_synthetic_dataset,
+)
+from allennlp_eraser.common.util import load_documents, load_jsonl
+
+
+class Corpus(NamedTuple):
+    eraser: SyntheticDataset
+    boolq_path: str
+    esnli_path: str
+    movies_path: str
+    multirc_path: str
+
+
+def _texts(dataset: SyntheticDataset) -> List[Dict[str, str]]:
+    documents = load_documents(dataset.data_dir)
+    texts = []
+    for annotation in load_jsonl(dataset.annotations_path):
+        evidence = annotation["evidences"][0][0]
+        texts.append(
+            {
+                "document": " ".join(documents[evidence["docid"]].flattened()),
+                "sentence": evidence["text"],
+                "query": annotation["query"],
+                "label": annotation["classification"],
+            }
+        )
+    return texts
+
+
+def _write_boolq(texts: List[Dict[str, str]], file_path: str) -> None:
+    with open(file_path, "w") as wf:
+        for i, text in enumerate(texts):
+            record = {
+                "title": f"title {i % 50}",
+                "passage": text["document"],
+                "question": text["query"],
+                "answer": text["label"] == "POS",
+            }
+            wf.write(json.dumps(record) + "\n")
+
+
+def _write_esnli(texts: List[Dict[str, str]], file_path: str) -> None:
+    labels = {"POS": "entailment", "NEG": "contradiction"}
+    with open(file_path, "w") as wf:
+        for i, text in enumerate(texts):
+            record = {
+                "pairID": f"pair{i}",
+                "gold_label": labels[text["label"]],
+                "Sentence1": text["sentence"],
+                "Sentence2": text["query"],
+                "Sentence1_marked_1": text["sentence"],
+                "Sentence2_marked_1": text["query"],
+            }
+            wf.write(json.dumps(record) + "\n")
+
+
+def _write_movies(texts: List[Dict[str, str]], file_path: str) -> None:
+    # the reader's train phase covers the reviews numbered 0 to 799
+    directories = {"POS": "noRats_pos", "NEG": "noRats_neg"}
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i, text in enumerate(texts[:800]):
+            name = f"review_polarity/{directories[text['label']]}/cv{i:03d}_{i}.txt"
+            zf.writestr(name, text["document"] + "\n")
+
+
+def _write_multirc(texts: List[Dict[str, str]], file_path: str) -> None:
+    data = []
+    for i, text in enumerate(texts):
+        question = {
+            "question": text["query"],
+            "idx": str(i),
+            "multisent": False,
+            "sentences_used": [0],
+            "answers": [
+                {"text": text["sentence"], "isAnswer": True, "scores": []},
+                {"text": text["query"], "isAnswer": False, "scores": []},
+            ],
+        }
+        data.append(
+            {
+                "id": f"paragraph{i}",
+                "paragraph": {"text": text["document"], "questions": [question]},
+            }
+        )
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("splitv2/train_456-fixedIds.json", json.dumps({"data": data}))
+
+
+def write_corpus(output_dir: str, **dataset_kwargs) -> Corpus:
+    """Writes a synthetic ERASER dataset (see `write_synthetic_dataset`) and the inputs
+    of the BoolQ, e-SNLI, Movies and MultiRC readers built from its texts.
+    """
+    eraser = write_synthetic_dataset(
+        os.path.join(output_dir, "eraser"), **dataset_kwargs
+    )
+    texts = _texts(eraser)
+    corpus = Corpus(
+        eraser=eraser,
+        boolq_path=os.path.join(output_dir, "boolq.jsonl"),
+        esnli_path=os.path.join(output_dir, "esnli.jsonl"),
+        movies_path=os.path.join(output_dir, "movies.zip"),
+        multirc_path=os.path.join(output_dir, "multirc.zip"),
+    )
+    _write_boolq(texts, corpus.boolq_path)
+    _write_esnli(texts, corpus.esnli_path)
+    _write_movies(texts, corpus.movies_path)
+    _write_multirc(texts, corpus.multirc_path)
+    return corpus
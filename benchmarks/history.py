@@ -0,0 +1,125 @@
+"""
+The benchmark history: one JSON record per run, appended to a JSONL file.
+
+    {"timestamp": ..., "commit": ..., "python": ..., "platform": ...,
+     "config": {...}, "results": {"reader.boolq": {"min": ..., "median": ...,
+                                                   "mean": ..., "repeats": ...}},
+     "memory": {"reader.boolq": {"tokenize": {"tracemalloc_peak_bytes": ...,
+                                              ...}}}}
+
+"memory" is only present for runs with memory accounting. Runs are only compared
+with runs of the same `config` on the same Python version and platform.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_record(
+    config: Dict[str, Any],
+    results: Dict[str, Dict[str, Any]],
+    memory: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+) -> dict:
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    if memory is not None:
+        record["memory"] = memory
+    return record
+
+
+def load_history(history_path: str) -> List[dict]:
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path, "r") as rf:
+        return [json.loads(line) for line in rf if line.strip()]
+
+
+def append_record(history_path: str, record: dict) -> None:
+    directory = os.path.dirname(history_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(history_path, "a") as wf:
+        wf.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+class Comparison(NamedTuple):
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+    def is_regression(self, tolerance: float) -> bool:
+        return self.ratio > 1 + tolerance
+
+
+def compare_records(
+    baseline: dict, current: dict, statistic: str = "median"
+) -> List[Comparison]:
+    """The benchmarks present in both records, with their `statistic` in each."""
+    return [
+        Comparison(name, baseline["results"][name][statistic], timing[statistic])
+        for name, timing in current["results"].items()
+        if name in baseline["results"]
+    ]
+
+
+def compare_memory(
+    baseline: dict, current: dict, statistic: str = "tracemalloc_peak_bytes"
+) -> List[Comparison]:
+    """The benchmark stages with memory accounting in both records, with their
+    `statistic` in each, named "<benchmark>/<stage>". Stages whose `statistic` was
+    not measured in either record (null, e.g. tracemalloc peaks before Python 3.9)
+    are left out.
+    """
+    baseline_memory = baseline.get("memory", {})
+    return [
+        Comparison(
+            f"{name}/{stage}",
+            baseline_memory[name][stage][statistic],
+            stats[statistic],
+        )
+        for name, stages in current.get("memory", {}).items()
+        for stage, stats in stages.items()
+        if stage in baseline_memory.get(name, {})
+        and stats[statistic] is not None
+        and baseline_memory[name][stage][statistic] is not None
+    ]
+
+
+# the fields of a record that must match for its timings to be comparable
+BASELINE_KEYS = ("config", "python", "platform")
+
+
+def find_baseline(history: List[dict], current: dict) -> Optional[dict]:
+    """The latest record before `current` with the same `BASELINE_KEYS`."""
+    index = history.index(current) if current in history else len(history)
+    for record in reversed(history[:index]):
+        if all(record.get(key) == current.get(key) for key in BASELINE_KEYS):
+            return record
+    return None
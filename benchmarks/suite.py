@@ -0,0 +1,333 @@
+"""
+The benchmarks. Each one is registered with `@benchmark(name)` as a function taking
+the `Workload` and returning the callable to time; the setup done by the function
+itself is not timed.
+
+`profile_memory` runs them once more with the memory accounting of
+`allennlp_eraser.common.profiling` on: the stages of the readers, and those of the
+metrics, which run under `Workload.profiler`.
+"""
+
+import gc
+import pathlib
+import statistics
+import time
+import tracemalloc
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from allennlp.data.tokenizers import WhitespaceTokenizer
+
+from allennlp_eraser.common.profiling import NULL_PROFILER, ReaderProfiler
+from allennlp_eraser.common.util import (
+    annotations_from_jsonl,
+    load_documents,
+    load_jsonl,
+)
+from allennlp_eraser.dataset_readers import (
+    BoolqDatasetReader,
+    EraserDatasetReader,
+    ESNLIDatasetReader,
+    MoviesDatasetReader,
+    MultiRCDatasetReader,
+)
+from allennlp_eraser.dataset_readers.eraser import read_eraser_data
+from allennlp_eraser.training.metrics.partial_match_score import partial_match_score
+from allennlp_eraser.training.metrics.position_scored_document import (
+    PositionScoredDocument,
+)
+from allennlp_eraser.training.metrics.rationale import Rationale
+from allennlp_eraser.training.metrics.score_classifications import (
+    score_classifications,
+)
+from allennlp_eraser.training.metrics.score_soft_tokens import score_soft_tokens
+from allennlp_eraser.training.metrics.verify_instances import verify_instances
+from benchmarks.corpora import Corpus
+
+Benchmark = Callable[["Workload"], Callable[[], Any]]
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    def register(function: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+MEMORY_STATS = (
+    "tracemalloc_peak_bytes",
+    "rss_delta_bytes",
+    "peak_rss_bytes",
+    "objects",
+)
+
+
+class Workload:
+    """A corpus and its annotations, documents and predictions, loaded lazily once.
+    With `memory`, the readers built by `reader` and `profiler` account for the
+    memory use of their stages.
+    """
+
+    def __init__(self, corpus: Corpus, memory: bool = False) -> None:
+        self.corpus = corpus
+        self.memory = memory
+        self.profiler = (
+            ReaderProfiler("metrics", memory=True) if memory else NULL_PROFILER
+        )
+        self.profilers = [self.profiler]
+        self._cache: Dict[str, Any] = {}
+
+    def reader(self, reader_class: type, **kwargs) -> Any:
+        reader = reader_class(profile_memory=self.memory, **kwargs)
+        self.profilers.append(reader.profiler)
+        return reader
+
+    def _get(self, key: str, load: Callable[[], Any]) -> Any:
+        if key not in self._cache:
+            self._cache[key] = load()
+        return self._cache[key]
+
+    @property
+    def annotations(self):
+        return self._get(
+            "annotations",
+            lambda: annotations_from_jsonl(self.corpus.eraser.annotations_path),
+        )
+
+    @property
+    def predictions(self) -> List[dict]:
+        return self._get(
+            "predictions", lambda: load_jsonl(self.corpus.eraser.predictions_path)
+        )
+
+    @property
+    def token_docs(self):
+        return self._get(
+            "token_docs",
+            lambda: {
+                docid: document.tokens()
+                for docid, document in load_documents(
+                    self.corpus.eraser.data_dir
+                ).items()
+            },
+        )
+
+
+def _read(reader: Any, file_path: str) -> Callable[[], int]:
+    return lambda: sum(1 for _ in reader._read(file_path))
+
+
+@benchmark("read_eraser_data")
+def _read_eraser_data(workload: Workload) -> Callable[[], Any]:
+    annotations_path = workload.corpus.eraser.annotations_path
+    return lambda: list(read_eraser_data(annotations_path, profiler=workload.profiler))
+
+
+@benchmark("reader.eraser")
+def _eraser_reader(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(EraserDatasetReader)
+    return _read(reader, workload.corpus.eraser.annotations_path)
+
+
+@benchmark("reader.boolq")
+def _boolq_reader(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(BoolqDatasetReader, tokenizer=WhitespaceTokenizer())
+    return _read(reader, workload.corpus.boolq_path)
+
+
+@benchmark("reader.boolq.batched")
+def _boolq_reader_batched(workload: Workload) -> Callable[[], Any]:
+    # the same read as "reader.boolq", with the lines tokenized in batches
+    reader = workload.reader(
+        BoolqDatasetReader,
+        tokenizer=WhitespaceTokenizer(),
+        tokenization_batch_size=64,
+    )
+    return _read(reader, workload.corpus.boolq_path)
+
+
+# the BoolQ test fixture, read this many times per call as it only has a few lines
+BOOLQ_FIXTURE_PATH = str(
+    pathlib.Path(__file__).parent.parent
+    / "test_fixtures"
+    / "dataset_readers"
+    / "boolq.jsonl"
+)
+BOOLQ_FIXTURE_READS = 100
+
+
+def _read_fixture(reader: Any) -> Callable[[], int]:
+    read = _read(reader, BOOLQ_FIXTURE_PATH)
+    return lambda: sum(read() for _ in range(BOOLQ_FIXTURE_READS))
+
+
+@benchmark("reader.boolq.fixture")
+def _boolq_reader_fixture(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(BoolqDatasetReader, tokenizer=WhitespaceTokenizer())
+    return _read_fixture(reader)
+
+
+@benchmark("reader.boolq.fixture.batched")
+def _boolq_reader_fixture_batched(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(
+        BoolqDatasetReader,
+        tokenizer=WhitespaceTokenizer(),
+        tokenization_batch_size=64,
+    )
+    return _read_fixture(reader)
+
+
+@benchmark("reader.esnli")
+def _esnli_reader(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(ESNLIDatasetReader, tokenizer=WhitespaceTokenizer())
+    return _read(reader, workload.corpus.esnli_path)
+
+
+@benchmark("reader.movies")
+def _movies_reader(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(
+        MoviesDatasetReader,
+        dataset_url=workload.corpus.movies_path,
+        tokenizer=WhitespaceTokenizer(),
+    )
+    return _read(reader, "train")
+
+
+@benchmark("reader.multirc")
+def _multirc_reader(workload: Workload) -> Callable[[], Any]:
+    reader = workload.reader(
+        MultiRCDatasetReader,
+        dataset_url=workload.corpus.multirc_path,
+        tokenizer=WhitespaceTokenizer(),
+    )
+    return _read(reader, "train")
+
+
+@benchmark("metrics.verify_instances")
+def _verify_instances(workload: Workload) -> Callable[[], Any]:
+    predictions, docs = workload.predictions, workload.token_docs
+
+    def verify() -> Any:
+        with workload.profiler.stage("verify_instances", items=len(predictions)):
+            return verify_instances(predictions, docs)
+
+    return verify
+
+
+@benchmark("metrics.partial_match_score")
+def _partial_match_score(workload: Workload) -> Callable[[], Any]:
+    truth = [r for a in workload.annotations for r in Rationale.from_annotation(a)]
+    pred = [r for p in workload.predictions for r in Rationale.from_instance(p)]
+    thresholds = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+
+    def score() -> Any:
+        with workload.profiler.stage("partial_match_score", items=len(pred)):
+            return partial_match_score(truth, pred, thresholds)
+
+    return score
+
+
+@benchmark("metrics.score_soft_tokens")
+def _score_soft_tokens(workload: Workload) -> Callable[[], Any]:
+    predictions, annotations = workload.predictions, workload.annotations
+    docs = workload.token_docs
+
+    def score() -> Any:
+        paired_scores = PositionScoredDocument.from_results(
+            predictions, annotations, docs, use_tokens=True, profiler=workload.profiler
+        )
+        with workload.profiler.stage("score_soft_tokens", items=len(paired_scores)):
+            return score_soft_tokens(paired_scores)
+
+    return score
+
+
+@benchmark("metrics.score_classifications")
+def _score_classifications(workload: Workload) -> Callable[[], Any]:
+    predictions, annotations = workload.predictions, workload.annotations
+    docs = workload.token_docs
+    thresholds = list(workload.corpus.eraser.thresholds)
+
+    def score() -> Any:
+        with workload.profiler.stage("score_classifications", items=len(predictions)):
+            return score_classifications(predictions, annotations, docs, thresholds)
+
+    return score
+
+
+class Timing(NamedTuple):
+    min: float
+    median: float
+    mean: float
+    repeats: int
+
+
+def time_benchmark(function: Callable[[], Any], repeats: int) -> Timing:
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return Timing(min(times), statistics.median(times), statistics.mean(times), repeats)
+
+
+def run_benchmarks(
+    corpus: Corpus, repeats: int = 3, names: Optional[Sequence[str]] = None
+) -> Dict[str, Timing]:
+    """Times the benchmarks `names` (all by default) on `corpus`, each `repeats`
+    times after one untimed warm-up call.
+    """
+    workload = Workload(corpus)
+    results = {}
+    for name, setup in _selected(names):
+        function = setup(workload)
+        function()
+        results[name] = time_benchmark(function, repeats)
+    return results
+
+
+def _selected(names: Optional[Sequence[str]]) -> Iterator[Tuple[str, Benchmark]]:
+    for name, setup in BENCHMARKS.items():
+        if names is None or name in names:
+            yield name, setup
+
+
+def profile_memory(
+    corpus: Corpus, names: Optional[Sequence[str]] = None
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Runs the benchmarks `names` (all by default) once each with memory accounting,
+    and returns the `MEMORY_STATS` of their stages, by benchmark and stage.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        reports = {}
+        for name, setup in _selected(names):
+            # a fresh workload, so that the objects counted are those of this benchmark
+            workload = Workload(corpus, memory=True)
+            function = setup(workload)
+            gc.collect()
+            function()
+            reports[name] = {
+                stage: {key: stats[key] for key in MEMORY_STATS}
+                for profiler in workload.profilers
+                for stage, stats in profiler.report().items()
+            }
+        return reports
+    finally:
+        if not tracing:
+            tracemalloc.stop()
@@ -0,0 +1,81 @@
+import pathlib
+
+from benchmarks.__main__ import main
+from benchmarks.history import (
+    append_record,
+    compare_memory,
+    find_baseline,
+    load_history,
+    make_record,
+)
+
+
+def _results(seconds: float):
+    return {"reader.boolq": {"min": seconds, "median": seconds, "mean": seconds}}
+
+
+class TestHistory:
+    def test_compare_flags_regressions(self, tmp_path: pathlib.Path):
+        history_path = str(tmp_path / "history.jsonl")
+        append_record(history_path, make_record({"documents": 10}, _results(1.0)))
+        append_record(history_path, make_record({"documents": 99}, _results(0.1)))
+        append_record(history_path, make_record({"documents": 10}, _results(1.05)))
+        args = ["compare", "--history", history_path]
+        assert main(args + ["--tolerance", "0.1"]) == 0
+
+        append_record(history_path, make_record({"documents": 10}, _results(1.5)))
+        assert main(args + ["--tolerance", "0.1"]) == 1
+        assert main(args + ["--tolerance", "0.5"]) == 0
+
+    def test_compare_flags_memory_regressions(self, tmp_path: pathlib.Path):
+        history_path = str(tmp_path / "history.jsonl")
+
+        def record(peak: int) -> dict:
+            memory = {"reader.boolq": {"tokenize": {"tracemalloc_peak_bytes": peak}}}
+            return make_record({"documents": 10}, _results(1.0), memory)
+
+        append_record(history_path, record(10 << 20))
+        # larger than the tolerance, but too small to matter
+        append_record(history_path, record((10 << 20) + (1 << 19)))
+        assert main(["compare", "--history", history_path, "--tolerance", "0"]) == 0
+        append_record(history_path, record(20 << 20))
+        assert main(["compare", "--history", history_path]) == 1
+
+    def test_unmeasured_memory_is_not_compared(self, tmp_path: pathlib.Path, capsys):
+        history_path = str(tmp_path / "history.jsonl")
+
+        def record(peak) -> dict:
+            memory = {"reader.boolq": {"tokenize": {"tracemalloc_peak_bytes": peak}}}
+            return make_record({"documents": 10}, _results(1.0), memory)
+
+        append_record(history_path, record(None))
+        append_record(history_path, record(20 << 20))
+        assert compare_memory(*load_history(history_path)) == []
+        assert main(["compare", "--history", history_path]) == 0
+        assert "not compared: reader.boolq/tokenize" in capsys.readouterr().out
+
+    def test_baseline_has_the_same_config(self, tmp_path: pathlib.Path):
+        history_path = str(tmp_path / "history.jsonl")
+        append_record(history_path, make_record({"documents": 10}, _results(1.0)))
+        append_record(history_path, make_record({"documents": 99}, _results(0.1)))
+        history = load_history(history_path)
+        assert find_baseline(history, history[-1]) is None
+        assert main(["compare", "--history", history_path]) == 0
+
+    def test_baseline_has_the_same_python_and_platform(self):
+        baseline = make_record({"documents": 10}, _results(1.0))
+        history = [
+            baseline,
+            dict(make_record({"documents": 10}, _results(0.1)), python="2.7.18"),
+            dict(make_record({"documents": 10}, _results(0.1)), platform="other"),
+            make_record({"documents": 10}, _results(1.0)),
+        ]
+        assert find_baseline(history, history[-1]) is baseline
+
+    def test_run(self, tmp_path: pathlib.Path):
+        history_path = str(tmp_path / "history.jsonl")
+        args = ["run", "--documents", "5", "--repeats", "1", "--history", history_path]
+        assert main(args + ["--only", "read_eraser_data", "reader.eraser"]) == 0
+        (record,) = load_history(history_path)
+        assert set(record["results"]) == {"read_eraser_data", "reader.eraser"}
+        assert record["config"]["documents"] == 5
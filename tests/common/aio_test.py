@@ -0,0 +1,107 @@
+import asyncio
+import json
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from allennlp_eraser.common import aio
+from allennlp_eraser.common.aio import (
+    aannotations_from_jsonl,
+    aiterate,
+    aload_documents,
+    aload_jsonl,
+    aread,
+)
+from allennlp_eraser.common.util import (
+    annotations_from_jsonl,
+    load_documents,
+    load_jsonl,
+)
+from allennlp_eraser.dataset_readers import EraserDatasetReader
+
+
+async def _collect(aiterator):
+    return [item async for item in aiterator]
+
+
+class TestAio:
+    @pytest.fixture
+    def data_dir(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        (tmp_path / "docs").mkdir()
+        with open(tmp_path / "train.jsonl", "w") as wf:
+            for i in range(5):
+                (tmp_path / "docs" / f"doc{i}").write_text(f"document {i} .\n")
+                evidence = {
+                    "docid": f"doc{i}",
+                    "start_token": 0,
+                    "end_token": 1,
+                    "start_sentence": 0,
+                    "end_sentence": 1,
+                    "text": "document",
+                }
+                annotation = {
+                    "annotation_id": f"ann{i}",
+                    "evidences": [[evidence]],
+                    "classification": "POS",
+                    "query": "q",
+                }
+                wf.write(json.dumps(annotation) + "\n")
+        return tmp_path
+
+    def test_loaders_match_blocking(self, data_dir: pathlib.Path):
+        file_path = str(data_dir / "train.jsonl")
+
+        async def load_all():
+            # several loads interleaved on one loop
+            return await asyncio.gather(
+                _collect(aload_jsonl(file_path, chunk_size=2)),
+                _collect(aannotations_from_jsonl(file_path, chunk_size=2)),
+                _collect(aload_documents(str(data_dir), chunk_size=2)),
+            )
+
+        records, annotations, documents = asyncio.run(load_all())
+        assert records == load_jsonl(file_path)
+        assert annotations == annotations_from_jsonl(file_path)
+        assert documents == list(load_documents(str(data_dir)).items())
+
+    def test_documents_format_is_found_off_the_loop(self, data_dir, monkeypatch):
+        threads = []
+        find_docs_archive = aio.find_docs_archive
+
+        def find(path):
+            threads.append(threading.current_thread())
+            return find_docs_archive(path)
+
+        monkeypatch.setattr(aio, "find_docs_archive", find)
+        documents = asyncio.run(_collect(aload_documents(str(data_dir))))
+        assert len(documents) == 5
+        assert threads and threading.main_thread() not in threads
+
+    def test_read(self, data_dir: pathlib.Path):
+        reader = EraserDatasetReader()
+        file_path = str(data_dir / "train.jsonl")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            instances = asyncio.run(_collect(aread(reader, file_path, executor)))
+        assert [i["metadata"]["annotation_id"] for i in instances] == [
+            f"ann{i}" for i in range(5)
+        ]
+
+    def test_early_stop_closes_the_iterator(self):
+        closed = []
+
+        def numbers():
+            try:
+                yield from range(100)
+            finally:
+                closed.append(True)
+
+        async def first():
+            aiterator = aiterate(numbers, chunk_size=4)
+            async for item in aiterator:
+                await aiterator.aclose()
+                return item
+
+        assert asyncio.run(first()) == 0
+        assert closed == [True]
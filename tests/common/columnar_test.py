@@ -0,0 +1,89 @@
+import json
+import pathlib
+
+import pytest
+
+from allennlp_eraser.common.columnar import ColumnarFile, is_columnar, jsonl_to_columnar
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def jsonl_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    jsonl_path = tmp_path / "train.jsonl"
+    with open(jsonl_path, "w") as wf:
+        for i in range(10):
+            record = {"id": i, "text": f"text {i}", "label": ("a", "b")[i % 2]}
+            wf.write(json.dumps(record) + "\n")
+    return jsonl_path
+
+
+class TestColumnarFile:
+    @pytest.mark.parametrize("suffix", (".parquet", ".arrow"))
+    def test_iter_records(self, jsonl_path: pathlib.Path, suffix: str):
+        output_path = str(jsonl_path.with_suffix(suffix))
+        assert is_columnar(output_path) and not is_columnar(str(jsonl_path))
+        jsonl_to_columnar(str(jsonl_path), output_path, row_group_size=4)
+
+        columnar_file = ColumnarFile(output_path)
+        assert columnar_file.column_names == ["id", "text", "label"]
+        assert columnar_file.num_row_groups == 3
+        assert columnar_file.num_rows == 10
+
+        with open(jsonl_path) as rf:
+            expected = [json.loads(line) for line in rf]
+        assert list(columnar_file.iter_records()) == expected
+
+        records = list(
+            columnar_file.iter_records(
+                columns=["label", "id"], dictionary_columns=("label",)
+            )
+        )
+        assert records == [{"label": r["label"], "id": r["id"]} for r in expected]
+
+    def test_row_group_sharding(self, jsonl_path: pathlib.Path):
+        output_path = str(jsonl_path.with_suffix(".parquet"))
+        jsonl_to_columnar(str(jsonl_path), output_path, row_group_size=3)
+
+        columnar_file = ColumnarFile(output_path)
+        shards = [
+            [
+                record["id"]
+                for record in columnar_file.iter_records(
+                    columns=["id"], row_groups=columnar_file.shard_row_groups(index, 2)
+                )
+            ]
+            for index in range(2)
+        ]
+        # contiguous blocks of row groups, like the shards of a JSONL file
+        assert shards == [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]]
+
+    @pytest.mark.parametrize("suffix", (".parquet", ".arrow"))
+    def test_column_null_in_a_row_group(self, tmp_path: pathlib.Path, suffix: str):
+        jsonl_path = tmp_path / "train.jsonl"
+        with open(jsonl_path, "w") as wf:
+            for i in range(4):
+                record = {"id": i, "explanation": None if i < 2 else f"because {i}"}
+                wf.write(json.dumps(record) + "\n")
+            wf.write("\n")
+        output_path = str(jsonl_path.with_suffix(suffix))
+        jsonl_to_columnar(str(jsonl_path), output_path, row_group_size=2)
+
+        columnar_file = ColumnarFile(output_path)
+        assert columnar_file.num_row_groups == 2
+        assert [r["explanation"] for r in columnar_file.iter_records()] == [
+            None,
+            None,
+            "because 2",
+            "because 3",
+        ]
+
+    def test_explicit_schema(self, jsonl_path: pathlib.Path):
+        pa = pytest.importorskip("pyarrow")
+        output_path = str(jsonl_path.with_suffix(".arrow"))
+        schema = pa.schema([("id", pa.int32()), ("label", pa.string())])
+        jsonl_to_columnar(str(jsonl_path), output_path, schema=schema)
+
+        columnar_file = ColumnarFile(output_path)
+        assert columnar_file.schema == schema
+        assert next(columnar_file.iter_records()) == {"id": 0, "label": "a"}
@@ -0,0 +1,89 @@
+import bz2
+import gzip
+import json
+import pathlib
+
+import pytest
+
+from allennlp_eraser.common import compression
+from allennlp_eraser.common.compression import (
+    compress_zstd_frames,
+    find_compressed,
+    find_zstd_frames,
+    open_text,
+)
+from allennlp_eraser.common.line_index import iter_jsonl_lines
+from allennlp_eraser.common.util import load_documents, load_jsonl
+
+
+@pytest.fixture
+def jsonl_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    jsonl_path = tmp_path / "train.jsonl"
+    with open(jsonl_path, "w") as wf:
+        for i in range(1000):
+            wf.write(json.dumps({"id": i, "text": f"sentence {i} ." * (i % 7)}) + "\n")
+    return jsonl_path
+
+
+class TestCompression:
+    @pytest.mark.parametrize("suffix", (".gz", ".bz2"))
+    def test_stdlib_formats(self, jsonl_path: pathlib.Path, suffix: str):
+        compressed_path = str(jsonl_path) + suffix
+        compress = gzip.compress if suffix == ".gz" else bz2.compress
+        with open(compressed_path, "wb") as wf:
+            wf.write(compress(jsonl_path.read_bytes()))
+
+        assert load_jsonl(compressed_path) == load_jsonl(str(jsonl_path))
+
+    @pytest.mark.parametrize("frame_size", (1 << 12, 1 << 20))
+    def test_zstd_frames(self, jsonl_path: pathlib.Path, frame_size: int):
+        pytest.importorskip("zstandard")
+        compressed_path = str(jsonl_path) + ".zst"
+        compress_zstd_frames(str(jsonl_path), compressed_path, frame_size=frame_size)
+
+        with open(compressed_path, "rb") as rf:
+            frames = find_zstd_frames(rf)
+        assert len(frames) == -(-jsonl_path.stat().st_size // frame_size)
+        assert sum(length for _, length in frames) == len(
+            pathlib.Path(compressed_path).read_bytes()
+        )
+
+        with open_text(compressed_path, num_workers=3) as rf:
+            assert rf.read() == jsonl_path.read_text()
+        assert load_jsonl(compressed_path) == load_jsonl(str(jsonl_path))
+
+    def test_shards(self, jsonl_path: pathlib.Path):
+        compressed_path = str(jsonl_path) + ".gz"
+        with open(compressed_path, "wb") as wf:
+            wf.write(gzip.compress(jsonl_path.read_bytes()))
+
+        shards = [list(iter_jsonl_lines(compressed_path, (i, 3))) for i in range(3)]
+        assert sorted(json.loads(line)["id"] for s in shards for line in s) == list(
+            range(1000)
+        )
+
+    def test_compressed_docs_jsonl(self, tmp_path: pathlib.Path):
+        with gzip.open(tmp_path / "docs.jsonl.gz", "wt") as wf:
+            for i in range(3):
+                wf.write(json.dumps({"docid": f"d{i}", "document": f"a {i} .\nb ."}))
+                wf.write("\n")
+
+        assert find_compressed(str(tmp_path / "docs.jsonl")).endswith(".gz")
+        docs = load_documents(str(tmp_path), docids={"d1"})
+        assert docs == {"d1": [["a 1 ."], ["b ."]]}
+
+    def test_zstd_frames_are_scanned_once(self, jsonl_path: pathlib.Path, monkeypatch):
+        pytest.importorskip("zstandard")
+        compressed_path = str(jsonl_path) + ".zst"
+        compress_zstd_frames(str(jsonl_path), compressed_path, frame_size=1 << 8)
+
+        scans = []
+        find_frames = compression.find_zstd_frames
+        monkeypatch.setattr(
+            compression,
+            "find_zstd_frames",
+            lambda fp: scans.append(fp) or find_frames(fp),
+        )
+        with open_text(compressed_path, num_workers=2) as rf:
+            assert rf.read() == jsonl_path.read_text()
+        assert len(scans) == 1
@@ -0,0 +1,91 @@
+import json
+import os
+import pathlib
+import shutil
+
+import pytest
+
+from allennlp_eraser.common import docs_archive
+from allennlp_eraser.common.docs_archive import (
+    DOCS_ARCHIVE_NAME,
+    DocsArchive,
+    find_docs_archive,
+    main,
+    pack_documents,
+)
+from allennlp_eraser.common.util import load_documents
+
+
+class TestDocsArchive:
+    @pytest.fixture
+    def docs_dir(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        (tmp_path / "docs").mkdir()
+        for i in range(5):
+            (tmp_path / "docs" / f"doc{i}").write_text(f" first {i} .\n\nsecond .\n")
+        return tmp_path
+
+    @pytest.fixture
+    def docs_jsonl(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        with (tmp_path / "docs.jsonl").open("w") as wf:
+            for i in range(5):
+                document = {"docid": f"doc{i}", "document": f"first {i} .\nsecond ."}
+                wf.write(json.dumps(document) + "\n")
+        return tmp_path
+
+    @pytest.mark.parametrize("compress", (True, False))
+    @pytest.mark.parametrize("layout", ("docs_dir", "docs_jsonl"))
+    def test_pack_documents(self, request, layout: str, compress: bool):
+        data_dir = request.getfixturevalue(layout)
+        expected = load_documents(str(data_dir))
+
+        archive_path = pack_documents(str(data_dir), compress=compress)
+        assert archive_path == str(data_dir / DOCS_ARCHIVE_NAME)
+        assert load_documents(str(data_dir)) == expected
+        assert load_documents(str(data_dir), docids={"doc3"}) == {
+            "doc3": expected["doc3"]
+        }
+
+    def test_random_access(self, docs_dir: pathlib.Path):
+        main([str(docs_dir), "--compress"])
+        with DocsArchive(str(docs_dir / DOCS_ARCHIVE_NAME)) as archive:
+            assert len(archive) == 5
+            assert "doc2" in archive
+            assert archive.read("doc2") == "first 2 .\nsecond ."
+
+    @pytest.mark.parametrize("layout", ("docs_dir", "docs_jsonl"))
+    def test_stale_archive_is_ignored(self, request, layout: str):
+        data_dir = request.getfixturevalue(layout)
+        pack_documents(str(data_dir))
+        with find_docs_archive(str(data_dir)) as archive:
+            assert len(archive) == 5
+
+        if layout == "docs_dir":
+            (data_dir / "docs" / "doc5").write_text("added .\n")
+            # the directory's mtime may only have a one second resolution
+            os.utime(data_dir / "docs", ns=(0, 0))
+        else:
+            with (data_dir / "docs.jsonl").open("a") as wf:
+                wf.write(json.dumps({"docid": "doc5", "document": "added ."}) + "\n")
+        assert find_docs_archive(str(data_dir)) is None
+        assert "doc5" in load_documents(str(data_dir))
+
+    def test_archive_of_another_version_is_ignored(self, docs_dir: pathlib.Path):
+        (docs_dir / DOCS_ARCHIVE_NAME).write_bytes(b"ERDOCS01" + bytes(24))
+        assert find_docs_archive(str(docs_dir)) is None
+        assert len(load_documents(str(docs_dir))) == 5
+
+    def test_failed_pack_leaves_no_file(self, docs_dir: pathlib.Path, monkeypatch):
+        def fail(data_dir):
+            yield "doc0", "first 0 ."
+            raise OSError("read failed")
+
+        monkeypatch.setattr(docs_archive, "_iter_source_documents", fail)
+        with pytest.raises(OSError):
+            pack_documents(str(docs_dir))
+        assert sorted(p.name for p in docs_dir.iterdir()) == ["docs"]
+
+    def test_archive_without_source(self, docs_dir: pathlib.Path):
+        expected = load_documents(str(docs_dir))
+        pack_documents(str(docs_dir))
+        shutil.rmtree(docs_dir / "docs")
+        assert load_documents(str(docs_dir)) == expected
@@ -0,0 +1,98 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from allennlp_eraser.common.document import DocumentView, SentenceOffsetIndex
+from allennlp_eraser.common.util import Annotation, Evidence
+from allennlp_eraser.training.metrics.position_scored_document import (
+    PositionScoredDocument,
+)
+
+
+class TestDocumentView:
+    def test_sentences(self):
+        text = "a b c .\nd e .\n\nf ."
+        document = DocumentView(text)
+        assert len(document) == 4
+        assert document == [[line] for line in text.split("\n")]
+        assert document[1] == ["d e ."]
+        assert document[-1] == ["f ."]
+        assert document[1:3] == [["d e ."], [""]]
+        with pytest.raises(IndexError):
+            document[4]
+
+    def test_strip(self):
+        document = DocumentView("  a b c .\n\n d e . \n", strip=True)
+        assert document == [["a b c ."], ["d e ."]]
+        assert document.sentence_span(1) == (12, 17)
+        assert DocumentView("\n \n", strip=True) == []
+
+    def test_flattened(self):
+        document = DocumentView(" a b c .\n\nd e .", strip=True)
+        assert document.flattened() == ["a b c .", "d e ."]
+        assert list(document.flattened()) == ["a b c .", "d e ."]
+        assert document.flattened()[-1] == "d e ."
+
+    def test_tokens(self):
+        document = DocumentView("a  bb c .\n\nd e .", strip=True)
+        tokens = document.tokens()
+        assert len(tokens) == 7
+        assert tokens == ["a", "bb", "c", ".", "d", "e", "."]
+        assert tokens[1] == "bb"
+        assert tokens[3:5] == [".", "d"]
+
+    def test_pickle(self):
+        document = DocumentView("a b\nc d", strip=True)
+        assert pickle.loads(pickle.dumps(document)) == document
+
+
+class TestSentenceOffsetIndex:
+    @pytest.fixture
+    def index(self) -> SentenceOffsetIndex:
+        docs = {
+            "view": DocumentView("a b c .\n\nd e .\nf", strip=False),
+            "tokenized": [["a", "b"], [], ["c", "d", "e"]],
+        }
+        return SentenceOffsetIndex(docs)
+
+    def test_offsets(self, index: SentenceOffsetIndex):
+        assert index.offsets("view").tolist() == [0, 4, 4, 7, 8]
+        assert index.offsets("tokenized").tolist() == [0, 2, 2, 5]
+        assert index.num_tokens("view") == 8
+        assert index.offsets("view") is index.offsets("view")
+
+    def test_conversions(self, index: SentenceOffsetIndex):
+        assert index.token_to_sentence("view").tolist() == [0, 0, 0, 0, 2, 2, 2, 3]
+        assert index.sentence_span_to_tokens("view", 1, 3) == (4, 7)
+        assert index.token_span_to_sentences("view", 3, 6) == (0, 3)
+        assert index.token_span_to_sentences("tokenized", 2, 5) == (2, 3)
+
+    def test_sentence_scores(self, index: SentenceOffsetIndex):
+        scores = index.sentence_scores("tokenized", [0.1, 0.3, 0.5, 0.2, 0.4])
+        assert scores.tolist() == [0.3, 0.0, 0.5]
+        scores = index.sentence_scores("tokenized", [1, 1, 1, 1, 1], np.add)
+        assert scores.tolist() == [2.0, 0.0, 3.0]
+        with pytest.raises(ValueError):
+            index.sentence_scores("tokenized", [0.1])
+
+    def test_sentence_predictions_from_token_scores(self, index: SentenceOffsetIndex):
+        evidence = Evidence(text="c d", docid="tokenized", start_token=2, end_token=4)
+        annotation = Annotation(
+            annotation_id="a", query="q", evidences=((evidence,),), classification="x"
+        )
+        instance = {
+            "annotation_id": "a",
+            "rationales": [
+                {
+                    "docid": "tokenized",
+                    "soft_rationale_predictions": [0.1, 0.3, 0.5, 0.2, 0.4],
+                }
+            ],
+        }
+        docs = {"tokenized": [["a b"], [""], ["c d e"]]}
+        (paired,) = PositionScoredDocument.from_results(
+            [instance], [annotation], docs, use_tokens=False, sentence_index=index
+        )
+        assert paired.scores == (0.3, 0.0, 0.5)
+        assert paired.truths == (False, False, True)
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import pathlib
+
+import pytest
+
+from allennlp_eraser.common.line_index import (
+    LineIndex,
+    iter_jsonl_lines,
+    sample_jsonl_lines,
+)
+
+
+@pytest.fixture
+def jsonl_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    jsonl_path = tmp_path / "train.jsonl"
+    with open(jsonl_path, "w") as wf:
+        for i in range(7):
+            wf.write(json.dumps({"id": i, "text": "é" * i}) + "\n")
+        wf.write("\n")
+    return jsonl_path
+
+
+class TestLineIndex:
+    def test_random_access(self, jsonl_path: pathlib.Path):
+        index = LineIndex.open(str(jsonl_path))
+        assert len(index) == 7
+        assert index[3] == {"id": 3, "text": "ééé"}
+        assert index[-1]["id"] == 6
+        with pytest.raises(IndexError):
+            index[7]
+
+    def test_stored_index(self, jsonl_path: pathlib.Path):
+        LineIndex.open(str(jsonl_path))
+        assert os.path.exists(LineIndex.index_path(str(jsonl_path)))
+        assert len(LineIndex.load(str(jsonl_path))) == 7
+
+        # appending a record invalidates the stored index
+        with open(jsonl_path, "a") as wf:
+            wf.write(json.dumps({"id": 7, "text": ""}) + "\n")
+        assert LineIndex.load(str(jsonl_path)) is None
+        assert len(LineIndex.open(str(jsonl_path))) == 8
+
+    @pytest.mark.parametrize("count", (1, 2, 3, 10))
+    def test_shards(self, jsonl_path: pathlib.Path, count: int):
+        shards = [
+            [
+                json.loads(line)["id"]
+                for line in iter_jsonl_lines(str(jsonl_path), (i, count))
+            ]
+            for i in range(count)
+        ]
+        # contiguous blocks covering every record once
+        assert [i for shard in shards for i in shard] == list(range(7))
+        assert max(map(len, shards)) - min(map(len, shards)) <= 1
+
+    def test_limit(self, jsonl_path: pathlib.Path, monkeypatch):
+        def ids(lines):
+            return [json.loads(line)["id"] for line in lines]
+
+        # without a stored index, the file is read up to the limit
+        assert ids(iter_jsonl_lines(str(jsonl_path), limit=3)) == [0, 1, 2]
+        assert not os.path.exists(LineIndex.index_path(str(jsonl_path)))
+
+        LineIndex.open(str(jsonl_path))
+        ranges = []
+        iter_lines = LineIndex.iter_lines
+
+        def record_range(self, start=0, stop=None):
+            ranges.append((start, stop))
+            return iter_lines(self, start, stop)
+
+        monkeypatch.setattr(LineIndex, "iter_lines", record_range)
+        assert ids(iter_jsonl_lines(str(jsonl_path), limit=3)) == [0, 1, 2]
+        assert ids(iter_jsonl_lines(str(jsonl_path), (1, 2), limit=2)) == [3, 4]
+        assert ids(iter_jsonl_lines(str(jsonl_path), (1, 2), limit=9)) == [3, 4, 5, 6]
+        assert ranges == [(0, 3), (3, 5), (3, 7)]
+
+    @pytest.mark.parametrize("compressed", (False, True))
+    def test_sample(self, jsonl_path: pathlib.Path, compressed: bool):
+        file_path = str(jsonl_path)
+        if compressed:
+            file_path += ".gz"
+            with open(jsonl_path, "rb") as rf, gzip.open(file_path, "wb") as wf:
+                wf.write(rf.read())
+
+        sample = [
+            json.loads(line)["id"] for line in sample_jsonl_lines(file_path, 3, 0)
+        ]
+        assert len(sample) == len(set(sample)) == 3
+        assert sample == sorted(sample)
+        assert sample_jsonl_lines(file_path, 3, 0) == sample_jsonl_lines(
+            file_path, 3, 0
+        )
+        assert len(sample_jsonl_lines(file_path, 20)) == 7
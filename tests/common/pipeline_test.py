@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from allennlp_eraser.common.pipeline import Pipeline
+
+
+class TestPipeline:
+    def test_stages_run_in_order(self):
+        pipeline = Pipeline(
+            [("double", lambda x: [x, x]), ("square", lambda x: [x * x])],
+            queue_size=2,
+        )
+        assert list(pipeline.run(range(5))) == [0, 0, 1, 1, 4, 4, 9, 9, 16, 16]
+
+        stats = pipeline.stats()
+        assert list(stats) == ["read", "double", "square"]
+        assert stats["read"]["items_out"] == 5
+        assert stats["double"]["items_in"] == 5
+        assert stats["double"]["items_out"] == 10
+        assert stats["square"]["items_out"] == 10
+        for stage in stats.values():
+            assert stage["queue_max_occupancy"] <= stage["queue_capacity"] == 2
+
+    def test_stages_overlap(self):
+        def slow_source():
+            for i in range(4):
+                time.sleep(0.05)
+                yield i
+
+        def slow_stage(x):
+            time.sleep(0.05)
+            yield x
+
+        start = time.perf_counter()
+        assert list(Pipeline([("slow", slow_stage)]).run(slow_source())) == [0, 1, 2, 3]
+        # serially this takes 0.4s
+        assert time.perf_counter() - start < 0.35
+
+    @pytest.mark.parametrize("failing_stage", ("read", "stage"))
+    def test_errors_are_raised(self, failing_stage: str):
+        def source():
+            yield 1
+            if failing_stage == "read":
+                raise KeyError("read")
+            yield 2
+
+        def stage(x):
+            if x == 2:
+                raise KeyError("stage")
+            yield x
+
+        with pytest.raises(KeyError, match=failing_stage):
+            list(Pipeline([("stage", stage)]).run(source()))
+
+    def test_early_stop(self):
+        pipeline = Pipeline([("identity", lambda x: [x])], queue_size=1)
+        results = pipeline.run(iter(range(1000)))
+        assert next(results) == 0
+        results.close()
+        # backpressure kept the source from running ahead
+        assert pipeline.stats()["read"]["items_out"] < 10
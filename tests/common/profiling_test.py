@@ -0,0 +1,126 @@
+import logging
+import pickle
+import threading
+import time
+import tracemalloc
+
+from allennlp_eraser.common.profiling import NULL_PROFILER, ReaderProfiler
+
+
+class TestReaderProfiler:
+    def test_nested_stages_are_exclusive(self):
+        profiler = ReaderProfiler()
+
+        def read():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        for _ in profiler.iterate("tokenize", profiler.iterate("read", read())):
+            with profiler.stage("instance"):
+                time.sleep(0.02)
+
+        report = profiler.report()
+        assert report["read"]["count"] == report["tokenize"]["count"] == 3
+        assert report["instance"]["count"] == 3
+        assert report["read"]["wall_seconds"] >= 0.03
+        # the sleeps of "read" are not counted again in "tokenize"
+        assert report["tokenize"]["wall_seconds"] < 0.01
+        assert report["instance"]["wall_seconds"] >= 0.06
+        assert report["instance"]["items_per_second"] > 0
+
+        profiler.reset()
+        assert profiler.report() == {}
+
+    def test_batch_stage_counts_items(self):
+        profiler = ReaderProfiler()
+        with profiler.stage("tokenize", items=8):
+            pass
+        assert profiler.report()["tokenize"]["count"] == 8
+
+    def test_periodic_logging(self, caplog):
+        profiler = ReaderProfiler("test", log_interval=0.0)
+        with caplog.at_level(logging.INFO):
+            with profiler.stage("read"):
+                pass
+        assert "test read: 1 items" in caplog.text
+
+    def test_pickle(self):
+        profiler = ReaderProfiler("test")
+        with profiler.stage("read"):
+            pass
+        unpickled = pickle.loads(pickle.dumps(profiler))
+        assert unpickled.name == "test"
+        assert unpickled.report() == {}
+
+    def test_disabled(self):
+        items = [1, 2]
+        assert NULL_PROFILER.iterate("read", items) is items
+        with NULL_PROFILER.stage("read"):
+            pass
+        assert NULL_PROFILER.report() == {}
+
+    def test_memory(self):
+        class Blob:
+            pass
+
+        profiler = ReaderProfiler(memory=True, tracked_types=("Blob",))
+        with profiler.stage("outer"):
+            with profiler.stage("inner"):
+                assert tracemalloc.is_tracing()
+                blobs = [Blob() for _ in range(100)]
+                data = bytearray(1 << 20)
+                del data
+        # tracing is stopped by the stage that started it
+        assert not tracemalloc.is_tracing()
+
+        report = profiler.report()
+        if hasattr(tracemalloc, "reset_peak"):
+            assert report["inner"]["tracemalloc_peak_bytes"] >= 1 << 20
+            # the peak of a stage includes those of its nested stages
+            assert (
+                report["outer"]["tracemalloc_peak_bytes"]
+                >= report["inner"]["tracemalloc_peak_bytes"]
+            )
+        else:
+            assert report["inner"]["tracemalloc_peak_bytes"] is None
+        assert report["inner"]["objects"] == {"Blob": len(blobs)}
+        assert report["outer"]["peak_rss_bytes"] is None or (
+            report["outer"]["peak_rss_bytes"] > 0
+        )
+
+        unpickled = pickle.loads(pickle.dumps(profiler))
+        assert unpickled.memory and unpickled.tracked_types == ("Blob",)
+
+    def test_memory_in_threads(self):
+        profiler = ReaderProfiler(memory=True)
+        entered, release = threading.Event(), threading.Event()
+
+        def other_thread():
+            with profiler.stage("other"):
+                entered.set()
+                release.wait()
+
+        with profiler.stage("alone"):
+            pass
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        entered.wait()
+        with profiler.stage("concurrent"):
+            release.set()
+        thread.join()
+        assert not tracemalloc.is_tracing()
+
+        # the peaks of stages overlapping with other threads are not measured
+        report = profiler.report()
+        assert report["concurrent"]["tracemalloc_peak_bytes"] is None
+        assert report["other"]["tracemalloc_peak_bytes"] is None
+        if hasattr(tracemalloc, "reset_peak"):
+            assert report["alone"]["tracemalloc_peak_bytes"] is not None
+
+    def test_memory_not_reported_by_default(self):
+        profiler = ReaderProfiler()
+        with profiler.stage("read"):
+            pass
+        assert "tracemalloc_peak_bytes" not in profiler.report()["read"]
+        assert not tracemalloc.is_tracing()
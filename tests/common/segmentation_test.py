@@ -0,0 +1,126 @@
+import pytest
+from allennlp.common.checks import ConfigurationError
+from allennlp.data.tokenizers import SpacyTokenizer, WhitespaceTokenizer
+from allennlp.data.tokenizers.sentence_splitter import SpacySentenceSplitter
+
+from allennlp_eraser.common.segmentation import (
+    BatchedSentenceSegmenter,
+    segment_or_tokenize,
+)
+
+
+class TestBatchedSentenceSegmenter:
+    @property
+    def texts(self):
+        return [
+            "Good Samaritan laws offer legal protection. The protection is intended "
+            "to reduce bystanders' hesitation to assist.",
+            "  Powdered sugar is a finely ground sugar.  It usually contains a small "
+            "amount of anti-caking agent. ",
+            "Windows Movie Maker is a discontinued video editing software.",
+        ]
+
+    @pytest.mark.parametrize("batch_size", (1, 2))
+    @pytest.mark.parametrize(
+        "tokenizer_kwargs", ({}, {"start_tokens": ["@start@"], "end_tokens": ["@end@"]})
+    )
+    def test_single_parse(self, batch_size: int, tokenizer_kwargs: dict):
+        tokenizer = SpacyTokenizer(**tokenizer_kwargs)
+        sentence_splitter = SpacySentenceSplitter()
+        segmenter = BatchedSentenceSegmenter(
+            tokenizer, sentence_splitter, batch_size=batch_size
+        )
+        single_parse_segmenter = BatchedSentenceSegmenter(
+            tokenizer, sentence_splitter, batch_size=batch_size, single_parse=True
+        )
+
+        expected = list(segmenter.segment(self.texts, lambda text: text))
+        segmented = list(single_parse_segmenter.segment(self.texts, lambda text: text))
+        assert len(segmented) == len(expected) == len(self.texts)
+        for (text, sentences), (_, expected_sentences) in zip(segmented, expected):
+            assert len(sentences) == len(expected_sentences)
+            for tokens, expected_tokens in zip(sentences, expected_sentences):
+                assert [t.text for t in tokens] == [t.text for t in expected_tokens]
+                # offsets point into the whole text
+                for token in tokens:
+                    if token.idx is None:
+                        continue
+                    assert text[token.idx : token.idx_end] == token.text
+
+    def test_single_parse_does_not_tokenize_again(self, monkeypatch):
+        tokenizer = SpacyTokenizer(start_tokens=["@start@"])
+        segmenter = BatchedSentenceSegmenter(
+            tokenizer, SpacySentenceSplitter(), single_parse=True
+        )
+        expected = BatchedSentenceSegmenter(
+            tokenizer, SpacySentenceSplitter()
+        ).split_and_tokenize(self.texts)
+
+        def tokenize(*args):
+            raise AssertionError("the text was parsed again")
+
+        monkeypatch.setattr(tokenizer, "tokenize", tokenize)
+        monkeypatch.setattr(tokenizer, "batch_tokenize", tokenize)
+        sentences = segmenter.split_and_tokenize(self.texts)[1]
+        assert [[t.text for t in tokens] for tokens in sentences] == [
+            [t.text for t in tokens] for tokens in expected[1]
+        ]
+        assert sentences[0][0].text == "@start@"
+        assert sentences[0][0] is not sentences[1][0]
+        assert sentences[0][1].lemma_ == "powdered"
+
+    @pytest.mark.parametrize("single_parse", (False, True))
+    def test_multi_process_pipes_once(self, monkeypatch, single_parse: bool):
+        tokenizer = SpacyTokenizer()
+        sentence_splitter = SpacySentenceSplitter()
+        expected = BatchedSentenceSegmenter(
+            tokenizer, sentence_splitter, batch_size=2, single_parse=single_parse
+        ).split_and_tokenize(self.texts)
+
+        nlp = sentence_splitter.spacy
+        original_pipe = nlp.pipe
+        calls = []
+
+        def pipe(texts, **kwargs):
+            calls.append(kwargs)
+            # the pipe may read ahead of the docs it has returned
+            return original_pipe(list(texts))
+
+        monkeypatch.setattr(nlp, "pipe", pipe)
+        segmenter = BatchedSentenceSegmenter(
+            tokenizer,
+            sentence_splitter,
+            batch_size=2,
+            n_process=2,
+            single_parse=single_parse,
+        )
+
+        segmented = list(segmenter.segment(iter(self.texts), lambda text: text))
+        assert calls == [{"batch_size": 2, "n_process": 2}]
+        assert [text for text, _ in segmented] == self.texts
+        assert [
+            [[t.text for t in tokens] for tokens in sentences]
+            for _, sentences in segmented
+        ] == [
+            [[t.text for t in tokens] for tokens in sentences] for sentences in expected
+        ]
+
+    def test_segment_or_tokenize(self):
+        tokenizer = SpacyTokenizer()
+        segmenter = BatchedSentenceSegmenter(tokenizer, SpacySentenceSplitter())
+
+        tokenized = segment_or_tokenize(self.texts, tokenizer, max_length=4)
+        assert [[t.text for t in tokens] for tokens in tokenized] == [
+            [t.text for t in tokenizer.tokenize(text)][:4] for text in self.texts
+        ]
+
+        segmented = segment_or_tokenize(self.texts, tokenizer, segmenter, max_length=4)
+        assert len(segmented) == len(self.texts)
+        assert [len(sentences) for sentences in segmented] == [2, 2, 1]
+        assert all(len(tokens) <= 4 for sentences in segmented for tokens in sentences)
+
+    def test_single_parse_requires_spacy(self):
+        with pytest.raises(ConfigurationError):
+            BatchedSentenceSegmenter(
+                WhitespaceTokenizer(), SpacySentenceSplitter(), single_parse=True
+            )
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+from allennlp.data.dataset_readers import DatasetReader
+
+from allennlp_eraser.common import sharding
+from allennlp_eraser.common.sharding import (
+    reader_record_limit,
+    reader_shard,
+    shard_iterable,
+)
+
+
+class TestShardIterable:
+    def test_unsharded(self):
+        reader = DatasetReader()
+        assert reader_shard(reader) == (0, 1)
+        assert list(shard_iterable(reader, range(5))) == [0, 1, 2, 3, 4]
+
+    def test_multi_process_sharding(self, monkeypatch):
+        monkeypatch.setattr(
+            sharding, "get_worker_info", lambda: SimpleNamespace(id=1, num_workers=3)
+        )
+        assert reader_shard(DatasetReader()) == (0, 1)
+
+        reader = DatasetReader(manual_multi_process_sharding=True)
+        assert reader_shard(reader) == (1, 3)
+        assert list(shard_iterable(reader, range(8))) == [1, 4, 7]
+
+    def test_distributed_sharding(self, monkeypatch):
+        monkeypatch.setattr(
+            sharding, "get_worker_info", lambda: SimpleNamespace(id=1, num_workers=2)
+        )
+        monkeypatch.setattr(sharding.dist, "is_available", lambda: True)
+        monkeypatch.setattr(sharding.dist, "is_initialized", lambda: True)
+        monkeypatch.setattr(sharding.dist, "get_rank", lambda: 1)
+        monkeypatch.setattr(sharding.dist, "get_world_size", lambda: 2)
+
+        reader = DatasetReader(
+            manual_distributed_sharding=True, manual_multi_process_sharding=True
+        )
+        assert reader_shard(reader) == (3, 4)
+        reader = DatasetReader(manual_distributed_sharding=True)
+        assert reader_shard(reader) == (1, 2)
+
+
+class TestReaderRecordLimit:
+    def test_record_limit(self, monkeypatch):
+        assert reader_record_limit(DatasetReader()) is None
+        assert reader_record_limit(DatasetReader(max_instances=5)) == 5
+
+        monkeypatch.setattr(
+            sharding, "get_worker_info", lambda: SimpleNamespace(id=1, num_workers=3)
+        )
+        # the instances of unsharded workers are spread over them by DatasetReader
+        assert reader_record_limit(DatasetReader(max_instances=5)) == 15
+        reader = DatasetReader(max_instances=5, manual_multi_process_sharding=True)
+        assert reader_record_limit(reader) == 5
@@ -0,0 +1,89 @@
+import pathlib
+
+from allennlp_eraser.common.synthetic import main, write_synthetic_dataset
+from allennlp_eraser.common.util import (
+    annotations_from_jsonl,
+    load_documents,
+    load_jsonl,
+)
+from allennlp_eraser.training.metrics.verify_instances import verify_instances
+
+
+class TestSyntheticDataset:
+    def test_dataset_is_valid(self, tmp_path: pathlib.Path):
+        dataset = write_synthetic_dataset(str(tmp_path), num_documents=20)
+        annotations = annotations_from_jsonl(dataset.annotations_path)
+        documents = load_documents(dataset.data_dir)
+        predictions = load_jsonl(dataset.predictions_path)
+        assert len(annotations) == len(documents) == len(predictions) == 20
+
+        token_docs = {docid: doc.tokens() for docid, doc in documents.items()}
+        for annotation in annotations:
+            for evidence in annotation.all_evidences():
+                tokens = token_docs[evidence.docid]
+                assert evidence.text == " ".join(
+                    tokens[evidence.start_token : evidence.end_token]
+                )
+        verify_instances(predictions, token_docs)
+
+    def test_deterministic(self, tmp_path: pathlib.Path):
+        first = write_synthetic_dataset(str(tmp_path / "first"), num_documents=5)
+        second = write_synthetic_dataset(str(tmp_path / "second"), num_documents=5)
+        for name in ("annotations_path", "predictions_path"):
+            assert (
+                pathlib.Path(getattr(first, name)).read_text()
+                == pathlib.Path(getattr(second, name)).read_text()
+            )
+
+    def test_lengths_vary(self, tmp_path: pathlib.Path):
+        dataset = write_synthetic_dataset(str(tmp_path), num_documents=50)
+        documents = load_documents(dataset.data_dir)
+        assert len({len(document) for document in documents.values()}) > 1
+        assert len({len(sentence) for d in documents.values() for (sentence,) in d}) > 1
+
+        fixed = write_synthetic_dataset(
+            str(tmp_path / "fixed"), num_documents=5, length_sigma=0
+        )
+        for document in load_documents(fixed.data_dir).values():
+            assert len(document) == 10
+            assert len(document.tokens()) == 200
+
+    def test_docs_jsonl(self, tmp_path: pathlib.Path):
+        in_dir = write_synthetic_dataset(str(tmp_path / "dir"), num_documents=10)
+        in_jsonl = write_synthetic_dataset(
+            str(tmp_path / "jsonl"), num_documents=10, docs_format="jsonl"
+        )
+        assert not (tmp_path / "jsonl" / "docs").exists()
+        documents = load_documents(in_jsonl.data_dir)
+        assert {
+            docid: list(document.tokens()) for docid, document in documents.items()
+        } == {
+            docid: list(document.tokens())
+            for docid, document in load_documents(in_dir.data_dir).items()
+        }
+        assert (
+            pathlib.Path(in_jsonl.annotations_path).read_text()
+            == pathlib.Path(in_dir.annotations_path).read_text()
+        )
+
+    def test_prefix(self, tmp_path: pathlib.Path):
+        small = write_synthetic_dataset(str(tmp_path / "small"), num_documents=5)
+        large = write_synthetic_dataset(str(tmp_path / "large"), num_documents=20)
+        small_lines = pathlib.Path(small.predictions_path).read_text().splitlines()
+        large_lines = pathlib.Path(large.predictions_path).read_text().splitlines()
+        assert large_lines[:5] == small_lines
+
+    def test_main(self, tmp_path: pathlib.Path):
+        main(
+            [
+                str(tmp_path),
+                "--documents",
+                "3",
+                "--docs-format",
+                "jsonl",
+                "--split",
+                "val",
+            ]
+        )
+        assert len(load_jsonl(str(tmp_path / "val.jsonl"))) == 3
+        assert len(load_documents(str(tmp_path))) == 3
@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import pathlib
+import tarfile
+
+import pytest
+
+from allennlp_eraser.common.tar_archive import TarArchive, load_documents_from_tar
+
+
+def _add(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+class TestTarArchive:
+    @property
+    def members(self):
+        return {
+            f"data/mini/docs/doc{i}": f"document {i} .\nsecond line {i} .\n".encode()
+            * (i + 1)
+            for i in range(20)
+        }
+
+    @pytest.fixture(params=["w", "w:gz"])
+    def tar_path(self, request, tmp_path: pathlib.Path) -> pathlib.Path:
+        tar_path = tmp_path / ("data.tar" if request.param == "w" else "data.tar.gz")
+        with tarfile.open(tar_path, request.param) as tar:
+            for name, data in self.members.items():
+                _add(tar, name, data)
+            _add(tar, "data/mini/train.jsonl", b'{"a": 1}\n{"a": 2}\n')
+        return tar_path
+
+    def test_read_members(self, tar_path: pathlib.Path):
+        # a small spacing makes reads go through the checkpoints
+        archive = TarArchive(str(tar_path), checkpoint_spacing=512)
+        assert len(archive.names()) == 21
+        for name, data in reversed(list(self.members.items())):
+            assert archive.read(name) == data
+        assert list(archive.iter_lines("data/mini/train.jsonl")) == [
+            '{"a": 1}\n',
+            '{"a": 2}\n',
+        ]
+
+    def test_read_many(self, tar_path: pathlib.Path, monkeypatch):
+        archive = TarArchive(str(tar_path), checkpoint_spacing=512)
+        names = ["data/mini/docs/doc7", "data/mini/docs/doc2", "data/mini/docs/doc9"]
+        if archive._gzip is not None:
+            # a fresh process has no checkpoints, the members are read in one pass
+            archive._gzip._checkpoints = archive._gzip._checkpoints[:1]
+            iter_chunks = archive._gzip.iter_chunks
+            passes = []
+            monkeypatch.setattr(
+                archive._gzip,
+                "iter_chunks",
+                lambda start=0: passes.append(start) or iter_chunks(start),
+            )
+        read = list(archive.read_many(names))
+        assert [name for name, _ in read] == sorted(names)
+        for name, data in read:
+            assert data == self.members[name]
+        if archive._gzip is not None:
+            assert len(passes) == 1
+
+    def test_iter_lines_streams(self, tmp_path: pathlib.Path, tar_path: pathlib.Path):
+        archive = TarArchive(str(tar_path))
+        # random text, so that a gzip chunk does not inflate to the whole member
+        lines = [f'{{"line": "{os.urandom(16).hex()}"}}\n' for _ in range(20000)]
+        big_path = tmp_path / tar_path.name.replace("data", "big")
+        with tarfile.open(big_path, "w:gz" if archive._gzip else "w") as tar:
+            _add(tar, "big/train.jsonl", "".join(lines).encode())
+        archive = TarArchive(str(big_path))
+
+        chunks = []
+        iter_chunks = archive.iter_chunks
+        archive.iter_chunks = lambda name: (
+            chunks.append(len(c)) or c for c in iter_chunks(name)
+        )
+        read = archive.iter_lines("big/train.jsonl")
+        assert next(read) == lines[0]
+        # only the start of the member was read
+        assert sum(chunks) < len(lines[0]) * len(lines) // 2
+        assert [lines[0]] + list(read) == lines
+
+    def test_index_is_persisted(self, tar_path: pathlib.Path):
+        archive = TarArchive(str(tar_path))
+        with open(archive.index_path) as rf:
+            stored = json.load(rf)
+        assert set(stored["members"]) == set(archive.names())
+
+        reopened = TarArchive(str(tar_path))
+        reopened._build_index = None  # the stored index must be used
+        assert (
+            reopened.read("data/mini/docs/doc3") == self.members["data/mini/docs/doc3"]
+        )
+
+    def test_find_and_list_dir(self, tar_path: pathlib.Path):
+        archive = TarArchive(str(tar_path))
+        assert archive.find("mini/train.jsonl") == "data/mini/train.jsonl"
+        assert archive.find("ini/train.jsonl") is None
+        assert archive.list_dir("mini/docs") == {
+            name.rsplit("/", 1)[1]: name for name in self.members
+        }
+
+    def test_load_documents(self, tar_path: pathlib.Path):
+        archive = TarArchive(str(tar_path))
+        docs = load_documents_from_tar(archive, "mini", docids={"doc1", "doc0"})
+        assert list(docs) == ["doc0", "doc1"]
+        assert list(docs["doc0"].flattened()) == ["document 0 .", "second line 0 ."]
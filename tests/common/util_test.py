@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import pathlib
+
+import pytest
+
+from allennlp_eraser.common.util import (
+    ContentCache,
+    cached_split_sidecar,
+    iter_json_array,
+    load_documents,
+    prefetch_documents,
+)
+
+
+@pytest.fixture
+def docs_dir(tmp_path: pathlib.Path) -> pathlib.Path:
+    (tmp_path / "docs").mkdir()
+    for i in range(20):
+        (tmp_path / "docs" / f"doc{i:02d}").write_text(f"sentence {i} .\n\nend .\n")
+    return tmp_path
+
+
+class TestLoadDocuments:
+    def test_load_documents(self, docs_dir: pathlib.Path):
+        docs = load_documents(str(docs_dir))
+        assert len(docs) == 20
+        assert docs["doc03"] == [["sentence 3 ."], ["end ."]]
+
+    @pytest.mark.parametrize("num_workers", (1, 4))
+    def test_load_documents_with_workers(
+        self, docs_dir: pathlib.Path, num_workers: int
+    ):
+        expected = load_documents(str(docs_dir), docids={"doc05", "doc01", "doc11"})
+        docs = load_documents(
+            str(docs_dir), docids={"doc05", "doc01", "doc11"}, num_workers=num_workers
+        )
+        assert docs == expected
+        assert list(docs.keys()) == ["doc01", "doc05", "doc11"]
+
+    def test_prefetch_documents(self, docs_dir: pathlib.Path):
+        docids = [f"doc{i:02d}" for i in range(20)]
+        fetched = list(
+            prefetch_documents(
+                str(docs_dir / "docs"), docids, num_workers=2, max_in_flight=3
+            )
+        )
+        assert sorted(docid for docid, _ in fetched) == docids
+
+
+class TestIterJsonArray:
+    @pytest.mark.parametrize("chunk_size", (1, 3, 1 << 16))
+    @pytest.mark.parametrize("indent", (None, 2))
+    def test_iter_json_array(self, chunk_size: int, indent: int):
+        data = [
+            {"paragraph": {"text": 'a \\"b\\"', "ids": [1, 2]}},
+            12345,
+            -1.5e-3,
+            None,
+        ]
+        content = {"version": 1.25, "other": {"data": []}, "data": data, "end": 1}
+        fp = io.StringIO(json.dumps(content, indent=indent))
+        assert list(iter_json_array(fp, "data", chunk_size=chunk_size)) == data
+
+    def test_missing_key(self):
+        assert list(iter_json_array(io.StringIO('{"version": 1}'), "data")) == []
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO('["data"]'), "data"))
+
+
+class TestContentCache:
+    def test_get_batch(self):
+        calls = []
+
+        def compute(texts):
+            calls.append(texts)
+            return [text.split() for text in texts]
+
+        cache = ContentCache()
+        values = cache.get_batch(["a b", "c", "a b"], compute)
+        assert values == [["a", "b"], ["c"], ["a", "b"]]
+        assert values[0] is values[2]
+        assert calls == [["a b", "c"]]
+
+        values = cache.get_batch(["c", "d e"], compute)
+        assert values == [["c"], ["d", "e"]]
+        assert calls[-1] == ["d e"]
+        assert cache.get("a b", compute) == ["a", "b"]
+        assert len(calls) == 2
+        assert cache.hits == 2
+
+    def test_maxsize(self):
+        cache = ContentCache(maxsize=2)
+        for text in ("a", "b", "a", "c"):
+            cache.get(text, str.upper)
+        assert len(cache) == 2
+        # "b" was the least recently used value
+        assert cache.misses == 3
+        cache.get("a", str.upper)
+        cache.get("b", str.upper)
+        assert cache.misses == 4
+
+
+class TestCachedSplitSidecar:
+    def test_changed_archive_replaces_sidecar(self, tmp_path: pathlib.Path):
+        archive_path = tmp_path / "data.zip"
+        archive_path.write_bytes(b"archive")
+        (tmp_path / "data.zip.other.train.jsonl").write_text("")
+
+        def extract():
+            return [{"text": archive_path.read_text()}]
+
+        sidecar_path = cached_split_sidecar(str(archive_path), "train", extract)
+        assert cached_split_sidecar(str(archive_path), "train", None) == sidecar_path
+        valid_path = cached_split_sidecar(str(archive_path), "valid", extract)
+
+        archive_path.write_bytes(b"changed archive")
+        os.utime(archive_path, ns=(0, 0))
+        new_path = cached_split_sidecar(str(archive_path), "train", extract)
+        assert new_path != sidecar_path
+        with open(new_path) as rf:
+            assert json.loads(rf.read()) == {"text": "changed archive"}
+        # only the sidecar of the earlier version of the same split is removed
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+            [
+                "data.zip",
+                "data.zip.other.train.jsonl",
+                os.path.basename(valid_path),
+                os.path.basename(new_path),
+            ]
+        )
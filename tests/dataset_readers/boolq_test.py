@@ -1,6 +1,12 @@
+import pathlib
+import tracemalloc
+from types import SimpleNamespace
+
 import pytest
 from allennlp.common.util import ensure_list
 
+from allennlp_eraser.common import sharding
+from allennlp_eraser.common.columnar import jsonl_to_columnar
 from allennlp_eraser.common.testing import AllenNlpEraserTestCase
 from allennlp_eraser.dataset_readers import BoolqDatasetReader, EraserDatasetReader
 
@@ -443,3 +449,120 @@ class TestBoolqDatasetReader:
                 assert [t.text for t in fields[key].tokens] == instance3[key]
             else:
                 assert bool(fields[key].label) == instance3[key]
+
+    def test_read_segmented_in_batches(self):
+        file_path = (
+            AllenNlpEraserTestCase.FIXTURES_ROOT / "dataset_readers" / "boolq.jsonl"
+        )
+        expected = ensure_list(
+            BoolqDatasetReader(segment_sentences=True).read(file_path)
+        )
+        instances = ensure_list(
+            BoolqDatasetReader(segment_sentences=True, segmentation_batch_size=2).read(
+                file_path
+            )
+        )
+
+        assert len(instances) == len(expected) == 3
+        for instance, expected_instance in zip(instances, expected):
+            sentences = instance.fields["passage"].field_list
+            expected_sentences = expected_instance.fields["passage"].field_list
+            assert len(sentences) == len(expected_sentences) > 1
+            for sentence, expected_sentence in zip(sentences, expected_sentences):
+                assert [t.text for t in sentence.tokens] == [
+                    t.text for t in expected_sentence.tokens
+                ]
+
+    @pytest.mark.parametrize("segment_sentences", (True, False))
+    def test_read_with_tokenization_batches(self, segment_sentences: bool):
+        file_path = (
+            AllenNlpEraserTestCase.FIXTURES_ROOT / "dataset_readers" / "boolq.jsonl"
+        )
+        expected = ensure_list(
+            BoolqDatasetReader(segment_sentences=segment_sentences).read(file_path)
+        )
+        reader = BoolqDatasetReader(
+            segment_sentences=segment_sentences, tokenization_batch_size=2
+        )
+        instances = ensure_list(reader.read(file_path))
+
+        def texts(instance, key):
+            field = instance.fields[key]
+            if key == "passage" and segment_sentences:
+                return [
+                    [t.text for t in sentence.tokens] for sentence in field.field_list
+                ]
+            return [t.text for t in field.tokens]
+
+        assert len(instances) == len(expected) == 3
+        for instance, expected_instance in zip(instances, expected):
+            for key in ("passage", "title", "question"):
+                assert texts(instance, key) == texts(expected_instance, key)
+            assert instance["answer"].label == expected_instance["answer"].label
+
+        # reading again hits the caches for every title and passage
+        ensure_list(reader.read(file_path))
+        assert reader._title_cache.hits == reader._passage_cache.hits == 3
+
+    @pytest.mark.parametrize("suffix", (".parquet", ".arrow"))
+    def test_read_columnar(self, tmp_path: pathlib.Path, monkeypatch, suffix: str):
+        pytest.importorskip("pyarrow")
+        file_path = (
+            AllenNlpEraserTestCase.FIXTURES_ROOT / "dataset_readers" / "boolq.jsonl"
+        )
+        columnar_path = str(tmp_path / f"boolq{suffix}")
+        jsonl_to_columnar(str(file_path), columnar_path, row_group_size=2)
+
+        expected = ensure_list(BoolqDatasetReader().read(file_path))
+        instances = ensure_list(BoolqDatasetReader().read(columnar_path))
+        assert len(instances) == len(expected) == 3
+        for instance, expected_instance in zip(instances, expected):
+            for key in ("passage", "title", "question"):
+                assert [t.text for t in instance[key].tokens] == [
+                    t.text for t in expected_instance[key].tokens
+                ]
+            assert instance["answer"].label == expected_instance["answer"].label
+
+        # with two workers, each reads one of the two row groups
+        reader = BoolqDatasetReader(manual_multi_process_sharding=True)
+        sizes = []
+        for worker_id in range(2):
+            monkeypatch.setattr(
+                sharding,
+                "get_worker_info",
+                lambda: SimpleNamespace(id=worker_id, num_workers=2),
+            )
+            sizes.append(len(ensure_list(reader.read(columnar_path))))
+        assert sizes == [2, 1]
+
+    @pytest.mark.parametrize("tokenization_batch_size", (None, 2))
+    def test_profile(self, tokenization_batch_size):
+        file_path = (
+            AllenNlpEraserTestCase.FIXTURES_ROOT / "dataset_readers" / "boolq.jsonl"
+        )
+        reader = BoolqDatasetReader(
+            tokenization_batch_size=tokenization_batch_size, profile=True
+        )
+        assert len(ensure_list(reader.read(file_path))) == 3
+
+        report = reader.profiler.report()
+        assert set(report) == {"read", "decode", "tokenize", "instance"}
+        assert report["read"]["count"] == report["instance"]["count"] == 3
+        assert not BoolqDatasetReader().profiler.enabled
+
+    def test_profile_memory(self):
+        file_path = (
+            AllenNlpEraserTestCase.FIXTURES_ROOT / "dataset_readers" / "boolq.jsonl"
+        )
+        reader = BoolqDatasetReader(profile_memory=True)
+        try:
+            assert len(ensure_list(reader.read(file_path))) == 3
+        finally:
+            tracemalloc.stop()
+
+        report = reader.profiler.report()
+        assert set(report) == {"read", "decode", "tokenize", "instance"}
+        assert report["read"]["count"] == 3
+        assert report["decode"]["tracemalloc_peak_bytes"] > 0
+        # tokens are alive once the first text is tokenized
+        assert report["tokenize"]["objects"]["Token"] > 0
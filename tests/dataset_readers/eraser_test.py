@@ -1,8 +1,19 @@
 import json
+import pathlib
+import tarfile
 
 import pytest
+from allennlp.common.checks import ConfigurationError
+from allennlp.data.tokenizers import WhitespaceTokenizer
 
-from allennlp_eraser.dataset_readers import EraserDatasetReader
+from allennlp_eraser.common.tar_archive import TarArchive
+from allennlp_eraser.dataset_readers import EraserDatasetReader, eraser
+from allennlp_eraser.dataset_readers.eraser import (
+    read_eraser_data,
+    read_eraser_data_from_tarfile,
+    stitch_window_scores,
+    window_span_to_document,
+)
 
 
 class TestEraserDatasetReader:
@@ -27,11 +38,295 @@ class TestEraserDatasetReader:
         ],
     )
     def test_read_boolq(self, dataset_name, file_path):
-        self.read_from_file(dataset_name, file_path)
+        self.read_from_file(file_path, dataset_name)
 
     @pytest.mark.parametrize(
         "dataset_name, file_path",
         [("cose", "train.jsonl"), ("cose", "train_sanity.jsonl")],
     )
     def test_read_cose(self, dataset_name, file_path):
-        self.read_from_file(dataset_name, file_path)
+        self.read_from_file(file_path, dataset_name)
+
+
+class TestEraserDatasetReaderWindows:
+    @property
+    def data(self):
+        return {
+            "annotation_id": "ann",
+            "docs": {"doc": ["a b c", "d e f g"]},
+            "rationales": {"doc": [(5, 7)]},
+            "query": "q",
+            "label": "POS",
+        }
+
+    def test_truncate_without_stride(self):
+        reader = EraserDatasetReader(max_sequence_length=4)
+        instances = list(reader.text_to_instances(**self.data))
+        assert len(instances) == 1
+
+        metadata = instances[0]["metadata"]
+        assert [t.text for t in metadata["tokens"]] == [
+            "a",
+            "b",
+            "c",
+            "d",
+            "q",
+            "[SEP]",
+        ]
+        assert metadata["doc_to_span_map"] == {"doc": (0, 4)}
+
+    def test_sliding_windows(self):
+        reader = EraserDatasetReader(max_sequence_length=4, window_stride=2)
+        instances = list(reader.text_to_instances(**self.data))
+        assert len(instances) == 3
+
+        tokens = [[t.text for t in i["metadata"]["tokens"]] for i in instances]
+        assert tokens[0][:4] == ["a", "b", "c", "d"]
+        assert tokens[1][:4] == ["c", "d", "e", "f"]
+        assert tokens[2][:4] == ["e", "f", "g", "[SEP]"]
+        assert [i["metadata"]["doc_offsets"]["doc"] for i in instances] == [0, 2, 4]
+        assert instances[2]["metadata"]["doc_to_span_map"] == {"doc": (0, 3)}
+        assert instances[2]["rationale"].labels == [0, 1, 1, 1, 1, 1]
+
+    def test_stitch_window_scores(self):
+        reader = EraserDatasetReader(max_sequence_length=4, window_stride=2)
+        metadata = [
+            i["metadata"].metadata for i in reader.text_to_instances(**self.data)
+        ]
+        window_scores = [[1.0] * len(m["tokens"]) for m in metadata]
+        window_scores[1] = [3.0] * len(metadata[1]["tokens"])
+
+        stitched = stitch_window_scores(metadata, window_scores)
+        assert stitched == {("ann", "doc"): [1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 1.0]}
+        assert window_span_to_document(metadata[2], "doc", 1, 3) == (5, 7)
+
+    def test_tokenizer(self):
+        class LowercaseTokenizer(WhitespaceTokenizer):
+            def tokenize(self, text):
+                return super().tokenize(text.lower())
+
+        data = dict(self.data, docs={"doc": ["A b C", "d E f g"]}, query="Q")
+        reader = EraserDatasetReader(tokenizer=LowercaseTokenizer())
+        (instance,) = reader.text_to_instances(**data)
+        assert [t.text for t in instance["metadata"]["tokens"]] == [
+            "a",
+            "b",
+            "c",
+            "d",
+            "e",
+            "f",
+            "g",
+            "[SEP]",
+            "q",
+            "[SEP]",
+        ]
+
+    def test_tokenizer_must_keep_tokens(self):
+        class PairTokenizer(WhitespaceTokenizer):
+            def tokenize(self, text):
+                return super().tokenize(text)[::2]
+
+        reader = EraserDatasetReader(tokenizer=PairTokenizer())
+        with pytest.raises(ConfigurationError):
+            list(reader.text_to_instances(**self.data))
+
+    def test_invalid_stride(self):
+        with pytest.raises(ConfigurationError):
+            EraserDatasetReader(window_stride=2)
+        with pytest.raises(ConfigurationError):
+            EraserDatasetReader(max_sequence_length=4, window_stride=8)
+
+
+class TestReadEraserDataSharding:
+    @pytest.fixture
+    def file_path(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        (tmp_path / "docs").mkdir()
+        with open(tmp_path / "train.jsonl", "w") as wf:
+            for i in range(5):
+                (tmp_path / "docs" / f"doc{i}").write_text(f"document {i} .\n")
+                evidence = {
+                    "docid": f"doc{i}",
+                    "start_token": 0,
+                    "end_token": 1,
+                    "start_sentence": 0,
+                    "end_sentence": 1,
+                    "text": "document",
+                }
+                annotation = {
+                    "annotation_id": f"ann{i}",
+                    "evidences": [[evidence]],
+                    "classification": "POS",
+                    "query": "q",
+                }
+                wf.write(json.dumps(annotation) + "\n")
+        return tmp_path / "train.jsonl"
+
+    def test_shards_partition_annotations(self, file_path: pathlib.Path):
+        shards = [
+            list(read_eraser_data(str(file_path), shard=(index, 2)))
+            for index in range(2)
+        ]
+        assert [[d.annotation_id for d in shard] for shard in shards] == [
+            ["ann0", "ann1"],
+            ["ann2", "ann3", "ann4"],
+        ]
+        assert shards[1][0].docs == {"doc2": ["document 2 ."]}
+
+    def test_only_owned_documents_are_loaded(self, file_path: pathlib.Path):
+        # documents of other shards may be missing altogether
+        (file_path.parent / "docs" / "doc0").unlink()
+        assert len(list(read_eraser_data(str(file_path), shard=(1, 2)))) == 3
+
+
+class TestReadEraserDataFromTarfile:
+    @pytest.fixture
+    def data_dir(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        data_dir = tmp_path / "data" / "mini"
+        (data_dir / "docs").mkdir(parents=True)
+        with open(data_dir / "train.jsonl", "w") as wf:
+            for i in range(4):
+                (data_dir / "docs" / f"doc{i}").write_text(f"document {i} .\n")
+                evidence = {
+                    "docid": f"doc{i}",
+                    "start_token": 0,
+                    "end_token": 1,
+                    "start_sentence": 0,
+                    "end_sentence": 1,
+                    "text": "document",
+                }
+                annotation = {
+                    "annotation_id": f"ann{i}",
+                    "evidences": [[evidence]],
+                    "classification": "POS",
+                    "query": "q",
+                }
+                wf.write(json.dumps(annotation) + "\n")
+        return data_dir
+
+    @pytest.fixture
+    def tar_path(self, tmp_path: pathlib.Path, data_dir: pathlib.Path) -> str:
+        tar_path = tmp_path / "data.tar.gz"
+        with tarfile.open(tar_path, "w:gz") as tar:
+            tar.add(data_dir.parent, arcname="data")
+        return str(tar_path)
+
+    def test_matches_extracted(self, data_dir: pathlib.Path, tar_path: str):
+        archive = TarArchive(tar_path)
+        expected = list(read_eraser_data(str(data_dir / "train.jsonl")))
+        assert (
+            list(read_eraser_data_from_tarfile(archive, "mini/train.jsonl")) == expected
+        )
+
+        shard = list(read_eraser_data_from_tarfile(archive, "mini/train.jsonl", (1, 2)))
+        assert [d.annotation_id for d in shard] == ["ann2", "ann3"]
+        assert shard[0].docs == {"doc2": ["document 2 ."]}
+
+    def test_reader(self, data_dir: pathlib.Path, tar_path: str):
+        reader = EraserDatasetReader(dataset_url=tar_path)
+        assert json.loads(next(reader._read_tarfile("train.jsonl", "mini")))
+        from_tar = list(reader.read("tar://mini/train.jsonl"))
+        from_disk = list(reader.read(str(data_dir / "train.jsonl")))
+        assert len(from_tar) == len(from_disk) == 4
+        tarball_reader = EraserDatasetReader(dataset_url=tar_path, use_tarball=True)
+        assert len(list(tarball_reader.read("mini/train.jsonl"))) == 4
+
+        # the tarball is only read when asked for
+        with pytest.raises(FileNotFoundError):
+            list(reader.read("mini/train.jsonl"))
+        for tar_instance, disk_instance in zip(from_tar, from_disk):
+            assert [t.text for t in tar_instance["doc"].tokens] == [
+                t.text for t in disk_instance["doc"].tokens
+            ]
+            assert tar_instance["label"].label == disk_instance["label"].label
+
+    def test_pipelined_read(self, data_dir: pathlib.Path):
+        file_path = str(data_dir / "train.jsonl")
+        serial = list(EraserDatasetReader().read(file_path))
+        reader = EraserDatasetReader(
+            max_sequence_length=2, window_stride=2, pipeline_queue_size=2
+        )
+        pipelined = list(reader.read(file_path))
+
+        assert len(serial) == 4 and len(pipelined) == 8
+        windows = [i["metadata"]["annotation_id"] for i in pipelined]
+        assert windows == [f"ann{i // 2}" for i in range(8)]
+
+        # every read has its own pipeline and stats
+        instances, pipeline = reader.pipelined_read(file_path)
+        other_instances, other_pipeline = reader.pipelined_read(file_path)
+        assert len(list(instances)) == 8
+        assert other_pipeline.stats()["fields"]["items_out"] == 0
+        stats = pipeline.stats()
+        assert stats["read"]["items_out"] == 4
+        assert stats["fields"]["items_out"] == 8
+        assert len(list(other_instances)) == 8
+
+    def test_streams_annotations(self, data_dir: pathlib.Path, monkeypatch):
+        loaded = []
+        load_flattened_documents = eraser.load_flattened_documents
+
+        def load(data_dir, docids, num_workers=0):
+            loaded.append(sorted(docids))
+            return load_flattened_documents(data_dir, docids, num_workers)
+
+        monkeypatch.setattr(eraser, "load_flattened_documents", load)
+        data = read_eraser_data(str(data_dir / "train.jsonl"), chunk_size=3)
+        # the documents of the first chunk are loaded before the others are read
+        assert next(data).annotation_id == "ann0"
+        assert loaded == [["doc0", "doc1", "doc2"]]
+        assert [d.annotation_id for d in data] == ["ann1", "ann2", "ann3"]
+        assert loaded == [["doc0", "doc1", "doc2"], ["doc3"]]
+
+    def test_documents_are_cached_across_chunks(
+        self, data_dir: pathlib.Path, monkeypatch
+    ):
+        with open(data_dir / "train.jsonl", "a") as wf:
+            evidence = {
+                "docid": "doc0",
+                "start_token": 0,
+                "end_token": 1,
+                "start_sentence": 0,
+                "end_sentence": 1,
+                "text": "document",
+            }
+            annotation = {
+                "annotation_id": "ann4",
+                "evidences": [[evidence]],
+                "classification": "POS",
+                "query": "q",
+            }
+            wf.write(json.dumps(annotation) + "\n")
+        loaded = []
+        load_flattened_documents = eraser.load_flattened_documents
+
+        def load(data_dir, docids, num_workers=0):
+            loaded.append(sorted(docids))
+            return load_flattened_documents(data_dir, docids, num_workers)
+
+        monkeypatch.setattr(eraser, "load_flattened_documents", load)
+        file_path = str(data_dir / "train.jsonl")
+        data = list(read_eraser_data(file_path, chunk_size=2))
+        assert data[4].docs == {"doc0": ["document 0 ."]}
+        assert loaded == [["doc0", "doc1"], ["doc2", "doc3"]]
+
+        loaded.clear()
+        list(read_eraser_data(file_path, chunk_size=2, document_cache_size=2))
+        assert loaded == [["doc0", "doc1"], ["doc2", "doc3"], ["doc0"]]
+
+    def test_profile(self, data_dir: pathlib.Path):
+        reader = EraserDatasetReader(profile=True)
+        assert len(list(reader.read(str(data_dir / "train.jsonl")))) == 4
+
+        report = reader.profiler.report()
+        assert list(report) == [
+            "read",
+            "decode",
+            "documents",
+            "eraser_data",
+            "tokenize",
+            "rationales",
+            "instance",
+        ]
+        assert report["decode"]["count"] == report["instance"]["count"] == 4
+        # the document of every annotation and its query
+        assert report["tokenize"]["count"] == 8
@@ -1,10 +1,13 @@
+import json
+import pathlib
+from typing import Optional
+
 import pytest
 from allennlp.common.util import ensure_list
 
+from allennlp_eraser.common.columnar import jsonl_to_columnar
 from allennlp_eraser.common.testing import AllenNlpEraserTestCase
-from allennlp_eraser.dataset_readers import EraserDatasetReader
-
-# from allennlp_eraser.dataset_readers import ESNLIDatasetReader
+from allennlp_eraser.dataset_readers import EraserDatasetReader, ESNLIDatasetReader
 
 
 class TestESNLIEraserDatasetReader:
@@ -20,3 +23,130 @@ class TestESNLIEraserDatasetReader:
         )
         instances2 = ensure_list(reader.read(file_path))
         assert (len(instances1) + len(instances2)) == 911938
+
+
+class TestESNLIDatasetReader:
+    @pytest.fixture
+    def file_path(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        file_path = tmp_path / "esnli_train.jsonl"
+        with open(file_path, "w") as wf:
+            for i in range(2):
+                for j, label in enumerate(("entailment", "neutral", "contradiction")):
+                    row = {
+                        "pairID": f"{i}#{j}",
+                        "gold_label": label,
+                        "Sentence1": f"A man plays guitar {i} . He sings .",
+                        "Sentence2": f"A man makes music {j} .",
+                        "Sentence1_marked_1": f"A man *plays* guitar {i} . He sings .",
+                        "Sentence2_marked_1": f"A man *makes* music {j} .",
+                        "Explanation_1": "Playing guitar is making music .",
+                        "WorkerID": "W0",
+                        "Sentence1_Highlighted_1": "2",
+                        "Sentence2_Highlighted_1": "2",
+                    }
+                    wf.write(json.dumps(row) + "\n")
+        return file_path
+
+    def test_cleanup_data(self, file_path: pathlib.Path):
+        reader = ESNLIDatasetReader()
+        with open(file_path) as rf:
+            row = json.loads(rf.readline())
+        data = reader.cleanup_data(row)
+        assert data == {
+            "pair_id": "0#0",
+            "label": "entailment",
+            "premise": "A man plays guitar 0 . He sings .",
+            "hypothesis": "A man makes music 0 .",
+            "premise_marked": "A man *plays* guitar 0 . He sings .",
+            "hypothesis_marked": "A man *makes* music 0 .",
+        }
+        assert "pairID" in row
+
+    @pytest.mark.parametrize(
+        "segment_sentences, segmentation_batch_size, tokenization_batch_size",
+        ((True, 2, None), (False, 1, None), (False, 1, 4), (True, 1, 4)),
+    )
+    def test_read(
+        self,
+        file_path: pathlib.Path,
+        segment_sentences: bool,
+        segmentation_batch_size: int,
+        tokenization_batch_size: Optional[int],
+    ):
+        reader = ESNLIDatasetReader(
+            segment_sentences=segment_sentences,
+            segmentation_batch_size=segmentation_batch_size,
+            tokenization_batch_size=tokenization_batch_size,
+        )
+        instances = ensure_list(reader.read(file_path))
+        assert len(instances) == 6
+
+        def premise_tokens(instance):
+            field = instance["premise"]
+            if segment_sentences:
+                return [sentence.tokens for sentence in field.field_list]
+            return [field.tokens]
+
+        first, second, other = instances[0], instances[2], instances[3]
+        for tokens, shared in zip(premise_tokens(first), premise_tokens(second)):
+            assert tokens is shared
+        assert premise_tokens(first)[0] is not premise_tokens(other)[0]
+        assert len(premise_tokens(first)) == (2 if segment_sentences else 1)
+        assert [t.text for t in first["hypothesis"].tokens][:3] == ["A", "man", "makes"]
+        assert [i["label"].label for i in instances[:3]] == [
+            "entailment",
+            "neutral",
+            "contradiction",
+        ]
+        assert other["metadata"].metadata == {"pair_id": "1#0"}
+        assert reader._premise_cache.misses == 2
+
+    def test_read_columnar(self, file_path: pathlib.Path):
+        pytest.importorskip("pyarrow")
+        columnar_path = str(file_path.with_suffix(".parquet"))
+        jsonl_to_columnar(str(file_path), columnar_path, row_group_size=4)
+
+        reader = ESNLIDatasetReader()
+        expected = ensure_list(reader.read(file_path))
+        instances = ensure_list(reader.read(columnar_path))
+        assert [i["label"].label for i in instances] == [
+            i["label"].label for i in expected
+        ]
+        assert [i["metadata"].metadata for i in instances] == [
+            i["metadata"].metadata for i in expected
+        ]
+        assert [[t.text for t in i["premise"].tokens] for i in instances] == [
+            [t.text for t in i["premise"].tokens] for i in expected
+        ]
+
+    def test_segmentation_n_process(self, file_path: pathlib.Path, monkeypatch):
+        expected = ensure_list(
+            ESNLIDatasetReader(segment_sentences=True).read(file_path)
+        )
+        reader = ESNLIDatasetReader(
+            segment_sentences=True, segmentation_batch_size=2, segmentation_n_process=2
+        )
+        spacy = reader._sentence_segmenter.spacy
+        texts = []
+        pipe = spacy.pipe
+
+        def counting_pipe(stream, **kwargs):
+            assert kwargs["n_process"] == 2
+            stream = list(stream)
+            texts.extend(stream)
+            return pipe(stream, **kwargs)
+
+        monkeypatch.setattr(spacy, "pipe", counting_pipe)
+        instances = ensure_list(reader.read(file_path))
+        # a single pipe, which parses every premise once
+        assert len(texts) == 2
+
+        def texts_of(instance):
+            return (
+                [[t.text for t in s.tokens] for s in instance["premise"].field_list],
+                [t.text for t in instance["hypothesis"].tokens],
+            )
+
+        assert [texts_of(i) for i in instances] == [texts_of(i) for i in expected]
+        first, second = instances[0]["premise"], instances[1]["premise"]
+        assert first.field_list[0].tokens is second.field_list[0].tokens
@@ -1,8 +1,21 @@
+import os
+import pathlib
+import pickle
+from types import SimpleNamespace
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
 import pytest
+from allennlp.common.checks import ConfigurationError
 from allennlp.common.util import ensure_list
+from allennlp.data.fields import ListField
 
+from allennlp_eraser.common import sharding
 from allennlp_eraser.common.testing import AllenNlpEraserTestCase
-from allennlp_eraser.dataset_readers import EraserDatasetReader, MoviesDatasetReader
+from allennlp_eraser.dataset_readers import (
+    EraserDatasetReader,
+    MoviesDatasetReader,
+    movies,
+)
 
 
 class TestMoviesEraserDatasetReader:
@@ -2239,3 +2252,142 @@ class TestMoviesDatasetReader:
         instance = getattr(self, f"instance_{phase}")
         assert [t.text for t in fields["tokens"].tokens] == instance["tokens"]
         assert fields["label"].label == instance["label"]
+
+
+class TestMoviesDatasetReaderMemberIndex:
+    @pytest.fixture
+    def dataset_path(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        dataset_path = tmp_path / "review_polarity_rationales.zip"
+        with ZipFile(dataset_path, "w") as zip_file:
+            for num in (0, 850, 950, 1):
+                for label in ("pos", "neg"):
+                    zip_file.writestr(
+                        f"noRats_{label}/cv{num:03d}_{num}.txt",
+                        f"{label} review {num} .\n",
+                        compress_type=ZIP_DEFLATED if num % 2 else ZIP_STORED,
+                    )
+            zip_file.writestr("withRats_pos/cv000_0.txt", "<POS> rationale </POS>")
+        return dataset_path
+
+    def test_read_zipfile(self, dataset_path: pathlib.Path):
+        reader = MoviesDatasetReader(dataset_url=str(dataset_path))
+        assert list(reader._read_zipfile("train")) == [
+            ("pos review 0 .", "positive"),
+            ("neg review 0 .", "negative"),
+            ("pos review 1 .", "positive"),
+            ("neg review 1 .", "negative"),
+        ]
+        assert list(reader._read_zipfile("test")) == [
+            ("pos review 950 .", "positive"),
+            ("neg review 950 .", "negative"),
+        ]
+        assert len(list(dataset_path.parent.glob("*.index.json"))) == 1
+
+        # the persisted index is used from now on
+        reader._build_member_index = None
+        assert len(list(reader._read_zipfile("valid"))) == 2
+
+    def test_changed_zipfile_is_indexed_again(self, dataset_path: pathlib.Path):
+        reader = MoviesDatasetReader(dataset_url=str(dataset_path))
+        assert len(list(reader._read_zipfile("test"))) == 2
+
+        # the index is keyed by the size and mtime of the archive
+        stat = dataset_path.stat()
+        os.utime(dataset_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert len(list(reader._read_zipfile("test"))) == 2
+        # and the index of the earlier version is removed
+        assert len(list(dataset_path.parent.glob("*.index.json"))) == 1
+
+    @pytest.mark.parametrize("segment_sentences", (True, False))
+    def test_read_with_decoding_workers(
+        self, dataset_path: pathlib.Path, segment_sentences: bool
+    ):
+        reader = MoviesDatasetReader(
+            dataset_url=str(dataset_path), segment_sentences=segment_sentences
+        )
+        parallel_reader = MoviesDatasetReader(
+            dataset_url=str(dataset_path),
+            segment_sentences=segment_sentences,
+            num_decoding_workers=2,
+        )
+        assert [
+            text for text, _, _ in parallel_reader._read_zipfile_parallel("train")
+        ] == [text for text, _ in reader._read_zipfile("train")]
+
+        instances = ensure_list(reader.read("train"))
+        parallel_instances = ensure_list(parallel_reader.read("train"))
+        assert len(instances) == len(parallel_instances) == 4
+        for instance, parallel_instance in zip(instances, parallel_instances):
+            assert self.texts(parallel_instance) == self.texts(instance)
+            assert parallel_instance["label"].label == instance["label"].label
+
+    def test_decoding_workers_do_not_read_sidecars(self):
+        with pytest.raises(ConfigurationError):
+            MoviesDatasetReader(num_decoding_workers=2, cache_extracted_splits=True)
+
+    def test_worker_config(self, dataset_path: pathlib.Path):
+        reader = MoviesDatasetReader(
+            dataset_url=str(dataset_path), segment_sentences=True
+        )
+        config = reader._worker_config(str(dataset_path))
+        # the default tokenizer is rebuilt by the worker rather than pickled
+        assert config.tokenizer is None
+
+        movies._init_worker(pickle.loads(pickle.dumps(config)))
+        try:
+            label_and_member = reader._member_index(str(dataset_path))["test"][0]
+            text, label, tokens = movies._load_review(label_and_member)
+        finally:
+            movies._worker_file.close()
+        assert (text, label) == ("pos review 950 .", "positive")
+        assert [[t.text for t in sentence] for sentence in tokens] == [
+            [t.text for t in sentence] for sentence in reader._tokenize(text)
+        ]
+
+    def test_read_with_sidecar(self, dataset_path: pathlib.Path):
+        reader = MoviesDatasetReader(dataset_url=str(dataset_path))
+        sidecar_reader = MoviesDatasetReader(
+            dataset_url=str(dataset_path), cache_extracted_splits=True
+        )
+        for phase in ("train", "valid", "test"):
+            expected = list(reader._read_zipfile(phase))
+            assert list(sidecar_reader._read_sidecar(phase)) == expected
+            assert list(sidecar_reader._read_sidecar(phase)) == expected
+        assert len(list(dataset_path.parent.glob("*.jsonl"))) == 3
+
+        instances = ensure_list(sidecar_reader.read("train"))
+        assert [self.texts(i) for i in instances] == [
+            self.texts(i) for i in reader.read("train")
+        ]
+
+    @pytest.mark.parametrize("cache_extracted_splits", (True, False))
+    def test_manual_multi_process_sharding(
+        self, dataset_path: pathlib.Path, monkeypatch, cache_extracted_splits: bool
+    ):
+        reader = MoviesDatasetReader(
+            dataset_url=str(dataset_path),
+            cache_extracted_splits=cache_extracted_splits,
+            manual_multi_process_sharding=True,
+        )
+        expected = list(
+            MoviesDatasetReader(dataset_url=str(dataset_path))._read_zipfile("train")
+        )
+
+        shards = []
+        for worker_id in range(2):
+            monkeypatch.setattr(
+                sharding,
+                "get_worker_info",
+                lambda: SimpleNamespace(id=worker_id, num_workers=2),
+            )
+            shards.append([self.texts(i) for i in reader.read("train")])
+        assert shards == [
+            [text.split() for text, _ in expected[0::2]],
+            [text.split() for text, _ in expected[1::2]],
+        ]
+
+    def texts(self, instance):
+        field = instance["tokens"]
+        if isinstance(field, ListField):
+            return [[t.text for t in sentence.tokens] for sentence in field.field_list]
+        return [t.text for t in field.tokens]
@@ -1,8 +1,16 @@
+import json
+import pathlib
+from zipfile import ZipFile
+
 import pytest
 from allennlp.common.util import ensure_list
 
 from allennlp_eraser.common.testing import AllenNlpEraserTestCase
-from allennlp_eraser.dataset_readers import BoolqDatasetReader, EraserDatasetReader
+from allennlp_eraser.dataset_readers import (
+    BoolqDatasetReader,
+    EraserDatasetReader,
+    MultiRCDatasetReader,
+)
 
 
 class TestMultiREraserDatasetReader:
@@ -28,3 +36,108 @@ class TestMultiREraserDatasetReader:
         file_path = AllenNlpEraserTestCase.FIXTURES_ROOT / "data" / "multirc" / filename
         instances = ensure_list(reader.read(file_path))
         assert len(instances) == num_data
+
+
+class TestMultiRCDatasetReader:
+    @pytest.fixture
+    def dataset_path(self, tmp_path: pathlib.Path) -> pathlib.Path:
+        def paragraph(i: int) -> dict:
+            answers = [
+                {"text": f"answer {j}", "isAnswer": j == 0, "scores": {}}
+                for j in range(2)
+            ]
+            questions = [
+                {
+                    "question": f"question {i} {k} ?",
+                    "sentences_used": [0],
+                    "answers": answers,
+                    "idx": str(k),
+                    "multisent": False,
+                }
+                for k in range(3)
+            ]
+            return {
+                "id": f"paragraph{i}",
+                "paragraph": {
+                    "text": f"Sent{i} one . Sent{i} two .",
+                    "questions": questions,
+                },
+            }
+
+        dataset_path = tmp_path / "mutlirc-v2.zip"
+        with ZipFile(dataset_path, "w") as zip_file:
+            for filename, num_paragraphs in (
+                ("splitv2/train_456-fixedIds.json", 2),
+                ("splitv2/dev_83-fixedIds.json", 1),
+            ):
+                content = {"data": [paragraph(i) for i in range(num_paragraphs)]}
+                zip_file.writestr(filename, json.dumps(content))
+        return dataset_path
+
+    @pytest.mark.parametrize("phase, num_data", (("train", 12), ("valid", 6)))
+    def test_read(self, dataset_path: pathlib.Path, phase: str, num_data: int):
+        reader = MultiRCDatasetReader(dataset_url=str(dataset_path))
+        instances = ensure_list(reader.read(phase))
+        assert len(instances) == num_data
+
+        fields = instances[1].fields
+        assert [t.text for t in fields["question"].tokens] == [
+            "question",
+            "0",
+            "0",
+            "?",
+        ]
+        assert [t.text for t in fields["answer_tokens"].tokens] == ["answer", "1"]
+        assert fields["label"].label == "False"
+
+    @pytest.mark.parametrize(
+        "segment_sentences, segmentation_batch_size", ((True, 1), (True, 2), (False, 1))
+    )
+    def test_passage_tokens_are_shared(
+        self,
+        dataset_path: pathlib.Path,
+        segment_sentences: bool,
+        segmentation_batch_size: int,
+    ):
+        reader = MultiRCDatasetReader(
+            dataset_url=str(dataset_path),
+            segment_sentences=segment_sentences,
+            segmentation_batch_size=segmentation_batch_size,
+        )
+        instances = ensure_list(reader.read("train"))
+
+        def passage_tokens(instance):
+            field = instance["passage"]
+            if segment_sentences:
+                return [sentence.tokens for sentence in field.field_list]
+            return [field.tokens]
+
+        first, second, other = instances[0], instances[5], instances[6]
+        for tokens, shared in zip(passage_tokens(first), passage_tokens(second)):
+            assert tokens is shared
+        assert first["question"].tokens is instances[1]["question"].tokens
+        assert passage_tokens(first)[0] is not passage_tokens(other)[0]
+        assert [t.text for t in passage_tokens(other)[0]][:2] == ["Sent1", "one"]
+
+        instance = reader.text_to_instance(
+            text="Sent0 one . Sent0 two .",
+            question="question 0 0 ?",
+            idx="0",
+            multisent=False,
+            sentence_used=[0],
+        )
+        assert [[t.text for t in tokens] for tokens in passage_tokens(instance)] == [
+            [t.text for t in tokens] for tokens in passage_tokens(first)
+        ]
+
+    def test_read_with_sidecar(self, dataset_path: pathlib.Path):
+        reader = MultiRCDatasetReader(dataset_url=str(dataset_path))
+        sidecar_reader = MultiRCDatasetReader(
+            dataset_url=str(dataset_path), cache_extracted_splits=True
+        )
+        expected = list(reader._read_paragraphs("train"))
+        assert list(sidecar_reader._read_sidecar("train")) == [
+            {"text": p["text"], "questions": p["questions"]} for p in expected
+        ]
+        assert len(list(dataset_path.parent.glob("*.train_456-fixedIds.jsonl"))) == 1
+        assert len(ensure_list(sidecar_reader.read("train"))) == 12